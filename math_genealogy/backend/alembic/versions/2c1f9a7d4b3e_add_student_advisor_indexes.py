@@ -0,0 +1,44 @@
+"""add student_advisor indexes
+
+Revision ID: 2c1f9a7d4b3e
+Revises: 73a6e35b6cee
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c1f9a7d4b3e'
+down_revision = '73a6e35b6cee'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keep the oldest copy of every duplicated edge so the unique index can be built
+    op.execute(
+        sa.text(
+            "DELETE FROM student_advisor WHERE id NOT IN ("
+            "SELECT MIN(id) FROM student_advisor GROUP BY student_id, advisor_id"
+            ")"
+        )
+    )
+    op.create_index(
+        'ix_student_advisor_student_id_advisor_id',
+        'student_advisor',
+        ['student_id', 'advisor_id'],
+        unique=True,
+    )
+    op.create_index(
+        'ix_student_advisor_advisor_id_student_id',
+        'student_advisor',
+        ['advisor_id', 'student_id'],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_student_advisor_advisor_id_student_id', table_name='student_advisor')
+    op.drop_index('ix_student_advisor_student_id_advisor_id', table_name='student_advisor')
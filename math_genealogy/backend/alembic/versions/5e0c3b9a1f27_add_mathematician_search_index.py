@@ -0,0 +1,31 @@
+"""add mathematician search index
+
+Revision ID: 5e0c3b9a1f27
+Revises: 2c1f9a7d4b3e
+Create Date: 2026-10-18 15:40:12.804517
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0c3b9a1f27'
+down_revision = '2c1f9a7d4b3e'
+branch_labels = None
+depends_on = None
+
+
+# must stay the same expression as math_genealogy.backend.search.SEARCH_DOCUMENT
+SEARCH_DOCUMENT = (
+    "setweight(to_tsvector('simple'::regconfig, coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(thesis, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(school, '')), 'C')"
+)
+
+
+def upgrade():
+    op.execute(f"CREATE INDEX ix_mathematician_search ON mathematician USING GIN (({SEARCH_DOCUMENT}))")
+
+
+def downgrade():
+    op.drop_index('ix_mathematician_search', table_name='mathematician')
@@ -0,0 +1,37 @@
+"""add mathematician filter indexes
+
+Revision ID: 9a4d2e6c8b15
+Revises: 5e0c3b9a1f27
+Create Date: 2026-10-18 16:52:03.117249
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2e6c8b15'
+down_revision = '5e0c3b9a1f27'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = ['country', 'school', 'subject', 'publications', 'citations']
+
+
+def upgrade():
+    for column in COLUMNS:
+        op.create_index(f'ix_mathematician_{column}', 'mathematician', [column], unique=False)
+    # graduated is text starting with the year, ranges compare the year
+    op.create_index(
+        'ix_mathematician_graduated_year',
+        'mathematician',
+        [sa.text('substr(graduated, 1, 4)')],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index('ix_mathematician_graduated_year', table_name='mathematician')
+    for column in reversed(COLUMNS):
+        op.drop_index(f'ix_mathematician_{column}', table_name='mathematician')
@@ -0,0 +1,46 @@
+"""add mathematician order indexes
+
+Revision ID: b5d82f4e7a19
+Revises: e4a9c1d7b362
+Create Date: 2026-10-18 21:14:52.204816
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5d82f4e7a19'
+down_revision = 'e4a9c1d7b362'
+branch_labels = None
+depends_on = None
+
+
+# (column, id) indexes serve the ordering and cursors of GET /mathematicians, and the
+# filters the single column indexes they replace served
+COLUMNS = ['name', 'school', 'graduated_year', 'country', 'subject', 'publications', 'citations']
+
+
+# the single column filter indexes
+REPLACED = ['school', 'graduated_year', 'country', 'subject', 'publications', 'citations']
+
+
+def upgrade():
+    # built without locking out the crawler's writes, each index in its own transaction
+    with op.get_context().autocommit_block():
+        for column in COLUMNS:
+            op.create_index(
+                f'ix_mathematician_{column}_id',
+                'mathematician',
+                [column, 'id'],
+                unique=False,
+                postgresql_concurrently=True,
+            )
+    for column in REPLACED:
+        op.drop_index(f'ix_mathematician_{column}', table_name='mathematician')
+
+
+def downgrade():
+    for column in REPLACED:
+        op.create_index(f'ix_mathematician_{column}', 'mathematician', [column], unique=False)
+    for column in reversed(COLUMNS):
+        op.drop_index(f'ix_mathematician_{column}_id', table_name='mathematician')
@@ -0,0 +1,72 @@
+"""add mathematician graduated_year
+
+Revision ID: c7f1e3a2d940
+Revises: 9a4d2e6c8b15
+Create Date: 2026-10-18 18:03:27.640392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c7f1e3a2d940'
+down_revision = '9a4d2e6c8b15'
+branch_labels = None
+depends_on = None
+
+
+# ids updated per transaction, so each one only holds its row locks briefly
+BATCH_SIZE = 10000
+
+
+# graduated holds the year, sometimes followed by more text such as "1925-1926"
+BACKFILL = sa.text(
+    "UPDATE mathematician SET graduated_year = CAST(substr(graduated, 1, 4) AS INTEGER) "
+    "WHERE id >= :low AND id < :high AND graduated ~ '^[0-9]{4}'"
+)
+
+
+RESTORE = sa.text(
+    "UPDATE mathematician SET graduated = CAST(graduated_year AS VARCHAR) "
+    "WHERE id >= :low AND id < :high AND graduated_year IS NOT NULL "
+    "AND (graduated IS NULL OR substr(graduated, 1, 4) <> CAST(graduated_year AS VARCHAR))"
+)
+
+
+def upgrade():
+    op.add_column('mathematician', sa.Column('graduated_year', sa.Integer(), nullable=True))
+    op.drop_index('ix_mathematician_graduated_year', table_name='mathematician')
+    # stop the crawler first, rows it writes behind the backfill would be missed
+    with op.get_context().autocommit_block():
+        _in_batches(BACKFILL)
+        op.create_index(
+            'ix_mathematician_graduated_year',
+            'mathematician',
+            ['graduated_year'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        _in_batches(RESTORE)
+    op.drop_index('ix_mathematician_graduated_year', table_name='mathematician')
+    op.drop_column('mathematician', 'graduated_year')
+    op.create_index(
+        'ix_mathematician_graduated_year',
+        'mathematician',
+        [sa.text('substr(graduated, 1, 4)')],
+        unique=False,
+    )
+
+
+def _in_batches(statement):
+    # each statement commits on its own inside an autocommit block
+    connection = op.get_bind()
+    low, high = connection.execute(sa.text("SELECT MIN(id), MAX(id) FROM mathematician")).first()
+    if low is None:
+        return
+    for start in range(low, high + 1, BATCH_SIZE):
+        connection.execute(statement, {"low": start, "high": start + BATCH_SIZE})
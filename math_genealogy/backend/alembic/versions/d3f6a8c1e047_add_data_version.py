@@ -0,0 +1,31 @@
+"""add data version
+
+Revision ID: d3f6a8c1e047
+Revises: b5d82f4e7a19
+Create Date: 2026-10-18 21:48:05.631927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd3f6a8c1e047'
+down_revision = 'b5d82f4e7a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_version = op.create_table(
+        'data_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    # the only row, counted up by every write
+    op.bulk_insert(data_version, [{'id': 1, 'version': 0}])
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,38 @@
+"""add mathematician updated_at
+
+Revision ID: e4a9c1d7b362
+Revises: c7f1e3a2d940
+Create Date: 2026-10-18 19:21:45.902113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4a9c1d7b362'
+down_revision = 'c7f1e3a2d940'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # a non-volatile default is stored in the catalog, so adding the column leaves the
+    # existing mathematician rows as they are and they all read the time of the migration
+    op.add_column(
+        'mathematician',
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_mathematician_updated_at',
+            'mathematician',
+            ['updated_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index('ix_mathematician_updated_at', table_name='mathematician')
+    op.drop_column('mathematician', 'updated_at')
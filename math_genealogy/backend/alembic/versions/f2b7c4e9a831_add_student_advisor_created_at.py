@@ -0,0 +1,38 @@
+"""add student_advisor created_at
+
+Revision ID: f2b7c4e9a831
+Revises: d3f6a8c1e047
+Create Date: 2026-10-18 23:02:17.318540
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b7c4e9a831'
+down_revision = 'd3f6a8c1e047'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # edges stored before this migration get its time as created_at, PostgreSQL keeps
+    # that value with the column instead of writing it into every row
+    op.add_column(
+        'student_advisor',
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_student_advisor_created_at',
+            'student_advisor',
+            ['created_at'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade():
+    op.drop_index('ix_student_advisor_created_at', table_name='student_advisor')
+    op.drop_column('student_advisor', 'created_at')
@@ -1,9 +1,20 @@
+import json
 import logging
-from typing import List, Dict
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Query, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
 
+import math_genealogy.backend.async_db as async_db
 import math_genealogy.backend.db as db
+import math_genealogy.backend.graph as graph
+import math_genealogy.backend.search as search
+from .. import metrics
+from ..config import CONFIG
+from .cache import get_mathematician_cache
 from .models import PydanticMathematician as Mathematician
 
 
@@ -11,44 +22,122 @@ from .models import PydanticMathematician as Mathematician
 logger = logging.getLogger(__name__)
 
 
+REQUEST_SECONDS = metrics.Histogram(
+    "api_request_seconds", "Seconds to serve a request, including the response body", ["endpoint"]
+)
+
+
+REQUESTS = metrics.Counter("api_requests_total", "Requests served, by endpoint and status", ["endpoint", "status"])
+
+
+REQUEST_QUERIES = metrics.Histogram(
+    "api_request_queries",
+    "Database queries run to serve a request",
+    ["endpoint"],
+    buckets=(0, 1, 2, 3, 5, 10, 25, 50, 100, 250, 1000),
+)
+
+
+CACHE_EVENTS = metrics.FunctionCounter(
+    "api_cache_events_total",
+    "Lookups and removals of the mathematician cache, see /cache/stats",
+    lambda: {(event,): count for event, count in get_mathematician_cache().stats.as_dict().items()},
+    ["event"],
+)
+
+
+class RequestMetricsMiddleware:
+    """
+    Records the latency, status and number of database queries of each request by the
+    name of the endpoint function that served it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.REGISTRY.enabled:
+            await self.app(scope, receive, send)
+            return
+        queries = metrics.count_queries()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # the router sets the endpoint of the matching route
+            endpoint = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS.inc(endpoint=endpoint, status=status[0])
+            REQUEST_QUERIES.observe(queries.count, endpoint=endpoint)
+
+
 app = FastAPI()
 
 
+app.add_middleware(RequestMetricsMiddleware)
+
+
+if metrics.REGISTRY.enabled:
+    metrics.instrument_queries()
+
+
+# read endpoints with sync and async implementations, only one of which is served
+reads = APIRouter()
+
+
+async_reads = APIRouter()
+
+
 # TODO: blanket error handling
 
 
 # TODO: set up auth
 
 
-@app.get("/mathematicians/{mathematician_id}")
-def read_mathematician(mathematician_id: int) -> Mathematician:
-    mathematician = db.get_mathematician_by_id(mathematician_id)
+@reads.get("/mathematicians/{mathematician_id}")
+def read_mathematician(mathematician_id: int, session: Session = Depends(db.get_session)) -> Mathematician:
+    mathematician = db.get_mathematician_by_id(mathematician_id, session)
     if mathematician:
         return mathematician
     raise HTTPException(status_code=404, detail="Item not found")
 
 
 @app.post("/mathematicians")
-def insert_mathematician(mathematician: Mathematician) -> Mathematician:
-    if db.get_mathematician_by_id(mathematician.id):
+def insert_mathematician(
+    mathematician: Mathematician, session: Session = Depends(db.get_session)
+) -> Mathematician:
+    inserted = db.insert_mathematician(mathematician, session)
+    if inserted is None:
         raise HTTPException(status_code=409, detail="Item already exists.")
-    inserted = db.insert_mathematician(mathematician)
+    search.index_mathematician(inserted)
     return inserted
 
 
 @app.put("/mathematicians/{mathematician_id}")
-def update_mathematician(mathematician_id: int, mathematician: Mathematician) -> Mathematician:
-    updated = db.update_mathematician(mathematician_id, mathematician)
+def update_mathematician(
+    mathematician_id: int, mathematician: Mathematician, session: Session = Depends(db.get_session)
+) -> Mathematician:
+    updated = db.update_mathematician(mathematician_id, mathematician, session)
     if updated is None:
         raise HTTPException(status_code=404, detail="Item not found")
+    search.index_mathematician(updated)
     return updated
 
 
 @app.delete("/mathematicians/{mathematician_id}")
-def delete_mathematician(mathematician_id: int) -> Mathematician:
-    deleted = db.delete_mathematician(mathematician_id)
+def delete_mathematician(mathematician_id: int, session: Session = Depends(db.get_session)) -> Mathematician:
+    deleted = db.delete_mathematician(mathematician_id, session)
     if deleted is None:
         raise HTTPException(status_code=404, detail="Item not found")
+    graph.remove_mathematician(mathematician_id)
+    search.unindex_mathematician(mathematician_id)
     return deleted
 
 
@@ -57,32 +146,238 @@ def get_mathematician_field_names() -> List[str]:
     return list(db.MATHEMATICIAN_FIELDS)
 
 
-# TODO: search
-@app.get("/mathematicians")
+@app.get("/cache/stats")
+def get_cache_stats() -> Dict[str, int]:
+    return get_mathematician_cache().stats.as_dict()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics() -> PlainTextResponse:
+    if not metrics.REGISTRY.enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled, see METRICS_ENABLED")
+    # version of the Prometheus text format
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/search")
+def search_mathematicians(
+    q: str,
+    page: int = Query(1, ge=1),
+    perpage: int = Query(20, ge=1, le=100),
+    session: Session = Depends(db.get_session),
+) -> List[Mathematician]:
+    # ranked matches of words starting with every word of q, see math_genealogy.backend.search
+    if not search.searchable(search.search_terms(q)[:search.MAX_SEARCH_TERMS]):
+        raise HTTPException(
+            status_code=400, detail=f"Search for at least one word of {search.MIN_PREFIX_LENGTH} or more characters"
+        )
+    return search.search_mathematicians(q, page, perpage, session)
+
+
+def mathematician_filters(
+    country: Optional[List[str]] = Query(None),
+    school: Optional[List[str]] = Query(None),
+    subject: Optional[List[str]] = Query(None),
+    graduated_min: Optional[int] = None,
+    graduated_max: Optional[int] = None,
+    publications_min: Optional[int] = None,
+    publications_max: Optional[int] = None,
+    citations_min: Optional[int] = None,
+    citations_max: Optional[int] = None,
+) -> db.MathematicianFilters:
+    # repeat a value parameter to match any of its values, e.g. ?country=France&country=Germany
+    values = {"country": country, "school": school, "subject": subject}
+    ranges = {
+        "graduated": (graduated_min, graduated_max),
+        "publications": (publications_min, publications_max),
+        "citations": (citations_min, citations_max),
+    }
+    return db.MathematicianFilters(
+        {field: value for field, value in values.items() if value},
+        {field: bounds for field, bounds in ranges.items() if bounds != (None, None)},
+    )
+
+
+@reads.get("/mathematicians")
 def query_mathematicians(
+    response: Response,
     page: int = 1,
-    perpage: int = 100,
+    perpage: int = Query(100, ge=1),
     fields: str = "*",
     order_by: str = "id",
     descending: str = "false",
+    cursor: Optional[str] = None,
+    filters: db.MathematicianFilters = Depends(mathematician_filters),
+    session: Session = Depends(db.get_session),
 ) -> List[Dict]:
+    fields, order_by, descending = _parse_query_parameters(fields, order_by, descending)
+    try:
+        result = db.get_mathematicians(page, perpage, fields, order_by, descending, cursor, session, filters)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _mathematician_page_response(result, response)
+
+
+def _parse_query_parameters(fields: str, order_by: str, descending: str):
     if fields != "*":
         fields = [field.strip() for field in fields.split(",")]
     order_by = [field.strip() for field in order_by.split(",")]
     descending = descending.strip().lower() == "true"
-    return db.get_mathematicians(page, perpage, fields, order_by, descending)
+    return fields, order_by, descending
+
+
+def _mathematician_page_response(result: db.MathematicianPage, response: Response) -> List[Dict]:
+    # pass the cursor back to fetch the next page without an OFFSET scan
+    if result.next_cursor:
+        response.headers["X-Next-Cursor"] = result.next_cursor
+    return result.rows
 
 
 # relationships
-@app.get("/mathematicians/{mathematician_id}/students")
-def get_mathematician_students(mathematician_id: int) -> List[Mathematician]:
+@reads.get("/mathematicians/{mathematician_id}/students")
+def get_mathematician_students(
+    mathematician_id: int, session: Session = Depends(db.get_session)
+) -> List[Mathematician]:
+    student_ids = graph.get_graph_index().get_students(mathematician_id)
+    students = db.get_related_mathematicians(mathematician_id, student_ids, session)
+    if students is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return students
+
+
+@reads.get("/mathematicians/{mathematician_id}/advisors")
+def get_mathematician_advisors(
+    mathematician_id: int, session: Session = Depends(db.get_session)
+) -> List[Mathematician]:
+    advisor_ids = graph.get_graph_index().get_advisors(mathematician_id)
+    advisors = db.get_related_mathematicians(mathematician_id, advisor_ids, session)
+    if advisors is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return advisors
+
+
+@app.get("/mathematicians/{mathematician_id}/path/{other_id}")
+def get_shortest_path(
+    mathematician_id: int, other_id: int, session: Session = Depends(db.get_session)
+) -> List[Mathematician]:
+    for id_ in (mathematician_id, other_id):
+        if not db.get_mathematician_by_id(id_, session):
+            raise HTTPException(status_code=404, detail="Item not found")
+    path = graph.get_shortest_path(mathematician_id, other_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="No path found")
+    return db.get_mathematicians_by_ids(path, session)
+
+
+# rows of a traversal are looked up in the database this many at a time
+TRAVERSAL_CHUNK_SIZE = 1000
+
+
+@app.get("/mathematicians/{mathematician_id}/descendants")
+def get_mathematician_descendants(
+    mathematician_id: int,
+    max_depth: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1),
+    fields: str = "id",
+) -> StreamingResponse:
     if not db.get_mathematician_by_id(mathematician_id):
         raise HTTPException(status_code=404, detail="Item not found")
-    return db.get_students(mathematician_id)
+    nodes = graph.get_graph_index().descendants(mathematician_id, max_depth, limit)
+    return _stream_traversal(nodes, fields)
 
 
-@app.get("/mathematicians/{mathematician_id}/advisors")
-def get_mathematician_advisors(mathematician_id: int) -> List[Mathematician]:
+@app.get("/mathematicians/{mathematician_id}/ancestors")
+def get_mathematician_ancestors(
+    mathematician_id: int,
+    max_depth: Optional[int] = Query(None, ge=1),
+    limit: Optional[int] = Query(None, ge=1),
+    fields: str = "id",
+) -> StreamingResponse:
     if not db.get_mathematician_by_id(mathematician_id):
         raise HTTPException(status_code=404, detail="Item not found")
-    return db.get_advisors(mathematician_id)
+    nodes = graph.get_graph_index().ancestors(mathematician_id, max_depth, limit)
+    return _stream_traversal(nodes, fields)
+
+
+def _stream_traversal(nodes: Iterator[Tuple[int, int]], fields: str) -> StreamingResponse:
+    """
+    Stream (id, depth) pairs of a traversal as newline delimited JSON. Fields other than
+    the id are looked up in chunks, so the first rows are sent before the walk finishes.
+    """
+    fields = list(db.MATHEMATICIAN_FIELDS) if fields == "*" else [field.strip() for field in fields.split(",")]
+    fields = [field for field in fields if field in db.MATHEMATICIAN_FIELDS and field != "id"]
+
+    def lines():
+        chunk = []
+        for node in nodes:
+            chunk.append(node)
+            if len(chunk) >= TRAVERSAL_CHUNK_SIZE:
+                yield from _traversal_lines(chunk, fields)
+                chunk = []
+        yield from _traversal_lines(chunk, fields)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+def _traversal_lines(chunk: List[Tuple[int, int]], fields: List[str]) -> Iterator[str]:
+    rows = db.get_mathematician_fields_by_ids([id_ for (id_, _) in chunk], fields) if fields else {}
+    for id_, depth in chunk:
+        row = {"id": id_, "depth": depth}
+        row.update(rows.get(id_, {}))
+        yield json.dumps(row) + "\n"
+
+
+# async reads
+@async_reads.get("/mathematicians/{mathematician_id}")
+async def read_mathematician_async(
+    mathematician_id: int, session: AsyncSession = Depends(async_db.get_async_session)
+) -> Mathematician:
+    mathematician = await async_db.get_mathematician_by_id(mathematician_id, session)
+    if mathematician:
+        return mathematician
+    raise HTTPException(status_code=404, detail="Item not found")
+
+
+@async_reads.get("/mathematicians")
+async def query_mathematicians_async(
+    response: Response,
+    page: int = 1,
+    perpage: int = Query(100, ge=1),
+    fields: str = "*",
+    order_by: str = "id",
+    descending: str = "false",
+    cursor: Optional[str] = None,
+    filters: db.MathematicianFilters = Depends(mathematician_filters),
+    session: AsyncSession = Depends(async_db.get_async_session),
+) -> List[Dict]:
+    fields, order_by, descending = _parse_query_parameters(fields, order_by, descending)
+    try:
+        result = await async_db.get_mathematicians(
+            page, perpage, fields, order_by, descending, session, cursor, filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return _mathematician_page_response(result, response)
+
+
+@async_reads.get("/mathematicians/{mathematician_id}/students")
+async def get_mathematician_students_async(
+    mathematician_id: int, session: AsyncSession = Depends(async_db.get_async_session)
+) -> List[Mathematician]:
+    students = await async_db.get_students(mathematician_id, session)
+    if students is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return students
+
+
+@async_reads.get("/mathematicians/{mathematician_id}/advisors")
+async def get_mathematician_advisors_async(
+    mathematician_id: int, session: AsyncSession = Depends(async_db.get_async_session)
+) -> List[Mathematician]:
+    advisors = await async_db.get_advisors(mathematician_id, session)
+    if advisors is None:
+        raise HTTPException(status_code=404, detail="Item not found")
+    return advisors
+
+
+app.include_router(async_reads if CONFIG.db_async else reads)
@@ -0,0 +1,123 @@
+"""
+Async counterparts of the read functions in math_genealogy.backend.db.
+
+Queries go through SQLAlchemy's asyncio extension with asyncpg for PostgreSQL or
+aiosqlite for local SQLite databases, so a request waiting on the database does not tie
+up a worker thread. The engine is created on first use, which keeps the async drivers
+optional for everything else in the package.
+"""
+import logging
+from typing import AsyncIterator, List, Optional
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from ..config import CONFIG
+from .cache import get_mathematician_cache
+from .db import (
+    NO_FILTERS,
+    Mathematician,
+    MathematicianFilters,
+    MathematicianPage,
+    build_mathematicians_query,
+    engine_options,
+    relationship_rows,
+    relationship_statement,
+)
+from .models import PydanticMathematician
+
+
+logger = logging.getLogger(__name__)
+
+
+ASYNC_DRIVERS = {
+    "postgresql": "asyncpg",
+    "sqlite": "aiosqlite",
+}
+
+
+def async_connection_url(db_connection: str) -> str:
+    """
+    Swap the driver of a connection string for its async counterpart.
+    """
+    url = make_url(db_connection)
+    backend = url.get_backend_name()
+    try:
+        driver = ASYNC_DRIVERS[backend]
+    except KeyError:
+        raise ValueError(f"No async driver available for database backend {backend!r}")
+    return str(url.set(drivername=f"{backend}+{driver}"))
+
+
+_engine: Optional[AsyncEngine] = None
+
+
+AsyncSessionMaker: Optional[sessionmaker] = None
+
+
+def get_async_engine() -> AsyncEngine:
+    global _engine, AsyncSessionMaker
+    if _engine is None:
+        options = engine_options(CONFIG)
+        options.pop("connect_args", None)
+        _engine = create_async_engine(async_connection_url(CONFIG.db_connection), **options)
+        AsyncSessionMaker = sessionmaker(_engine, class_=AsyncSession, expire_on_commit=False)
+    return _engine
+
+
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """
+    FastAPI dependency providing one async session per request.
+    """
+    get_async_engine()
+    async with AsyncSessionMaker() as session:
+        yield session
+
+
+async def get_mathematician_by_id(id_: int, session: AsyncSession) -> Optional[PydanticMathematician]:
+    """
+    Return a mathematician from the database with a given id.
+    """
+    cache = get_mathematician_cache()
+    cached = cache.get(id_)
+    if cached is not None:
+        return cached
+    model = await session.get(Mathematician, id_)
+    if model is None:
+        return model
+    mathematician = model.as_pydantic
+    cache.set(mathematician)
+    return mathematician
+
+
+async def get_students(id_: int, session: AsyncSession) -> Optional[List[PydanticMathematician]]:
+    """
+    Return the students of a mathematician, or None if there is no such mathematician.
+    """
+    return relationship_rows(await session.execute(relationship_statement(id_, "students")))
+
+
+async def get_advisors(id_: int, session: AsyncSession) -> Optional[List[PydanticMathematician]]:
+    """
+    Return the advisors of a mathematician, or None if there is no such mathematician.
+    """
+    return relationship_rows(await session.execute(relationship_statement(id_, "advisors")))
+
+
+async def get_mathematicians(
+    page: int,
+    perpage: int,
+    fields: List[str],
+    order_by: List[str],
+    descending: bool,
+    session: AsyncSession,
+    cursor: Optional[str] = None,
+    filters: MathematicianFilters = NO_FILTERS,
+) -> MathematicianPage:
+    """
+    Return a page of mathematicians, see ``math_genealogy.backend.db.get_mathematicians``.
+    """
+    query = build_mathematicians_query(page, perpage, fields, order_by, descending, cursor, filters)
+    records = await session.execute(query.statement)
+    return query.page(records.all())
@@ -0,0 +1,156 @@
+"""
+Set-based bulk writes for scraped mathematicians.
+
+A batch of scraped items is staged in memory, deduplicated, and then written with one
+statement per table instead of one query per item, student and advisor.
+"""
+import logging
+import re
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .db import Mathematician, StudentAdvisor, bump_data_version, invalidate_on_commit
+
+
+logger = logging.getLogger(__name__)
+
+
+Edge = Tuple[int, int]  # (student_id, advisor_id)
+
+
+# item keys produced by the math_genealogy spider, mapped to mathematician columns
+ITEM_COLUMNS = {
+    "id_": "id",
+    "name": "name",
+    "school": "school",
+    "graduated": "graduated_year",
+    "thesis": "thesis",
+    "nationality": "country",
+    "subject": "subject",
+    "math_genealogy_url": "math_genealogy_url",
+    "math_sci_net_url": "math_sci_net_url",
+    "publications": "publications",
+    "citations": "citations",
+}
+
+
+def graduated_year(graduated) -> Optional[int]:
+    """
+    Return the year of a scraped graduated value. The spider scrapes it as an integer,
+    items archived before that may hold text starting with the year.
+    """
+    if graduated is None or isinstance(graduated, int):
+        return graduated
+    match = re.match(r"\d{4}", str(graduated))
+    return int(match.group()) if match else None
+
+
+class MathematicianBatch:
+    """
+    Staging area for one batch of scraped mathematician items.
+
+    Rows are keyed by id so that a mathematician scraped twice in the same batch is
+    written once, with the last scraped values winning. Edges are kept as a set of
+    (student_id, advisor_id) pairs.
+    """
+
+    def __init__(self, items: Iterable[Dict] = ()):
+        self.rows: Dict[int, Dict] = {}
+        self.edges: Set[Edge] = set()
+        for item in items:
+            self.add(item)
+
+    def add(self, item: Dict):
+        id_ = int(item["id_"])
+        row = {column: item.get(key) for (key, column) in ITEM_COLUMNS.items()}
+        row["id"] = id_
+        row["graduated_year"] = graduated_year(row["graduated_year"])
+        self.rows[id_] = row
+        for student_id in item.get("student_ids", []):
+            self.edges.add((int(student_id), id_))
+        for advisor_id in item.get("advisor_ids", []):
+            self.edges.add((id_, int(advisor_id)))
+
+    @property
+    def stub_ids(self) -> Set[int]:
+        """
+        Ids that only appear as a student or advisor of an item in the batch.
+        """
+        ids = {id_ for edge in self.edges for id_ in edge}
+        return ids - self.rows.keys()
+
+    def __len__(self):
+        return len(self.rows)
+
+
+def get_insert(session: Session, table):
+    """
+    Return a dialect specific insert construct supporting ``ON CONFLICT`` clauses.
+    """
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(table)
+    if dialect == "sqlite":
+        return sqlite.insert(table)
+    raise NotImplementedError(f"Bulk upserts are not supported for dialect {dialect!r}")
+
+
+def upsert_mathematicians(session: Session, rows: List[Dict]):
+    """
+    Insert mathematicians, overwriting every column of rows that already exist.
+    """
+    if not rows:
+        return
+    table = Mathematician.__table__
+    insert = get_insert(session, table)
+    updates = {column: insert.excluded[column] for column in ITEM_COLUMNS.values() if column != "id"}
+    updates["updated_at"] = func.now()
+    stmt = insert.on_conflict_do_update(index_elements=[table.c.id], set_=updates)
+    session.execute(stmt, rows)
+
+
+def insert_stub_mathematicians(session: Session, ids: Iterable[int]):
+    """
+    Insert id-only rows for mathematicians that have not been scraped yet.
+    Existing rows are left untouched.
+    """
+    rows = [{"id": id_} for id_ in sorted(ids)]
+    if not rows:
+        return
+    table = Mathematician.__table__
+    stmt = get_insert(session, table).on_conflict_do_nothing(index_elements=[table.c.id])
+    session.execute(stmt, rows)
+
+
+def insert_student_advisor_edges(session: Session, edges: Set[Edge]):
+    """
+    Insert student/advisor edges, skipping pairs that are already in the database.
+    """
+    if not edges:
+        return
+    table = StudentAdvisor.__table__
+    stmt = get_insert(session, table).on_conflict_do_nothing(
+        index_elements=[table.c.student_id, table.c.advisor_id]
+    )
+    session.execute(
+        stmt,
+        [
+            {"student_id": student_id, "advisor_id": advisor_id}
+            for (student_id, advisor_id) in sorted(edges)
+        ],
+    )
+
+
+def write_batch(session: Session, batch: MathematicianBatch):
+    """
+    Write a staged batch. The caller is responsible for committing the session, which
+    drops the written mathematicians from the cache.
+    """
+    upsert_mathematicians(session, list(batch.rows.values()))
+    insert_stub_mathematicians(session, batch.stub_ids)
+    insert_student_advisor_edges(session, batch.edges)
+    bump_data_version(session)
+    invalidate_on_commit(session, batch.rows)
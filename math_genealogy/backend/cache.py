@@ -0,0 +1,233 @@
+"""
+Read-through cache of mathematicians keyed by id.
+
+The API is read heavy and the data mostly changes while a crawl runs, so lookups by id
+are served from a bounded in-process LRU cache with a time to live. The write functions
+in math_genealogy.backend.db invalidate the ids they touch in their own process, and
+count every write in the ``data_version`` table. Each process watches that version in a
+background thread, every CACHE_VERSION_INTERVAL seconds, and empties its cache when
+another process, the crawler or another API worker, has written since. A shared backend,
+such as a Redis client, can be plugged in with ``set_mathematician_cache`` instead.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+from ..config import CONFIG
+from .models import PydanticMathematician
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+class MathematicianCache:
+    """
+    Interface of the mathematician cache backends. A missing entry is returned as None,
+    so only mathematicians that exist are cached.
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, id_: int) -> Optional[PydanticMathematician]:
+        raise NotImplementedError
+
+    def set(self, mathematician: PydanticMathematician):
+        raise NotImplementedError
+
+    def invalidate(self, ids: Iterable[int]):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def watch_version(self, read_version: Callable[[], int], interval: float):
+        """
+        Drop every entry whenever ``read_version`` returns a new value. Backends shared
+        between processes see every invalidation already and ignore this.
+        """
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, PydanticMathematician]:
+        found = {}
+        for id_ in ids:
+            mathematician = self.get(id_)
+            if mathematician is not None:
+                found[id_] = mathematician
+        return found
+
+
+class LRUCache(MathematicianCache):
+    """
+    In-process cache holding at most ``maxsize`` mathematicians for ``ttl`` seconds each.
+    The least recently used entry is evicted when the cache is full. A ``maxsize`` of 0
+    disables caching.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        super().__init__()
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._read_version: Optional[Callable[[], int]] = None
+        self._version_interval = 0.0
+        # pid of the process the version is watched in, a forked worker starts its own thread
+        self._watching_pid: Optional[int] = None
+        self._stop_watching = threading.Event()
+
+    def watch_version(self, read_version: Callable[[], int], interval: float):
+        """
+        Check ``read_version`` every ``interval`` seconds in a background thread, started
+        on the first lookup, and drop every entry when it changed.
+        """
+        self._read_version = read_version
+        self._version_interval = interval
+        self._stop_watching.clear()
+
+    def stop_watching(self):
+        self._read_version = None
+        self._watching_pid = None
+        self._stop_watching.set()
+
+    def _watch(self):
+        if self._read_version is None or self._watching_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watching_pid == os.getpid():
+                return
+            self._watching_pid = os.getpid()
+        threading.Thread(target=self._poll_version, name="mathematician-cache-version", daemon=True).start()
+
+    def _poll_version(self):
+        # entries cached before the first check are dropped by it
+        version = None
+        read_version = self._read_version
+        while not self._stop_watching.is_set():
+            try:
+                latest = read_version()
+            except Exception:
+                logger.exception("Could not read the data version, keeping the cached mathematicians")
+            else:
+                if latest != version:
+                    self.clear()
+                    version = latest
+            self._stop_watching.wait(self._version_interval)
+
+    def get(self, id_: int) -> Optional[PydanticMathematician]:
+        self._watch()
+        with self._lock:
+            entry = self._entries.get(id_)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            expires_at, mathematician = entry
+            if expires_at <= self.clock():
+                del self._entries[id_]
+                self.stats.expirations += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(id_)
+            self.stats.hits += 1
+            return mathematician
+
+    def set(self, mathematician: PydanticMathematician):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[mathematician.id] = (self.clock() + self.ttl, mathematician)
+            self._entries.move_to_end(mathematician.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def invalidate(self, ids: Iterable[int]):
+        with self._lock:
+            for id_ in ids:
+                self._entries.pop(id_, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedCache(MathematicianCache):
+    """
+    Cache backed by a key value store shared between processes. ``client`` needs the
+    ``get(key)``, ``set(key, value, ex=seconds)``, ``delete(*keys)`` and
+    ``scan_iter(match=pattern)`` methods of a redis-py client. Size based eviction is
+    left to the store.
+    """
+
+    def __init__(self, client, ttl: int, prefix: str = "math_genealogy:mathematician:"):
+        super().__init__()
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, id_: int) -> str:
+        return f"{self.prefix}{id_}"
+
+    def get(self, id_: int) -> Optional[PydanticMathematician]:
+        value = self.client.get(self._key(id_))
+        if value is None:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return PydanticMathematician.parse_raw(value)
+
+    def set(self, mathematician: PydanticMathematician):
+        self.client.set(self._key(mathematician.id), mathematician.json(), ex=self.ttl)
+
+    def invalidate(self, ids: Iterable[int]):
+        keys = [self._key(id_) for id_ in ids]
+        if keys:
+            self.client.delete(*keys)
+
+    def clear(self):
+        # SCAN walks the keyspace in steps without blocking the store, unlike KEYS
+        keys = []
+        for key in self.client.scan_iter(match=f"{self.prefix}*"):
+            keys.append(key)
+            if len(keys) >= 1000:
+                self.client.delete(*keys)
+                keys = []
+        if keys:
+            self.client.delete(*keys)
+
+
+_mathematician_cache: MathematicianCache = LRUCache(CONFIG.cache_size, CONFIG.cache_ttl)
+
+
+def get_mathematician_cache() -> MathematicianCache:
+    return _mathematician_cache
+
+
+def set_mathematician_cache(cache: MathematicianCache):
+    """
+    Replace the cache used by the data access functions, e.g. with a ``SharedCache``.
+    """
+    global _mathematician_cache
+    _mathematician_cache = cache
@@ -0,0 +1,211 @@
+"""
+Bulk loading of scraped mathematicians with PostgreSQL ``COPY``.
+
+For full backfills even the batched upserts of math_genealogy.backend.bulk spend most of
+their time binding parameters. Here each batch is streamed into temporary staging tables
+with ``COPY FROM STDIN`` and merged into the mathematician and student_advisor tables
+with a single statement, which upserts the scraped rows, inserts id-only stubs for their
+unscraped students and advisors and skips edges that already exist. Databases other
+than PostgreSQL fall back to ``write_batch``.
+
+Items can come from the math_genealogy spider, through SqlalchemyWriterPipeline with
+BULK_LOADER = "copy", or from the files archived by SampleJsonWriterPipeline, see
+scripts/load_mathematicians.py.
+"""
+import io
+import json
+import logging
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .bulk import ITEM_COLUMNS, MathematicianBatch, write_batch
+from .db import bump_data_version, invalidate_on_commit
+
+
+logger = logging.getLogger(__name__)
+
+
+MATHEMATICIAN_COLUMNS = list(ITEM_COLUMNS.values())
+
+
+EDGE_COLUMNS = ["student_id", "advisor_id"]
+
+
+PREPARE_STAGING = [
+    "CREATE TEMPORARY TABLE IF NOT EXISTS mathematician_staging (LIKE mathematician)",
+    "CREATE TEMPORARY TABLE IF NOT EXISTS student_advisor_staging (student_id integer, advisor_id integer)",
+    "TRUNCATE mathematician_staging, student_advisor_staging",
+]
+
+
+_columns = ", ".join(MATHEMATICIAN_COLUMNS)
+
+
+_updates = ", ".join(
+    [f"{column} = excluded.{column}" for column in MATHEMATICIAN_COLUMNS if column != "id"] + ["updated_at = now()"]
+)
+
+
+# stubs exclude the staged ids, since the sub-statements of one statement cannot see each
+# other's rows and a stub would conflict with the upsert of the same id
+MERGE_STAGING = f"""
+WITH upserted AS (
+    INSERT INTO mathematician ({_columns})
+    SELECT {_columns} FROM mathematician_staging
+    ON CONFLICT (id) DO UPDATE SET {_updates}
+), stubs AS (
+    INSERT INTO mathematician (id)
+    SELECT linked.id FROM (
+        SELECT student_id AS id FROM student_advisor_staging
+        UNION
+        SELECT advisor_id AS id FROM student_advisor_staging
+    ) AS linked
+    WHERE linked.id NOT IN (SELECT id FROM mathematician_staging)
+    ON CONFLICT (id) DO NOTHING
+)
+INSERT INTO student_advisor (student_id, advisor_id)
+SELECT DISTINCT student_id, advisor_id FROM student_advisor_staging
+ON CONFLICT (student_id, advisor_id) DO NOTHING
+"""
+
+
+class LoadStats:
+    def __init__(self):
+        self.rows = 0
+        self.edges = 0
+        self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def add(self, batch: MathematicianBatch, seconds: float):
+        self.rows += len(batch)
+        self.edges += len(batch.edges)
+        self.batches += 1
+        self.seconds += seconds
+
+    def __str__(self):
+        return (
+            f"{self.rows} mathematicians and {self.edges} student/advisor edges in {self.batches} batches, "
+            f"{self.seconds:.2f}s, {self.rows_per_second:.0f} rows/s"
+        )
+
+
+def copy_value(value) -> str:
+    """
+    Format a value as a field of the text format of ``COPY``.
+    """
+    if value is None:
+        return "\\N"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def copy_rows(rows: Iterable[Sequence]) -> io.StringIO:
+    """
+    Serialize rows into a buffer to be read by ``COPY ... FROM STDIN``.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+def copy_supported(session: Session) -> bool:
+    dialect = session.get_bind().dialect
+    return dialect.name == "postgresql" and dialect.driver in ("psycopg2", "pg8000")
+
+
+def _copy_from(session: Session, table: str, columns: List[str], buffer: io.StringIO):
+    connection = session.connection().connection
+    cursor = connection.cursor()
+    sql = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    try:
+        if session.get_bind().dialect.driver == "psycopg2":
+            cursor.copy_expert(sql, buffer)
+        else:
+            cursor.execute(sql, stream=buffer)
+    finally:
+        cursor.close()
+
+
+def copy_batch(session: Session, batch: MathematicianBatch):
+    """
+    Write a staged batch with ``COPY`` and one merge statement, or with ``write_batch``
+    if the database does not support it. The caller is responsible for committing the
+    session.
+    """
+    if not copy_supported(session):
+        write_batch(session, batch)
+        return
+    for statement in PREPARE_STAGING:
+        session.execute(text(statement))
+    rows = ([row[column] for column in MATHEMATICIAN_COLUMNS] for row in batch.rows.values())
+    _copy_from(session, "mathematician_staging", MATHEMATICIAN_COLUMNS, copy_rows(rows))
+    _copy_from(session, "student_advisor_staging", EDGE_COLUMNS, copy_rows(sorted(batch.edges)))
+    session.execute(text(MERGE_STAGING))
+    bump_data_version(session)
+    invalidate_on_commit(session, batch.rows)
+
+
+def read_json_items(lines: Iterable[str]) -> Iterator[Dict]:
+    """
+    Read the items of a .json file written by SampleJsonWriterPipeline before it wrote
+    line-delimited JSON, one line at a time.
+
+    Those files have one item per line followed by a comma, including the last one, so
+    they are not valid JSON, and a killed crawl left them without their closing
+    brackets. Both are accepted.
+    """
+    for line in lines:
+        line = line.strip().rstrip(",")
+        if not line.startswith("{") or line.startswith('{"mathematicians"'):
+            continue
+        yield json.loads(line)
+
+
+def load_items(
+    session_factory: Callable[[], Session],
+    items: Iterable[Dict],
+    batch_size: int = 10000,
+) -> LoadStats:
+    """
+    Load items in batches of ``batch_size``, committing after each batch.
+    """
+    stats = LoadStats()
+    batch = MathematicianBatch()
+    for item in items:
+        batch.add(item)
+        if len(batch) >= batch_size:
+            _load_batch(session_factory, batch, stats)
+            batch = MathematicianBatch()
+    if len(batch):
+        _load_batch(session_factory, batch, stats)
+    return stats
+
+
+def _load_batch(session_factory: Callable[[], Session], batch: MathematicianBatch, stats: LoadStats):
+    start = time.perf_counter()
+    session = session_factory()
+    try:
+        copy_batch(session, batch)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    stats.add(batch, time.perf_counter() - start)
+    logger.info("Loaded %s", stats)
@@ -1,12 +1,24 @@
+import asyncio
+import base64
+import json
 import logging
-import re
-from typing import List, Union, Dict, Optional
+import weakref
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterable, Iterator, List, NamedTuple, Tuple, Union, Dict, Optional
 
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy import or_, Column, Integer, String, ForeignKey, create_engine
-
-from ..config import CONFIG
+from sqlalchemy.orm import Session as OrmSession, aliased, sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+from sqlalchemy import (
+    and_, event, func, or_, select, tuple_, BigInteger, Column, DateTime, Integer, String, ForeignKey, Index,
+    create_engine,
+)
+
+from ..config import CONFIG, Config
+from .cache import get_mathematician_cache
 from .models import PydanticMathematician
 
 
@@ -39,7 +51,8 @@ class Mathematician(BaseModel):
     id = Column(Integer, primary_key=True)
     name = Column(String)
     school = Column(String)
-    graduated = Column(String)
+    # the year of the degree. The text column graduated it replaces is no longer mapped.
+    graduated = Column("graduated_year", Integer)
     thesis = Column(String)
     country = Column(String)
     subject = Column(String)
@@ -47,6 +60,8 @@ class Mathematician(BaseModel):
     math_sci_net_url = Column(String)
     publications = Column(Integer)
     citations = Column(Integer)
+    # last insert or update, for incremental exports. Bulk upserts set it themselves.
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     @property
     def as_dict(self):
@@ -66,24 +81,12 @@ class Mathematician(BaseModel):
 
     @property
     def as_pydantic(self) -> PydanticMathematician:
-        data = self.as_dict
-        graduated = data.get("graduated")
-        if graduated is None:
-            data["graduated"] = graduated
-        else:
-            m = re.match(r"(^\d{4})-", graduated)
-            if m:
-                graduated = m.group(1)
-            data["graduated"] = int(graduated)
-        return PydanticMathematician(**data)
+        return PydanticMathematician(**self.as_dict)
 
     @classmethod
     def from_pydantic(cls, pydantic_model) -> "Mathematician":
         data = pydantic_model.dict()
 
-        graduated = data.get("graduated")
-        data["graduated"] = graduated if graduated is None else str(graduated)
-
         data["math_genealogy_url"] = _convert_pydantic_http_url_to_string(
             data.get("math_genealogy_url")
         )
@@ -115,6 +118,16 @@ MATHEMATICIAN_FIELDS = {
 }
 
 
+# fields get_mathematicians orders by with an index on (field, id), which its cursors
+# seek into in either direction. The indexes also serve the filters on these fields.
+ORDER_INDEX_FIELDS = ["name", "school", "graduated", "country", "subject", "publications", "citations"]
+
+
+for _field in ORDER_INDEX_FIELDS:
+    Index(f"ix_mathematician_{MATHEMATICIAN_FIELDS[_field].name}_id", MATHEMATICIAN_FIELDS[_field], Mathematician.id)
+Index("ix_mathematician_updated_at", Mathematician.updated_at)
+
+
 def _convert_pydantic_http_url_to_string(http_url):
     if http_url is None:
         return http_url
@@ -123,10 +136,28 @@ def _convert_pydantic_http_url_to_string(http_url):
 
 class StudentAdvisor(BaseModel):
     __tablename__ = "student_advisor"
+    __table_args__ = (
+        Index("ix_student_advisor_student_id_advisor_id", "student_id", "advisor_id", unique=True),
+        Index("ix_student_advisor_advisor_id_student_id", "advisor_id", "student_id"),
+        Index("ix_student_advisor_created_at", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     student_id = Column(Integer, ForeignKey("mathematician.id"))
     advisor_id = Column(Integer, ForeignKey("mathematician.id"))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class DataVersion(BaseModel):
+    """
+    Single row counting the transactions that wrote mathematicians or edges. Every API
+    process watches it to drop its cached mathematicians when another process, such as
+    the crawler or another API worker, changed the data.
+    """
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
 
 
 class ArxivPaper(BaseModel):
@@ -145,123 +176,542 @@ class ArxivPaper(BaseModel):
 # ------------------------------------------------------------------------
 
 
-engine = create_engine(CONFIG.db_connection)
+def engine_options(config: Config) -> Dict:
+    """
+    Connection pool settings for ``create_engine``. SQLite keeps its default pools, which
+    do not take size or overflow settings, but its connections may be closed from a
+    different thread than the one that opened them.
+    """
+    if make_url(config.db_connection).get_backend_name() == "sqlite":
+        return dict(connect_args={"check_same_thread": False})
+    return dict(
+        pool_size=config.db_pool_size,
+        max_overflow=config.db_max_overflow,
+        pool_timeout=config.db_pool_timeout,
+        pool_recycle=config.db_pool_recycle,
+        pool_pre_ping=config.db_pool_pre_ping,
+    )
+
+
+engine = create_engine(CONFIG.db_connection, **engine_options(CONFIG))
 
 
 Session = sessionmaker(bind=engine)
 
 
-def get_mathematician_by_id(id_: int) -> Optional[PydanticMathematician]:
+@contextmanager
+def session_scope(session: Optional[OrmSession] = None) -> Iterator[OrmSession]:
     """
-    Return a mathematician from the database with a given id.
+    Yield ``session`` if one is given, otherwise a new session that is closed on exit
+    so its connection goes straight back to the pool.
     """
+    if session is not None:
+        yield session
+        return
     session = Session()
     try:
-        q = session.query(Mathematician).filter(Mathematician.id == id_)
-        model = q.one_or_none()
-        if model is None:
-            return model
-        return model.as_pydantic
-    except Exception as e:
-        session.rollback()
-        raise e
+        yield session
+    finally:
+        session.close()
 
 
-def insert_mathematician(mathematician: PydanticMathematician) -> PydanticMathematician:
-    session = Session()
-    sqlalchemy_mathematician = Mathematician.from_pydantic(mathematician)
+def pool_capacity() -> Optional[int]:
+    """
+    Return the most connections sessions can hold at once, or None if the pool of the
+    engine sessions are bound to is not a bounded queue.
+    """
+    if not isinstance(Session.kw["bind"].pool, QueuePool):
+        return None
+    return CONFIG.db_pool_size + CONFIG.db_max_overflow
+
+
+def bump_data_version(session: OrmSession):
+    """
+    Count a write in the transaction of ``session``, see DataVersion. The row is created
+    by the migration adding the table, or here on first use.
+    """
+    table = DataVersion.__table__
+    result = session.execute(table.update().where(table.c.id == 1).values(version=table.c.version + 1))
+    if result.rowcount == 0:
+        session.execute(table.insert().values(id=1, version=1))
+
+
+def read_data_version(session: Optional[OrmSession] = None) -> int:
+    with session_scope(session) as session:
+        return session.query(DataVersion.version).filter(DataVersion.id == 1).scalar() or 0
+
+
+if CONFIG.cache_version_interval > 0:
+    get_mathematician_cache().watch_version(read_data_version, CONFIG.cache_version_interval)
+
+
+# key of Session.info holding the ids invalidate_on_commit drops on commit
+_INVALIDATE_ON_COMMIT = "invalidate_mathematician_ids"
+
+
+def invalidate_on_commit(session: OrmSession, ids: Iterable[int]):
+    """
+    Drop ``ids`` from the cache of mathematicians once the transaction of ``session``
+    commits. Dropped before, a read in between would cache the old rows again.
+    """
+    session.info.setdefault(_INVALIDATE_ON_COMMIT, set()).update(ids)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _invalidate_committed(session: OrmSession):
+    ids = session.info.pop(_INVALIDATE_ON_COMMIT, None)
+    if ids:
+        get_mathematician_cache().invalidate(ids)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_rolled_back(session: OrmSession):
+    session.info.pop(_INVALIDATE_ON_COMMIT, None)
+
+
+# a semaphore per event loop, since asyncio primitives belong to the loop they are used on
+_session_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+async def get_session() -> AsyncIterator[OrmSession]:
+    """
+    FastAPI dependency providing one session per request, closed once the response
+    has been sent.
+
+    Sync endpoints and their response serialization run on separate trips to the worker
+    threadpool, and the session holds its connection in between. If more requests than
+    the pool can serve got a session, every worker thread could end up blocked waiting
+    for a connection held by a request that needs a thread to finish. Requests therefore
+    wait for a free slot here, on the event loop, before they get a session. Closing the
+    session rolls back and returns its connection to the pool, a round trip to the
+    database, so it runs in a thread instead of on the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    slots = None
+    capacity = pool_capacity()
+    if capacity is not None:
+        slots = _session_slots.get(loop)
+        if slots is None:
+            slots = _session_slots[loop] = asyncio.Semaphore(capacity)
+        await slots.acquire()
     try:
-        session.add(sqlalchemy_mathematician)
-        session.commit()
-        return sqlalchemy_mathematician.as_pydantic
-    except Exception as e:
-        session.rollback()
-        raise e
+        session = Session()
+        try:
+            yield session
+        finally:
+            await loop.run_in_executor(None, session.close)
+    finally:
+        if slots is not None:
+            slots.release()
+
+
+def get_mathematician_by_id(
+    id_: int, session: Optional[OrmSession] = None
+) -> Optional[PydanticMathematician]:
+    """
+    Return a mathematician from the database with a given id.
+    """
+    cache = get_mathematician_cache()
+    cached = cache.get(id_)
+    if cached is not None:
+        return cached
+    with session_scope(session) as session:
+        try:
+            q = session.query(Mathematician).filter(Mathematician.id == id_)
+            model = q.one_or_none()
+            if model is None:
+                return model
+            mathematician = model.as_pydantic
+            cache.set(mathematician)
+            return mathematician
+        except Exception as e:
+            session.rollback()
+            raise e
+
+
+def insert_mathematician(
+    mathematician: PydanticMathematician, session: Optional[OrmSession] = None
+) -> Optional[PydanticMathematician]:
+    """
+    Insert a mathematician, returning None if one with the same id already exists.
+    """
+    with session_scope(session) as session:
+        sqlalchemy_mathematician = Mathematician.from_pydantic(mathematician)
+        try:
+            session.add(sqlalchemy_mathematician)
+            bump_data_version(session)
+            invalidate_on_commit(session, [mathematician.id])
+            session.commit()
+            return sqlalchemy_mathematician.as_pydantic
+        except IntegrityError:
+            # the primary key is the only constraint on the table
+            session.rollback()
+            return None
+        except Exception as e:
+            session.rollback()
+            raise e
 
 
 def update_mathematician(
-    id_: int, mathematician: PydanticMathematician
+    id_: int, mathematician: PydanticMathematician, session: Optional[OrmSession] = None
 ) -> Optional[PydanticMathematician]:
     mathematician.id = id_
-    session = Session()
-    update_data = Mathematician.from_pydantic(mathematician).as_dict
-    db_mathematician = session.query(Mathematician).filter(Mathematician.id == id_).one_or_none()
-    if not db_mathematician:
+    with session_scope(session) as session:
+        update_data = Mathematician.from_pydantic(mathematician).as_dict
+        db_mathematician = session.query(Mathematician).filter(Mathematician.id == id_).one_or_none()
+        if not db_mathematician:
+            return None
+        try:
+            for key, value in update_data.items():
+                setattr(db_mathematician, key, value)
+            bump_data_version(session)
+            invalidate_on_commit(session, [id_])
+            session.commit()
+            return db_mathematician.as_pydantic
+        except Exception as e:
+            session.rollback()
+            raise e
+
+
+def delete_mathematician(id_: int, session: Optional[OrmSession] = None) -> Optional[Mathematician]:
+    with session_scope(session) as session:
+        db_mathematician = session.query(Mathematician).filter(Mathematician.id == id_).one_or_none()
+        if not db_mathematician:
+            return None
+        deleted = db_mathematician.as_pydantic
+        student_advisor_relationships = session.query(StudentAdvisor).filter(
+            or_(
+                StudentAdvisor.student_id == id_,
+                StudentAdvisor.advisor_id == id_,
+            )
+        )
+        try:
+            for rel in student_advisor_relationships:
+                session.delete(rel)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        try:
+            session.delete(db_mathematician)
+            bump_data_version(session)
+            invalidate_on_commit(session, [id_])
+            session.commit()
+            return deleted
+        except Exception as e:
+            session.rollback()
+            for rel in student_advisor_relationships:
+                session.add(rel)
+            session.commit()
+            raise e
+
+
+def relationship_statement(id_: int, relation: str) -> Select:
+    """
+    Select the students or advisors of a mathematician together with the mathematician's
+    own id, so a single round trip tells a missing mathematician (no rows) apart from one
+    without students or advisors (one row with no related mathematician).
+    """
+    root = aliased(Mathematician)
+    if relation == "students":
+        on, related_id = StudentAdvisor.advisor_id == root.id, StudentAdvisor.student_id
+    elif relation == "advisors":
+        on, related_id = StudentAdvisor.student_id == root.id, StudentAdvisor.advisor_id
+    else:
+        raise ValueError(f"Invalid relation {relation!r}")
+    return (
+        select(root.id, Mathematician)
+        .select_from(root)
+        .outerjoin(StudentAdvisor, on)
+        .outerjoin(Mathematician, Mathematician.id == related_id)
+        .where(root.id == id_)
+        .order_by(Mathematician.id)
+    )
+
+
+def relationship_rows(records) -> Optional[List[PydanticMathematician]]:
+    """
+    Unpack the rows selected by ``relationship_statement``.
+    """
+    records = list(records)
+    if not records:
         return None
-    try:
-        for key, value in update_data.items():
-            setattr(db_mathematician, key, value)
-        session.commit()
-        return db_mathematician.as_pydantic
-    except Exception as e:
-        session.rollback()
-        raise e
+    return [related.as_pydantic for (_, related) in records if related is not None]
 
 
-def delete_mathematician(id_: int) -> Optional[Mathematician]:
-    session = Session()
-    db_mathematician = session.query(Mathematician).filter(Mathematician.id == id_).one_or_none()
-    if not db_mathematician:
+def get_students(id_: int, session: Optional[OrmSession] = None) -> Optional[List[PydanticMathematician]]:
+    """
+    Return the students of a mathematician, or None if there is no such mathematician.
+    """
+    with session_scope(session) as session:
+        return relationship_rows(session.execute(relationship_statement(id_, "students")))
+
+
+def get_advisors(id_: int, session: Optional[OrmSession] = None) -> Optional[List[PydanticMathematician]]:
+    """
+    Return the advisors of a mathematician, or None if there is no such mathematician.
+    """
+    with session_scope(session) as session:
+        return relationship_rows(session.execute(relationship_statement(id_, "advisors")))
+
+
+def get_related_mathematicians(
+    id_: int, related_ids: List[int], session: Optional[OrmSession] = None
+) -> Optional[List[PydanticMathematician]]:
+    """
+    Return the mathematicians with ``related_ids``, in that order, or None if there is
+    no mathematician with ``id_``. Both are answered by at most one query.
+    """
+    by_id = _get_mathematicians_by_id([id_, *related_ids], session)
+    if id_ not in by_id:
         return None
-    deleted = db_mathematician.as_pydantic
-    student_advisor_relationships = session.query(StudentAdvisor).filter(
-        or_(
-            StudentAdvisor.student_id == id_,
-            StudentAdvisor.advisor_id == id_,
-        )
-    )
-    try:
-        for rel in student_advisor_relationships:
-            session.delete(rel)
-        session.commit()
-    except Exception as e:
-        session.rollback()
-        raise e
+    return [by_id[related_id] for related_id in related_ids if related_id in by_id]
+
+
+def get_mathematicians_by_ids(
+    ids: List[int], session: Optional[OrmSession] = None
+) -> List[PydanticMathematician]:
+    """
+    Return the mathematicians with the given ids, in the order of ``ids``.
+    """
+    if not ids:
+        return []
+    by_id = _get_mathematicians_by_id(ids, session)
+    return [by_id[id_] for id_ in ids if id_ in by_id]
+
+
+def _get_mathematicians_by_id(
+    ids: List[int], session: Optional[OrmSession] = None
+) -> Dict[int, PydanticMathematician]:
+    # serve what we can from the cache and look up the rest in one query
+    cache = get_mathematician_cache()
+    by_id = cache.get_many(ids)
+    missing = [id_ for id_ in ids if id_ not in by_id]
+    if not missing:
+        return by_id
+    with session_scope(session) as session:
+        for model in session.query(Mathematician).filter(Mathematician.id.in_(missing)):
+            mathematician = model.as_pydantic
+            cache.set(mathematician)
+            by_id[model.id] = mathematician
+    return by_id
+
+
+def get_mathematician_fields_by_ids(
+    ids: List[int], fields: List[str], session: Optional[OrmSession] = None
+) -> Dict[int, Dict]:
+    """
+    Return the requested fields of the mathematicians with the given ids, keyed by id.
+    """
+    if not ids:
+        return {}
+    columns = [
+        MATHEMATICIAN_FIELDS[field] for field in fields if field in MATHEMATICIAN_FIELDS and field != "id"
+    ]
+    with session_scope(session) as session:
+        query = session.query(Mathematician.id, *columns).filter(Mathematician.id.in_(ids))
+        return {record.id: dict(record) for record in query}
+
+
+def partition_mathematician_ids(
+    required_fields: List[str], session: Optional[OrmSession] = None
+) -> Tuple[List[int], List[int]]:
+    """
+    Split the ids of all mathematicians into those with every one of ``required_fields``
+    filled in and those missing at least one, such as the id-only stub rows written for
+    students and advisors that have not been scraped yet.
+    """
     try:
-        session.delete(db_mathematician)
-        session.commit()
-        return deleted
-    except Exception as e:
-        session.rollback()
-        for rel in student_advisor_relationships:
-            session.add(rel)
-        session.commit()
-        raise e
-
-
-def get_students(id_: int) -> List[Mathematician]:
-    session = Session()
-    student_ids = session.query(StudentAdvisor.student_id).filter(StudentAdvisor.advisor_id == id_)
-    students = session.query(Mathematician).filter(Mathematician.id.in_(student_ids))
-    return [student.as_pydantic for student in students]
+        columns = [MATHEMATICIAN_FIELDS[field] for field in required_fields]
+    except KeyError as e:
+        raise ValueError(f"Invalid field {e.args[0]!r}")
+    complete = and_(*[column.isnot(None) for column in columns])
+    with session_scope(session) as session:
+        query = session.query(Mathematician.id, complete).yield_per(10000)
+        complete_ids, incomplete_ids = [], []
+        for id_, is_complete in query:
+            (complete_ids if is_complete else incomplete_ids).append(id_)
+        return complete_ids, incomplete_ids
+
+
+# fields get_mathematicians can filter on by value, and by an inclusive range
+VALUE_FILTER_FIELDS = ("country", "school", "subject")
+
+
+RANGE_FILTER_FIELDS = ("graduated", "publications", "citations")
+
+
+class MathematicianFilters(NamedTuple):
+    # field -> values, one of which the field must equal
+    values: Dict[str, List[str]]
+    # field -> (low, high) bounds, either of which may be None
+    ranges: Dict[str, Tuple[Optional[int], Optional[int]]]
+
+    def predicates(self) -> List:
+        """
+        Compile the filters to SQL, raising ValueError for fields that cannot be filtered on.
+        """
+        predicates = []
+        for field, values in self.values.items():
+            if field not in MATHEMATICIAN_FIELDS or field not in VALUE_FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on the values of {field!r}")
+            if not values:
+                continue
+            column = MATHEMATICIAN_FIELDS[field]
+            predicates.append(column == values[0] if len(values) == 1 else column.in_(values))
+        for field, (low, high) in self.ranges.items():
+            if field not in MATHEMATICIAN_FIELDS or field not in RANGE_FILTER_FIELDS:
+                raise ValueError(f"Cannot filter on a range of {field!r}")
+            if low is not None and high is not None and low > high:
+                raise ValueError(f"Empty range of {field!r}, {low} is greater than {high}")
+            column = MATHEMATICIAN_FIELDS[field]
+            if low is not None:
+                predicates.append(column >= low)
+            if high is not None:
+                predicates.append(column <= high)
+        return predicates
+
+
+NO_FILTERS = MathematicianFilters({}, {})
+
+
+class MathematicianPage(NamedTuple):
+    rows: List[Dict]
+    next_cursor: Optional[str]
+
+
+class MathematiciansQuery(NamedTuple):
+    statement: Select
+    fields: List[str]
+    order_by: List[str]
+    descending: bool
+    perpage: int
+
+    def page(self, records) -> MathematicianPage:
+        """
+        Build the page, and the cursor pointing after it, from the fetched records.
+        """
+        rows = [dict(record._mapping) for record in records]
+        next_cursor = None
+        if rows and len(rows) == self.perpage:
+            values = [rows[-1][field] for field in self.order_by]
+            next_cursor = _encode_cursor(self.order_by, self.descending, values)
+        return MathematicianPage(
+            [{field: row[field] for field in self.fields} for row in rows],
+            next_cursor,
+        )
 
 
-def get_advisors(id_: int) -> List[Mathematician]:
-    session = Session()
-    advisor_ids = session.query(StudentAdvisor.advisor_id).filter(StudentAdvisor.student_id == id_)
-    advisors = session.query(Mathematician).filter(Mathematician.id.in_(advisor_ids))
-    return [advisor.as_pydantic for advisor in advisors]
+def build_mathematicians_query(
+    page: int,
+    perpage: int,
+    fields: List[str],
+    order_by: List[str],
+    descending: bool,
+    cursor: Optional[str] = None,
+    filters: MathematicianFilters = NO_FILTERS,
+) -> MathematiciansQuery:
+    """
+    Build the select statement behind ``get_mathematicians``, shared with the async
+    data access functions.
+    """
+    # TODO: validate inputs
+
+    fields = list(MATHEMATICIAN_FIELDS) if fields == "*" else [f for f in fields if f in MATHEMATICIAN_FIELDS]
+    order_by = [field for field in order_by if field in MATHEMATICIAN_FIELDS and field != "id"] + ["id"]
+    order_columns = [MATHEMATICIAN_FIELDS[field] for field in order_by]
+
+    # the ordering columns are always selected so the next cursor can be built from the last row
+    selected = fields + [field for field in order_by if field not in fields]
+    statement = select(*[MATHEMATICIAN_FIELDS[field].label(field) for field in selected])
+    for predicate in filters.predicates():
+        statement = statement.where(predicate)
+    statement = statement.order_by(*[_order(column, descending) for column in order_columns])
+
+    if cursor is None:
+        statement = statement.offset((page - 1) * perpage)
+    else:
+        values = _decode_cursor(cursor, order_by, descending)
+        statement = statement.where(_seek_predicate(order_columns, values, descending))
+    statement = statement.limit(perpage)
+    return MathematiciansQuery(statement, fields, order_by, descending, perpage)
 
 
 def get_mathematicians(
-    page: int, perpage: int, fields: List[str], order_by: List[str], descending: bool
-) -> List[Dict]:
-    session = Session()
-    # TODO: validate inputs
+    page: int,
+    perpage: int,
+    fields: List[str],
+    order_by: List[str],
+    descending: bool,
+    cursor: Optional[str] = None,
+    session: Optional[OrmSession] = None,
+    filters: MathematicianFilters = NO_FILTERS,
+) -> MathematicianPage:
+    """
+    Return a page of mathematicians and an opaque cursor pointing after its last row.
+
+    Without a cursor the page is selected with ``OFFSET``. With a cursor the query seeks
+    directly past the last row of the previous page instead, which costs the same for
+    every page. Rows are ordered by ``order_by``, then by id, with nulls after every
+    value: last in ascending order and first in descending order, the order of a btree
+    index read forwards or backwards. A cursor is only valid for the ``filters`` of the
+    page it came from.
+    """
+    query = build_mathematicians_query(page, perpage, fields, order_by, descending, cursor, filters)
+    with session_scope(session) as session:
+        records = session.execute(query.statement).all()
+    return query.page(records)
 
-    columns = (
-        list(MATHEMATICIAN_FIELDS.values())
-        if fields == "*"
-        else (MATHEMATICIAN_FIELDS.get(field) for field in fields)
-    )
-    order_by = (MATHEMATICIAN_FIELDS.get(field) for field in order_by)
-    if descending:
-        order_by = (column.desc() for column in order_by if order_by is not None)
 
-    query = session.query(*[column for column in columns if column is not None])
-    query = query.order_by(*[column for column in order_by if column is not None])
+def _encode_cursor(order_by: List[str], descending: bool, values: List) -> str:
+    data = json.dumps({"order_by": order_by, "descending": descending, "values": values})
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
 
-    start_idx = (page - 1) * perpage
-    end_idx = start_idx + perpage
-    records = query[start_idx:end_idx]
-    return [dict(record) for record in records]
+def _decode_cursor(cursor: str, order_by: List[str], descending: bool) -> List:
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        values = data["values"]
+        valid = data["order_by"] == order_by and data["descending"] == descending
+    except (ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid cursor {cursor!r}") from e
+    if not valid or len(values) != len(order_by):
+        raise ValueError("Cursor does not match the requested ordering")
+    return values
+
+
+def _order(column, descending: bool):
+    # nulls sort after every value, like in a btree index, so both directions are served
+    # by a forward or backward scan of an index on (column, id)
+    if not column.nullable:
+        return column.desc() if descending else column.asc()
+    return column.desc().nullsfirst() if descending else column.asc().nullslast()
+
+
+def _seek_predicate(columns: List, values: List, descending: bool):
+    """
+    Select the rows after ``values`` in the order of ``columns``. Where the columns
+    cannot be null this is a single row value comparison, which seeks an index on them.
+    """
+    if not any(column.nullable for column in columns):
+        return _after(columns, values, descending)
+    column, value, rest = columns[0], values[0], columns[1:]
+    if value is None:
+        # the nulls come last in ascending order, first in descending order
+        equal = and_(column.is_(None), _seek_predicate(rest, values[1:], descending))
+        return or_(column.isnot(None), equal) if descending else equal
+    if any(c.nullable for c in rest):
+        after = column < value if descending else column > value
+        after = or_(after, and_(column == value, _seek_predicate(rest, values[1:], descending)))
+    else:
+        # a null in column makes the row value comparison false
+        after = _after(columns, values, descending)
+    return after if descending else or_(after, column.is_(None))
+
+
+def _after(columns: List, values: List, descending: bool):
+    if len(columns) == 1:
+        return columns[0] < values[0] if descending else columns[0] > values[0]
+    return tuple_(*columns) < tuple_(*values) if descending else tuple_(*columns) > tuple_(*values)
@@ -0,0 +1,365 @@
+"""
+Columnar snapshots of the genealogy for analytics.
+
+``export_snapshot`` streams the mathematician and student_advisor tables into Parquet or
+Arrow IPC files, one row group at a time, so memory use depends on ``row_group_size`` and
+not on the size of the tables. On PostgreSQL the rows are copied out as CSV and parsed by
+arrow, so no python object is made per value. Other databases are read from a cursor.
+Columns keep their database types and are named like the fields of the API.
+
+An incremental snapshot only holds the mathematicians inserted or updated, and the edges
+inserted, since the previous snapshot in the same directory. The watermarks every
+snapshot starts from are kept in the directory's manifest.json. A watermark may be
+earlier than rows already exported, see ``_write_horizon``, so a row can be in more than
+one snapshot. Readers apply the snapshots in order, the latest row of an id winning.
+Deletions only show up in a full snapshot, as rows that are missing from it.
+
+Exports need the optional ``pyarrow`` package.
+"""
+import datetime
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import DateTime, cast, func, literal, select, text
+from sqlalchemy.engine import Connection, Engine
+
+from .db import Mathematician, StudentAdvisor
+
+
+logger = logging.getLogger(__name__)
+
+
+# file formats mapped to their extensions
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+
+MANIFEST = "manifest.json"
+
+
+# rows read from the database at a time
+FETCH_SIZE = 10000
+
+
+# the smallest step of a watermark column
+WATERMARK_STEP = datetime.timedelta(microseconds=1)
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.csv
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("exports need the pyarrow package") from e
+    return pyarrow
+
+
+class ExportTable(NamedTuple):
+    name: str
+    # columns in file order, with the name of their arrow type
+    columns: List[Tuple[object, str]]
+    # rows of an incremental export are those with this column at or past the watermark
+    # of the previous snapshot
+    watermark: object
+
+
+TABLES = [
+    ExportTable(
+        "mathematician",
+        [
+            (Mathematician.id, "int32"),
+            (Mathematician.name, "string"),
+            (Mathematician.school, "string"),
+            (Mathematician.graduated, "int32"),
+            (Mathematician.thesis, "string"),
+            (Mathematician.country, "string"),
+            (Mathematician.subject, "string"),
+            (Mathematician.math_genealogy_url, "string"),
+            (Mathematician.math_sci_net_url, "string"),
+            (Mathematician.publications, "int32"),
+            (Mathematician.citations, "int32"),
+            (Mathematician.updated_at, "timestamp"),
+        ],
+        Mathematician.updated_at,
+    ),
+    ExportTable(
+        "student_advisor",
+        [
+            (StudentAdvisor.id, "int32"),
+            (StudentAdvisor.student_id, "int32"),
+            (StudentAdvisor.advisor_id, "int32"),
+            (StudentAdvisor.created_at, "timestamp"),
+        ],
+        StudentAdvisor.created_at,
+    ),
+]
+
+
+class TableExport(NamedTuple):
+    path: str
+    rows: int
+    watermark: Optional[object]
+
+
+def _arrow_type(pa, name: str):
+    if name == "timestamp":
+        return pa.timestamp("us", tz="UTC")
+    return getattr(pa, name)()
+
+
+def export_table(
+    connection: Connection,
+    table: ExportTable,
+    path: str,
+    since=None,
+    file_format: str = "parquet",
+    compression: Optional[str] = "zstd",
+    row_group_size: int = 100000,
+) -> TableExport:
+    """
+    Write the rows of ``table`` to ``path``, only those with a watermark at or past
+    ``since`` if it is given. Return the number of rows and the largest watermark written.
+    """
+    pa = _pyarrow()
+    schema = pa.schema([(column.key, _arrow_type(pa, type_)) for (column, type_) in table.columns])
+    statement = select(*[column.label(column.key) for (column, _) in table.columns]).order_by(table.columns[0][0])
+    copy = _copy_supported(connection)
+    if since is not None:
+        # COPY takes no parameters, so the watermark is written into the query
+        statement = statement.where(table.watermark >= (_timestamp_literal(since) if copy else since))
+    watermark_index = [column for (column, _) in table.columns].index(table.watermark)
+
+    rows, watermark = 0, None
+    # written next to the final path and moved there once complete
+    partial = f"{path}.partial"
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(partial, schema, compression=compression or "none")
+    elif file_format == "arrow":
+        options = pa.ipc.IpcWriteOptions(compression=compression)
+        writer = pa.ipc.new_file(partial, schema, options=options)
+    else:
+        raise ValueError(f"Invalid format {file_format!r}, expected one of {', '.join(FORMATS)}")
+    if copy:
+        read = _copy_batches(pa, connection, table, statement, schema)
+    else:
+        read = _fetch_batches(pa, connection, statement, schema, min(FETCH_SIZE, row_group_size))
+    # record batches take a fraction of the memory of rows as python objects, and are
+    # held until a row group is full
+    batches, buffered = [], 0
+    try:
+        for batch in read:
+            batches.append(batch)
+            buffered += batch.num_rows
+            largest = pa.compute.max(batch.column(watermark_index)).as_py()
+            if largest is not None and (watermark is None or largest > watermark):
+                watermark = largest
+            if buffered >= row_group_size:
+                _write(pa, writer, batches, row_group_size)
+                rows += buffered
+                batches, buffered = [], 0
+        if batches:
+            _write(pa, writer, batches, row_group_size)
+            rows += buffered
+    finally:
+        read.close()
+        writer.close()
+    os.replace(partial, path)
+    return TableExport(path, rows, watermark)
+
+
+def _copy_supported(connection: Connection) -> bool:
+    dialect = connection.dialect
+    return dialect.name == "postgresql" and dialect.driver in ("psycopg2", "pg8000")
+
+
+def _timestamp_literal(value: datetime.datetime):
+    return cast(literal(value.isoformat()), DateTime(timezone=True))
+
+
+def _fetch_batches(pa, connection: Connection, statement, schema, size: int) -> Iterator:
+    # a record batch per ``size`` rows fetched from a server-side cursor
+    result = connection.execution_options(stream_results=True).execute(statement)
+    try:
+        for partition in result.partitions(size):
+            arrays = [pa.array(values, type=field.type) for (values, field) in zip(zip(*partition), schema)]
+            yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+    finally:
+        result.close()
+
+
+def _copy_batches(pa, connection: Connection, table: ExportTable, statement, schema) -> Iterator:
+    """
+    Yield record batches of the rows of ``statement``, copied out of PostgreSQL as CSV in
+    the transaction of ``connection``. A thread writes the copy into a pipe that arrow
+    parses as it fills, so the database and the parsing work at the same time.
+    """
+    # timestamps are copied as UTC without a time zone, which arrow parses
+    timestamps = [column.key for (column, type_) in table.columns if type_ == "timestamp"]
+    statement = statement.with_only_columns(*[
+        (func.timezone("UTC", column) if type_ == "timestamp" else column).label(column.key)
+        for (column, type_) in table.columns
+    ])
+    query = statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True})
+    sql = f"COPY ({query}) TO STDOUT WITH (FORMAT csv)"
+    cursor = connection.connection.cursor()
+
+    read_fd, write_fd = os.pipe()
+    failed = []
+
+    def copy():
+        try:
+            with os.fdopen(write_fd, "wb") as f:
+                if connection.dialect.driver == "psycopg2":
+                    cursor.copy_expert(sql, f)
+                else:
+                    cursor.execute(sql, stream=f)
+        except Exception as e:  # re-raised by the reading thread
+            failed.append(e)
+
+    thread = threading.Thread(target=copy, name="export-copy", daemon=True)
+    thread.start()
+    source = os.fdopen(read_fd, "rb")
+    try:
+        reader = pa.csv.open_csv(
+            source,
+            read_options=pa.csv.ReadOptions(column_names=schema.names),
+            parse_options=pa.csv.ParseOptions(newlines_in_values=True),
+            convert_options=pa.csv.ConvertOptions(
+                column_types={
+                    field.name: pa.timestamp("us") if field.name in timestamps else field.type for field in schema
+                },
+                # NULL is copied as an empty field, and an empty string as ""
+                null_values=[""],
+                strings_can_be_null=True,
+                quoted_strings_can_be_null=False,
+            ),
+        )
+        for batch in reader:
+            yield pa.RecordBatch.from_arrays(
+                [column.cast(field.type) for (column, field) in zip(batch.columns, schema)], schema=schema
+            )
+    finally:
+        # unblocks the copy if the batches were not all read
+        source.close()
+        thread.join()
+        cursor.close()
+    if failed:
+        raise failed[0]
+
+
+def _write(pa, writer, batches, row_group_size: int):
+    table = pa.Table.from_batches(batches)
+    if isinstance(writer, pa.parquet.ParquetWriter):
+        writer.write_table(table, row_group_size=row_group_size)
+    else:
+        writer.write_table(table.combine_chunks(), max_chunksize=row_group_size)
+
+
+def _write_horizon(engine: Engine) -> Optional[datetime.datetime]:
+    """
+    Return the start of the oldest other transaction running on a PostgreSQL database, or
+    the current time if there is none, and None on other databases.
+
+    ``updated_at`` and ``created_at`` are the start of the transaction that wrote them,
+    not of its commit, so a transaction committing after an export began can write rows
+    older than rows the export read. Every row committed after this is read has a
+    watermark from the horizon on, so the next incremental export starts from it at the
+    latest. Seeing the transactions of other database users takes the pg_read_all_stats
+    role.
+    """
+    if engine.dialect.name != "postgresql":
+        return None
+    with engine.connect() as connection:
+        return connection.execute(text(
+            "SELECT least(statement_timestamp(), min(xact_start)) FROM pg_stat_activity "
+            "WHERE datname = current_database() AND pid <> pg_backend_pid()"
+        )).scalar()
+
+
+def _next_watermark(written, since, horizon):
+    # rows from this value on go in the next incremental export
+    watermark = since if written is None else written + WATERMARK_STEP
+    if horizon is not None and (watermark is None or horizon < watermark):
+        return horizon
+    return watermark
+
+
+def read_manifest(directory: str) -> Dict:
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"snapshots": []}
+
+
+def _dump_watermark(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def _load_watermark(value):
+    return datetime.datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def export_snapshot(
+    engine: Engine,
+    directory: str,
+    incremental: bool = False,
+    file_format: str = "parquet",
+    compression: Optional[str] = "zstd",
+    row_group_size: int = 100000,
+) -> Dict:
+    """
+    Export every table in ``TABLES`` to ``directory`` and record the snapshot in its
+    manifest. An incremental snapshot without an earlier one to follow is a full one.
+    Return the manifest entry of the snapshot.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Invalid format {file_format!r}, expected one of {', '.join(FORMATS)}")
+    os.makedirs(directory, exist_ok=True)
+    manifest = read_manifest(directory)
+    previous = manifest["snapshots"][-1]["watermarks"] if incremental and manifest["snapshots"] else None
+    created = datetime.datetime.now(datetime.timezone.utc)
+    suffix = ("-incremental" if previous is not None else "") + FORMATS[file_format]
+    snapshot = {
+        "created": created.isoformat(),
+        "incremental": previous is not None,
+        "format": file_format,
+        "files": {},
+        "rows": {},
+        "watermarks": {},
+    }
+
+    # read before the tables, so it covers every transaction the export does not see
+    horizon = _write_horizon(engine)
+    connection = engine.connect()
+    if engine.dialect.name == "postgresql":
+        # the tables and their watermarks are read from the same point in time
+        connection = connection.execution_options(isolation_level="REPEATABLE READ")
+    try:
+        with connection.begin():
+            for table in TABLES:
+                since = None if previous is None else _load_watermark(previous.get(table.name))
+                path = os.path.join(directory, f"{table.name}-{created:%Y%m%d%H%M%S}{suffix}")
+                exported = export_table(
+                    connection, table, path, since, file_format, compression, row_group_size
+                )
+                snapshot["files"][table.name] = os.path.basename(path)
+                snapshot["rows"][table.name] = exported.rows
+                snapshot["watermarks"][table.name] = _dump_watermark(
+                    _next_watermark(exported.watermark, since, horizon)
+                )
+                logger.info("Exported %d rows of %s to %s", exported.rows, table.name, path)
+    finally:
+        connection.close()
+
+    manifest["snapshots"].append(snapshot)
+    partial = os.path.join(directory, f"{MANIFEST}.partial")
+    with open(partial, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(partial, os.path.join(directory, MANIFEST))
+    return snapshot
@@ -0,0 +1,555 @@
+"""
+Read-only, in-memory index of the student_advisor graph.
+
+The edges are loaded once into two compressed sparse row (CSR) adjacency structures,
+one from advisors to students and one from students to advisors. Mathematician ids are
+small, dense integers, so each structure is a pair of flat integer arrays:
+
+    offsets[id] .. offsets[id + 1]  is the slice of ``targets`` holding the neighbors of id
+
+which makes a neighbor lookup O(degree) with no per-node Python objects. Edges added or
+removed after the load are kept in small overlays until the next compaction. The arrays
+are never changed once built. Lookups read them and the overlays under the index lock,
+and refreshes and compactions only hold it to install what they built without it.
+
+When GRAPH_SNAPSHOT names a snapshot file written by the crawler, the arrays are
+memory mapped from it instead of being loaded from the database, see graph_snapshot.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session as OrmSession
+
+from math_genealogy.config import CONFIG
+from .db import Mathematician, Session, StudentAdvisor
+from .graph_snapshot import GraphSnapshot, write_snapshot
+
+
+logger = logging.getLogger(__name__)
+
+
+Edge = Tuple[int, int]  # (student_id, advisor_id)
+
+
+# signed 32 bit integers, large enough for every mathematician id
+TYPECODE = "i"
+
+
+class CSRAdjacency:
+    """
+    Compressed sparse row adjacency keyed by mathematician id. The arrays are either
+    ``array`` objects or memoryviews of a graph snapshot.
+    """
+
+    def __init__(self, offsets: Sequence[int], targets: Sequence[int]):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_pairs(cls, pairs: List[Tuple[int, int]], max_id: int) -> "CSRAdjacency":
+        """
+        Build the adjacency from (source, target) pairs with a counting sort.
+        """
+        counts = array(TYPECODE, bytes(array(TYPECODE).itemsize * (max_id + 2)))
+        for source, _ in pairs:
+            counts[source + 1] += 1
+        for i in range(1, len(counts)):
+            counts[i] += counts[i - 1]
+        offsets = array(TYPECODE, counts)
+        targets = array(TYPECODE, bytes(array(TYPECODE).itemsize * len(pairs)))
+        for source, target in pairs:
+            targets[counts[source]] = target
+            counts[source] += 1
+        return cls(offsets, targets)
+
+    @property
+    def max_id(self) -> int:
+        return len(self.offsets) - 2
+
+    def neighbors(self, id_: int) -> Sequence[int]:
+        if id_ < 0 or id_ > self.max_id:
+            return array(TYPECODE)
+        return self.targets[self.offsets[id_]:self.offsets[id_ + 1]]
+
+    def degree(self, id_: int) -> int:
+        if id_ < 0 or id_ > self.max_id:
+            return 0
+        return self.offsets[id_ + 1] - self.offsets[id_]
+
+    def pairs(self) -> Iterable[Tuple[int, int]]:
+        for source in range(self.max_id + 1):
+            for target in self.neighbors(source):
+                yield source, target
+
+    @property
+    def nbytes(self) -> int:
+        return (len(self.offsets) + len(self.targets)) * self.offsets.itemsize
+
+
+class GraphIndex:
+    """
+    Forward (advisor -> students) and reverse (student -> advisors) adjacency of the
+    genealogy, with overlays for edges that changed since the last compaction.
+    """
+
+    # rebuild the CSR arrays once this many edges have changed since the last build
+    compaction_threshold = 10000
+
+    def __init__(self, edges: Iterable[Edge] = (), last_edge_id: int = 0):
+        self.last_edge_id = last_edge_id
+        self._lock = threading.RLock()
+        # counts the changes, so a compaction can tell whether it missed any
+        self._changes = 0
+        # the snapshot the arrays were mapped from, if any
+        self.snapshot: Optional[GraphSnapshot] = None
+        self._build(set(edges))
+
+    @classmethod
+    def load(cls, session: OrmSession) -> "GraphIndex":
+        """
+        Load every edge of the student_advisor table.
+        """
+        edges, last_edge_id = _load_edges(session)
+        index = cls(edges, last_edge_id=last_edge_id)
+        logger.info("Loaded %d student/advisor edges into the graph index", index.edge_count)
+        return index
+
+    @classmethod
+    def from_snapshot(cls, snapshot: GraphSnapshot) -> "GraphIndex":
+        """
+        Use the arrays of a graph snapshot in place. Changes made afterwards go to the
+        overlays, and a compaction moves the graph into private arrays.
+        """
+        index = cls(last_edge_id=snapshot.last_edge_id)
+        index._install(
+            CSRAdjacency(snapshot.student_offsets, snapshot.student_targets),
+            CSRAdjacency(snapshot.advisor_offsets, snapshot.advisor_targets),
+            snapshot.edge_count,
+        )
+        index.snapshot = snapshot
+        logger.info("Mapped %d student/advisor edges from %s", index.edge_count, snapshot.path)
+        return index
+
+    def _build(self, edges: Set[Edge]):
+        self._install(*_adjacency(edges), len(edges))
+
+    def _install(self, students: CSRAdjacency, advisors: CSRAdjacency, edge_count: int):
+        with self._lock:
+            self._students = students
+            self._advisors = advisors
+            self._added_students: Dict[int, Set[int]] = {}
+            self._added_advisors: Dict[int, Set[int]] = {}
+            self._removed: Set[Edge] = set()
+            self.edge_count = edge_count
+            self._changes += 1
+
+    # ------------------------------------------------------------------------
+    # lookups
+    # ------------------------------------------------------------------------
+
+    def get_students(self, id_: int) -> List[int]:
+        with self._lock:
+            return self._lookup(self._students, self._added_students, id_, student_side=False)
+
+    def get_advisors(self, id_: int) -> List[int]:
+        with self._lock:
+            return self._lookup(self._advisors, self._added_advisors, id_, student_side=True)
+
+    def _lookup(self, csr, added, id_, student_side) -> List[int]:
+        neighbors = list(csr.neighbors(id_))
+        if self._removed:
+            neighbors = [
+                n for n in neighbors
+                if ((id_, n) if student_side else (n, id_)) not in self._removed
+            ]
+        extra = added.get(id_)
+        if extra:
+            neighbors.extend(extra)
+        return neighbors
+
+    def __contains__(self, edge: Edge) -> bool:
+        student_id, advisor_id = edge
+        return advisor_id in self.get_advisors(student_id)
+
+    def edges(self) -> Iterable[Edge]:
+        advisors, removed, added, _ = self._overlays()
+        return _edges(advisors, removed, added)
+
+    def _overlays(self):
+        # the arrays with a copy of the overlays, which other threads keep changing
+        with self._lock:
+            added = [(student_id, set(advisor_ids)) for (student_id, advisor_ids) in self._added_advisors.items()]
+            return self._advisors, set(self._removed), added, self._changes
+
+    def descendants(
+        self, id_: int, max_depth: Optional[int] = None, limit: Optional[int] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Yield (id, depth) for the students of ``id_``, their students and so on.
+        """
+        return self._traverse(self.get_students, id_, max_depth, limit)
+
+    def ancestors(
+        self, id_: int, max_depth: Optional[int] = None, limit: Optional[int] = None
+    ) -> Iterator[Tuple[int, int]]:
+        """
+        Yield (id, depth) for the advisors of ``id_``, their advisors and so on.
+        """
+        return self._traverse(self.get_advisors, id_, max_depth, limit)
+
+    def _traverse(
+        self,
+        lookup: Callable[[int], List[int]],
+        id_: int,
+        max_depth: Optional[int],
+        limit: Optional[int],
+    ) -> Iterator[Tuple[int, int]]:
+        # breadth first, so every mathematician is reported at its shortest depth
+        seen = {id_}
+        frontier = [id_]
+        depth = 0
+        count = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier = []
+            for node in frontier:
+                for neighbor in lookup(node):
+                    if neighbor in seen:
+                        continue
+                    seen.add(neighbor)
+                    next_frontier.append(neighbor)
+                    yield neighbor, depth
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+            frontier = next_frontier
+
+    def shortest_path(self, source_id: int, target_id: int) -> Optional[List[int]]:
+        """
+        Return the ids on a shortest advisor/student chain from ``source_id`` to
+        ``target_id``, following edges in either direction, or None if they are not
+        connected.
+
+        Breadth first searches run from both ends, always growing the smaller frontier by
+        a full level, so only a small part of the graph around each end is visited.
+        """
+        if source_id == target_id:
+            return [source_id]
+        parents = ({source_id: None}, {target_id: None})
+        frontiers = ([source_id], [target_id])
+        depths = ({source_id: 0}, {target_id: 0})
+        while frontiers[0] and frontiers[1]:
+            side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+            visited, other = parents[side], parents[1 - side]
+            best = None
+            next_frontier = []
+            for node in frontiers[side]:
+                for neighbor in self.get_students(node) + self.get_advisors(node):
+                    if neighbor in other:
+                        length = depths[side][node] + 1 + depths[1 - side][neighbor]
+                        if best is None or length < best[0]:
+                            best = (length, node, neighbor)
+                    elif neighbor not in visited:
+                        visited[neighbor] = node
+                        depths[side][neighbor] = depths[side][node] + 1
+                        next_frontier.append(neighbor)
+            if best is not None:
+                _, node, neighbor = best
+                near, far = _chain(visited, node), _chain(other, neighbor)
+                path = near[::-1] + far
+                return path if side == 0 else path[::-1]
+            frontiers = (next_frontier, frontiers[1]) if side == 0 else (frontiers[0], next_frontier)
+        return None
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Size of the CSR arrays, not counting the overlays.
+        """
+        return self._students.nbytes + self._advisors.nbytes
+
+    # ------------------------------------------------------------------------
+    # incremental updates
+    # ------------------------------------------------------------------------
+
+    def add_edge(self, student_id: int, advisor_id: int):
+        with self._lock:
+            self._add_edge(student_id, advisor_id)
+        self._maybe_compact()
+
+    def _add_edge(self, student_id: int, advisor_id: int):
+        edge = (student_id, advisor_id)
+        if edge in self._removed:
+            self._removed.discard(edge)
+        elif edge in self:
+            return
+        else:
+            self._added_advisors.setdefault(student_id, set()).add(advisor_id)
+            self._added_students.setdefault(advisor_id, set()).add(student_id)
+        self.edge_count += 1
+        self._changes += 1
+
+    def remove_edge(self, student_id: int, advisor_id: int):
+        with self._lock:
+            self._remove_edge(student_id, advisor_id)
+        self._maybe_compact()
+
+    def _remove_edge(self, student_id: int, advisor_id: int):
+        if (student_id, advisor_id) not in self:
+            return
+        added = self._added_advisors.get(student_id, set())
+        if advisor_id in added:
+            added.discard(advisor_id)
+            self._added_students[advisor_id].discard(student_id)
+        else:
+            self._removed.add((student_id, advisor_id))
+        self.edge_count -= 1
+        self._changes += 1
+
+    def remove_mathematician(self, id_: int):
+        """
+        Drop every edge touching a deleted mathematician.
+        """
+        with self._lock:
+            for student_id in self.get_students(id_):
+                self._remove_edge(student_id, id_)
+            for advisor_id in self.get_advisors(id_):
+                self._remove_edge(id_, advisor_id)
+        self._maybe_compact()
+
+    def refresh(self, session: OrmSession):
+        """
+        Pick up edges inserted since the last load. Edge ids are autoincremented, so new
+        edges are exactly the rows with a larger id. Deletions made outside of this
+        process cannot be detected that way; they show up as a mismatch in the number of
+        edges and trigger a full reload.
+
+        The queries run without the lock, so lookups go on meanwhile.
+        """
+        rows = (
+            session.query(StudentAdvisor.id, StudentAdvisor.student_id, StudentAdvisor.advisor_id)
+            .filter(StudentAdvisor.id > self.last_edge_id)
+            .order_by(StudentAdvisor.id)
+            .all()
+        )
+        with self._lock:
+            for edge_id, student_id, advisor_id in rows:
+                self.last_edge_id = edge_id
+                if student_id is not None and advisor_id is not None:
+                    self._add_edge(student_id, advisor_id)
+            last_edge_id, edge_count = self.last_edge_id, self.edge_count
+        count = (
+            session.query(func.count(StudentAdvisor.id))
+            .filter(StudentAdvisor.id <= last_edge_id)
+            .filter(StudentAdvisor.student_id.isnot(None))
+            .filter(StudentAdvisor.advisor_id.isnot(None))
+            .scalar()
+        )
+        if count != edge_count:
+            logger.info("Graph index is out of date (%d != %d edges), reloading", count, edge_count)
+            edges, last_edge_id = _load_edges(session)
+            students, advisors = _adjacency(edges)
+            with self._lock:
+                self._install(students, advisors, len(edges))
+                self.last_edge_id = last_edge_id
+        else:
+            self._maybe_compact()
+
+    def compact(self):
+        """
+        Fold the overlays back into fresh CSR arrays. They are built from a copy of the
+        overlays, and dropped if the index changed in the meantime.
+        """
+        advisors, removed, added, changes = self._overlays()
+        students, advisors = _adjacency(set(_edges(advisors, removed, added)))
+        with self._lock:
+            if self._changes == changes:
+                self._install(students, advisors, len(advisors.targets))
+
+    def _maybe_compact(self):
+        with self._lock:
+            changed = len(self._removed) + sum(map(len, self._added_advisors.values()))
+        if changed >= self.compaction_threshold:
+            self.compact()
+
+
+def _edges(advisors: CSRAdjacency, removed: Set[Edge], added: List[Tuple[int, Set[int]]]) -> Iterator[Edge]:
+    # the edges of the arrays, less the removed ones, and the added ones
+    for student_id, advisor_id in advisors.pairs():
+        if (student_id, advisor_id) not in removed:
+            yield student_id, advisor_id
+    for student_id, advisor_ids in added:
+        for advisor_id in advisor_ids:
+            yield student_id, advisor_id
+
+
+def _chain(parents: Dict[int, Optional[int]], id_: int) -> List[int]:
+    # follow breadth first search parents from id_ back to the root of the search
+    chain = [id_]
+    while parents[chain[-1]] is not None:
+        chain.append(parents[chain[-1]])
+    return chain
+
+
+def _adjacency(edges: Set[Edge]) -> Tuple[CSRAdjacency, CSRAdjacency]:
+    # (advisor -> students, student -> advisors)
+    max_id = max((max(edge) for edge in edges), default=0)
+    students = CSRAdjacency.from_pairs(
+        sorted((advisor_id, student_id) for (student_id, advisor_id) in edges), max_id
+    )
+    advisors = CSRAdjacency.from_pairs(sorted(edges), max_id)
+    return students, advisors
+
+
+def _load_edges(session: OrmSession) -> Tuple[Set[Edge], int]:
+    last_edge_id = session.query(func.max(StudentAdvisor.id)).scalar() or 0
+    rows = (
+        session.query(StudentAdvisor.student_id, StudentAdvisor.advisor_id)
+        .filter(StudentAdvisor.id <= last_edge_id)
+        .filter(StudentAdvisor.student_id.isnot(None))
+        .filter(StudentAdvisor.advisor_id.isnot(None))
+        .yield_per(10000)
+    )
+    return {(student_id, advisor_id) for (student_id, advisor_id) in rows}, last_edge_id
+
+
+def write_graph_snapshot(session: OrmSession, path: str) -> int:
+    """
+    Write a snapshot of every mathematician and edge in the database to ``path``, for
+    GraphIndex.from_snapshot. Return the size of the file.
+    """
+    edges, last_edge_id = _load_edges(session)
+    students, advisors = _adjacency(edges)
+    del edges
+    mathematicians = (
+        session.query(Mathematician.id, Mathematician.name, Mathematician.school)
+        .order_by(Mathematician.id)
+        .yield_per(10000)
+    )
+    return write_snapshot(path, mathematicians, students, advisors, last_edge_id)
+
+
+# ------------------------------------------------------------------------
+# ------------------------------------------------------------------------
+# PROCESS WIDE INDEX
+# ------------------------------------------------------------------------
+# ------------------------------------------------------------------------
+
+
+# seconds between checks of the database for new or deleted edges
+REFRESH_INTERVAL = 60
+
+
+_index: Optional[GraphIndex] = None
+_refreshed_at = 0.0
+_index_lock = threading.Lock()
+# changes made while a refresh runs, replayed on its index before it replaces the current
+# one. None when no refresh is running.
+_pending: Optional[List[Callable[[GraphIndex], None]]] = None
+
+
+def get_graph_index() -> GraphIndex:
+    """
+    Return the process wide graph index, loading it on first use. Once it was refreshed
+    more than ``REFRESH_INTERVAL`` seconds ago it is refreshed in a background thread,
+    and requests use the current index until that is done.
+
+    With GRAPH_SNAPSHOT set, the index is mapped from the snapshot file if it exists,
+    and mapped again when a new snapshot replaces it. Edges written since the snapshot
+    are then loaded from the database like any other refresh.
+    """
+    global _index, _refreshed_at, _pending
+    with _index_lock:
+        if _index is None:
+            _index = _refreshed(None)
+            _refreshed_at = time.monotonic()
+        elif _pending is None and time.monotonic() - _refreshed_at > REFRESH_INTERVAL:
+            _pending = []
+            threading.Thread(target=_refresh, args=(_index,), name="graph-index-refresh", daemon=True).start()
+        return _index
+
+
+def _refreshed(index: Optional[GraphIndex]) -> GraphIndex:
+    # a new index if there is a new snapshot or no index yet, otherwise index brought up to date
+    snapshot = _open_new_snapshot(index)
+    session = Session()
+    try:
+        if snapshot is not None:
+            index = GraphIndex.from_snapshot(snapshot)
+            index.refresh(session)
+        elif index is None:
+            index = GraphIndex.load(session)
+        else:
+            index.refresh(session)
+    finally:
+        session.close()
+    return index
+
+
+def _refresh(current: GraphIndex):
+    global _index, _refreshed_at, _pending
+    try:
+        index = _refreshed(current)
+    except Exception:
+        logger.exception("Could not refresh the graph index")
+        index = None
+    with _index_lock:
+        if index is not None and index is not current:
+            for change in _pending:
+                change(index)
+            _index = index
+        # retried after another interval if the refresh failed
+        _refreshed_at = time.monotonic()
+        _pending = None
+
+
+def remove_mathematician(id_: int):
+    """
+    Drop the edges of a deleted mathematician from the loaded index, and from the one a
+    running refresh is building.
+    """
+    with _index_lock:
+        index = _index
+        if _pending is not None:
+            _pending.append(lambda index: index.remove_mathematician(id_))
+    if index is not None:
+        index.remove_mathematician(id_)
+
+
+def _open_new_snapshot(index: Optional[GraphIndex]) -> Optional[GraphSnapshot]:
+    # the configured snapshot, unless it is missing or already mapped by index. A replaced
+    # snapshot is unmapped once the last request using its arrays lets go of them.
+    path = CONFIG.graph_snapshot
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    current = index.snapshot if index is not None else None
+    if current is not None and current.version == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+        return None
+    try:
+        return GraphSnapshot(path)
+    except (OSError, ValueError):
+        logger.exception("Could not open the graph snapshot %s", path)
+        return None
+
+
+def get_shortest_path(source_id: int, target_id: int) -> Optional[List[int]]:
+    """
+    Return the ids on a shortest advisor/student chain between two mathematicians.
+    """
+    return get_graph_index().shortest_path(source_id, target_id)
+
+
+def loaded_graph_index() -> Optional[GraphIndex]:
+    """
+    Return the process wide graph index if it has been loaded, without loading it.
+    """
+    return _index
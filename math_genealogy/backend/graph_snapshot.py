@@ -0,0 +1,209 @@
+"""
+Binary snapshot of the genealogy graph, opened with ``mmap``.
+
+A snapshot holds what the graph index needs at startup, in flat arrays that are used in
+place without being parsed or copied:
+
+    ids                         id of each mathematician, by row
+    rows                        row of each id, -1 for ids without a mathematician
+    student_offsets, _targets   CSR adjacency from advisors to students
+    advisor_offsets, _targets   CSR adjacency from students to advisors
+    names, schools              index into the string pool of each row, -1 for NULL
+    string_offsets, pool        UTF-8 strings, string i is pool[offsets[i]:offsets[i + 1]]
+
+The file starts with a header of the array lengths, followed by the arrays in the order
+above, each starting at a multiple of 8 bytes. Integers are little endian. Identical
+strings, such as the name of a school, are stored once.
+
+Opening a snapshot maps the file read-only, which takes milliseconds whatever its size.
+Pages are read from disk on first use and are shared through the page cache by every
+process mapping the same file, so API workers do not each hold a copy of the graph.
+Snapshots are replaced by renaming a new file over the old one, so processes still
+mapping the old file keep a consistent view of it.
+"""
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable, Optional, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+MAGIC = b"MGGRAPH1"
+
+
+# magic, then the lengths of the csr offsets, the csr targets (the edge count), the ids,
+# the rows table, the string offsets and the pool, then the id of the last edge included
+HEADER = struct.Struct("<8s7q")
+
+
+ALIGNMENT = 8
+
+
+def _layout(nodes: int, edges: int, ids: int, rows: int, strings: int, pool: int):
+    # (name, typecode, length) of each array, in file order
+    return [
+        ("ids", "i", ids),
+        ("rows", "i", rows),
+        ("student_offsets", "i", nodes),
+        ("student_targets", "i", edges),
+        ("advisor_offsets", "i", nodes),
+        ("advisor_targets", "i", edges),
+        ("names", "i", ids),
+        ("schools", "i", ids),
+        ("string_offsets", "I", strings),
+        ("pool", "B", pool),
+    ]
+
+
+def _padding(position: int) -> int:
+    return -position % ALIGNMENT
+
+
+def _check_byte_order():
+    # the arrays are written and read in the byte order of the machine
+    if sys.byteorder != "little":
+        raise ValueError("Graph snapshots are only supported on little endian machines")
+
+
+def write_snapshot(
+    path: str,
+    mathematicians: Iterable[Tuple[int, Optional[str], Optional[str]]],
+    students,
+    advisors,
+    last_edge_id: int = 0,
+) -> int:
+    """
+    Write (id, name, school) rows and the ``offsets`` and ``targets`` of the student
+    and advisor adjacencies to ``path``, replacing it once complete. Return the size of
+    the file.
+    """
+    _check_byte_order()
+    ids, names, schools = array("i"), array("i"), array("i")
+    strings = {}
+    string_offsets = array("I", [0])
+    pool = bytearray()
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return -1
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+            pool.extend(value.encode("utf-8"))
+            string_offsets.append(len(pool))
+        return index
+
+    for id_, name, school in mathematicians:
+        ids.append(id_)
+        names.append(intern(name))
+        schools.append(intern(school))
+    rows = array("i", [-1]) * (max(ids) + 1 if ids else 0)
+    for row, id_ in enumerate(ids):
+        rows[id_] = row
+
+    arrays = {
+        "ids": ids,
+        "rows": rows,
+        "student_offsets": students.offsets,
+        "student_targets": students.targets,
+        "advisor_offsets": advisors.offsets,
+        "advisor_targets": advisors.targets,
+        "names": names,
+        "schools": schools,
+        "string_offsets": string_offsets,
+        "pool": pool,
+    }
+    lengths = (
+        len(students.offsets), len(students.targets), len(ids), len(rows), len(string_offsets), len(pool)
+    )
+    partial = f"{path}.partial"
+    with open(partial, "wb") as f:
+        f.write(HEADER.pack(MAGIC, *lengths, last_edge_id))
+        for name, typecode, _ in _layout(*lengths):
+            f.write(bytes(_padding(f.tell())))
+            values = arrays[name]
+            f.write(values if isinstance(values, bytearray) else array(typecode, values).tobytes())
+        size = f.tell()
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(partial, path)
+    logger.info("Wrote a graph snapshot of %d mathematicians and %d edges to %s", len(ids), lengths[1], path)
+    return size
+
+
+class GraphSnapshot:
+    """
+    A snapshot file mapped into memory. The arrays are read-only memoryviews of the file.
+    """
+
+    def __init__(self, path: str):
+        _check_byte_order()
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < HEADER.size:
+                raise ValueError(f"{path} is not a graph snapshot")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # identifies the file, to tell when a new snapshot has replaced it
+        self.version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        magic, *lengths, self.last_edge_id = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a graph snapshot")
+        view = memoryview(self._mmap)
+        position = HEADER.size
+        for name, typecode, length in _layout(*lengths):
+            position += _padding(position)
+            end = position + length * array(typecode).itemsize
+            if end > len(view):
+                view.release()
+                self._mmap.close()
+                raise ValueError(f"Graph snapshot {path} is truncated")
+            setattr(self, name, view[position:end].cast(typecode))
+            position = end
+        view.release()
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.student_targets)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, id_: int) -> bool:
+        return self.row(id_) is not None
+
+    def row(self, id_: int) -> Optional[int]:
+        if 0 <= id_ < len(self.rows) and self.rows[id_] >= 0:
+            return self.rows[id_]
+        return None
+
+    def name(self, id_: int) -> Optional[str]:
+        return self._string(self.names, id_)
+
+    def school(self, id_: int) -> Optional[str]:
+        return self._string(self.schools, id_)
+
+    def _string(self, column, id_: int) -> Optional[str]:
+        row = self.row(id_)
+        if row is None or column[row] < 0:
+            return None
+        index = column[row]
+        return bytes(self.pool[self.string_offsets[index]:self.string_offsets[index + 1]]).decode("utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._mmap)
+
+    def close(self):
+        """
+        Unmap the file. Fails with BufferError while arrays of the snapshot are in use.
+        """
+        for name, _, _ in _layout(0, 0, 0, 0, 0, 0):
+            getattr(self, name).release()
+        self._mmap.close()
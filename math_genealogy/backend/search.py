@@ -0,0 +1,301 @@
+"""
+Ranked full-text search over the name, thesis and school of mathematicians.
+
+Every word of a search must match the start of a word in one of the three columns, so
+"gaus carl" finds Carl Friedrich Gauss. Words shorter than ``MIN_PREFIX_LENGTH`` only
+match whole words, since a one or two letter prefix matches most of the genealogy, and a
+search needs at least one word that long. Matches are ranked by the columns they are found
+in, a name match counting most and a school match least, then by id.
+
+On PostgreSQL the search runs against a GIN index on a weighted ``tsvector`` of the
+three columns, created by migration 5e0c3b9a1f27. ``SEARCH_DOCUMENT`` must stay the
+same expression as that index for the planner to use it. Other databases, such as the
+SQLite databases of the tests, are searched with an in-process inverted index with the
+same matching rules, loaded on first use.
+"""
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+from sqlalchemy import func, literal_column, select
+from sqlalchemy.orm import Session as OrmSession
+
+from . import db
+from .db import Mathematician, session_scope
+from .models import PydanticMathematician
+
+
+logger = logging.getLogger(__name__)
+
+
+# the weights ts_rank gives to the A, B and C labels of the search document
+NAME_WEIGHT, THESIS_WEIGHT, SCHOOL_WEIGHT = 1.0, 0.4, 0.2
+
+
+# words of a search beyond this many are ignored
+MAX_SEARCH_TERMS = 8
+
+
+# shorter words of a search only match whole words
+MIN_PREFIX_LENGTH = 3
+
+
+_WORD = re.compile(r"\w+")
+
+
+def search_terms(text: Optional[str]) -> List[str]:
+    """
+    Split text into the lowercase words that are indexed and searched for.
+    """
+    return _WORD.findall(text.lower()) if text else []
+
+
+def searchable(terms: List[str]) -> bool:
+    """
+    Whether ``terms`` hold a word long enough to search for.
+    """
+    return any(len(term) >= MIN_PREFIX_LENGTH for term in terms)
+
+
+# ------------------------------------------------------------------------
+# ------------------------------------------------------------------------
+# POSTGRESQL
+# ------------------------------------------------------------------------
+# ------------------------------------------------------------------------
+
+
+# the text search configuration of the index, which lowercases words without stemming
+_CONFIG = literal_column("'simple'::regconfig")
+
+
+def _weighted(column, weight: str):
+    words = func.to_tsvector(_CONFIG, func.coalesce(column, literal_column("''")))
+    return func.setweight(words, literal_column(f"'{weight}'"))
+
+
+SEARCH_DOCUMENT = (
+    _weighted(Mathematician.name, "A")
+    .op("||")(_weighted(Mathematician.thesis, "B"))
+    .op("||")(_weighted(Mathematician.school, "C"))
+)
+
+
+def search_statement(terms: List[str], page: int, perpage: int):
+    """
+    Select a page of mathematicians matching every one of ``terms``, as a prefix if it is
+    at least ``MIN_PREFIX_LENGTH`` long.
+    """
+    query = func.to_tsquery(
+        _CONFIG, " & ".join(f"{term}:*" if len(term) >= MIN_PREFIX_LENGTH else term for term in terms)
+    )
+    return (
+        select(Mathematician)
+        .where(SEARCH_DOCUMENT.op("@@")(query))
+        .order_by(func.ts_rank(SEARCH_DOCUMENT, query).desc(), Mathematician.id)
+        .offset((page - 1) * perpage)
+        .limit(perpage)
+    )
+
+
+# ------------------------------------------------------------------------
+# ------------------------------------------------------------------------
+# IN-PROCESS INDEX
+# ------------------------------------------------------------------------
+# ------------------------------------------------------------------------
+
+
+class SearchIndex:
+    """
+    Inverted index from each word to the ids of the mathematicians it occurs in, with the
+    summed weights of the columns it occurs in.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._words: Dict[int, Set[str]] = {}
+        # the indexed words in order, for finding the words starting with a prefix.
+        # Rebuilt on the next search after a word was added.
+        self._sorted: Optional[List[str]] = []
+
+    @classmethod
+    def load(cls, session: OrmSession) -> "SearchIndex":
+        """
+        Index the name, thesis and school of every mathematician.
+        """
+        index = cls()
+        rows = session.query(
+            Mathematician.id, Mathematician.name, Mathematician.thesis, Mathematician.school
+        ).yield_per(10000)
+        for id_, name, thesis, school in rows:
+            index.add(id_, name, thesis, school)
+        logger.info("Loaded %d mathematicians into the search index", len(index))
+        return index
+
+    def __len__(self) -> int:
+        return len(self._words)
+
+    def add(self, id_: int, name: Optional[str], thesis: Optional[str], school: Optional[str]):
+        """
+        Index a mathematician, replacing what was indexed for the same id.
+        """
+        weights: Dict[str, float] = defaultdict(float)
+        for text, weight in ((name, NAME_WEIGHT), (thesis, THESIS_WEIGHT), (school, SCHOOL_WEIGHT)):
+            for word in set(search_terms(text)):
+                weights[word] += weight
+        with self._lock:
+            self._remove(id_)
+            for word, weight in weights.items():
+                if word not in self._postings:
+                    self._sorted = None
+                self._postings[word][id_] = weight
+            if weights:
+                self._words[id_] = set(weights)
+
+    def remove(self, id_: int):
+        with self._lock:
+            self._remove(id_)
+
+    def _remove(self, id_: int):
+        for word in self._words.pop(id_, ()):
+            postings = self._postings[word]
+            del postings[id_]
+            if not postings:
+                # left in the sorted words, where it matches nothing
+                del self._postings[word]
+
+    def search(self, text: str, page: int = 1, perpage: int = 20) -> List[int]:
+        """
+        Return a page of the ids matching every word of ``text`` as a prefix, best first.
+        """
+        terms = search_terms(text)[:MAX_SEARCH_TERMS]
+        if not searchable(terms):
+            return []
+        with self._lock:
+            if self._sorted is None:
+                self._sorted = sorted(self._postings)
+            # the longest, usually most selective, term first so the others only check its matches
+            scores = None
+            for term in sorted(terms, key=len, reverse=True):
+                scores = self._match(term, scores)
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda score: (-score[1], score[0]))
+        start = (page - 1) * perpage
+        return [id_ for (id_, _) in ranked[start:start + perpage]]
+
+    def _match(self, term: str, candidates: Optional[Dict[int, float]]) -> Dict[int, float]:
+        # add the weight of the best word starting with term to each candidate with one
+        best: Dict[int, float] = {}
+        words = self._prefixed(term) if len(term) >= MIN_PREFIX_LENGTH else [term]
+        for word in words:
+            for id_, weight in self._postings.get(word, {}).items():
+                if (candidates is None or id_ in candidates) and weight > best.get(id_, 0.0):
+                    best[id_] = weight
+        if candidates is None:
+            return best
+        return {id_: candidates[id_] + weight for (id_, weight) in best.items()}
+
+    def _prefixed(self, prefix: str) -> Iterator[str]:
+        words = self._sorted
+        i = bisect.bisect_left(words, prefix)
+        while i < len(words) and words[i].startswith(prefix):
+            yield words[i]
+            i += 1
+
+
+# seconds between reloads of the index, which picks up rows written by other processes
+REFRESH_INTERVAL = 300
+
+
+_index: Optional[SearchIndex] = None
+_loaded_at = 0.0
+_index_lock = threading.Lock()
+# changes made while a reload runs, replayed on the new index before it replaces the old
+# one. None when no reload is running.
+_pending: Optional[List[Callable[[SearchIndex], None]]] = None
+
+
+def get_search_index() -> SearchIndex:
+    """
+    Return the process wide search index, loading it on first use. Once it is older than
+    ``REFRESH_INTERVAL`` seconds it is reloaded in a background thread, and searches use
+    the current index until the new one is ready.
+    """
+    global _index, _loaded_at, _pending
+    with _index_lock:
+        if _index is None:
+            with session_scope() as session:
+                _index = SearchIndex.load(session)
+            _loaded_at = time.monotonic()
+        elif _pending is None and time.monotonic() - _loaded_at > REFRESH_INTERVAL:
+            _pending = []
+            threading.Thread(target=_reload, name="search-index-reload", daemon=True).start()
+        return _index
+
+
+def _reload():
+    global _index, _loaded_at, _pending
+    try:
+        with session_scope() as session:
+            index = SearchIndex.load(session)
+    except Exception:
+        logger.exception("Could not reload the search index")
+        index = None
+    with _index_lock:
+        if index is not None:
+            for change in _pending:
+                change(index)
+            _index = index
+        # retried after another interval if the reload failed
+        _loaded_at = time.monotonic()
+        _pending = None
+
+
+def _change(change: Callable[[SearchIndex], None]):
+    # apply to the loaded index, and to the one being loaded if a reload is running
+    with _index_lock:
+        index = _index
+        if _pending is not None:
+            _pending.append(change)
+    if index is not None:
+        change(index)
+
+
+def loaded_search_index() -> Optional[SearchIndex]:
+    """
+    Return the process wide search index if it has been loaded, without loading it.
+    """
+    return _index
+
+
+def search_mathematicians(
+    text: str, page: int = 1, perpage: int = 20, session: Optional[OrmSession] = None
+) -> List[PydanticMathematician]:
+    """
+    Return a page of the mathematicians matching ``text``, best match first.
+    """
+    terms = search_terms(text)[:MAX_SEARCH_TERMS]
+    if not searchable(terms):
+        return []
+    with session_scope(session) as session:
+        if session.get_bind().dialect.name == "postgresql":
+            models = session.execute(search_statement(terms, page, perpage)).scalars()
+            return [model.as_pydantic for model in models]
+        ids = get_search_index().search(" ".join(terms), page, perpage)
+        return db.get_mathematicians_by_ids(ids, session)
+
+
+def index_mathematician(mathematician: PydanticMathematician):
+    """
+    Reflect an inserted or updated mathematician in the search index, if it is loaded.
+    """
+    _change(lambda index: index.add(mathematician.id, mathematician.name, mathematician.thesis, mathematician.school))
+
+
+def unindex_mathematician(id_: int):
+    _change(lambda index: index.remove(id_))
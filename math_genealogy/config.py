@@ -1,5 +1,5 @@
 import os
-from typing import NamedTuple
+from typing import NamedTuple, Optional
 
 from enum import Enum, auto
 
@@ -13,6 +13,39 @@ POSTGRES_CONNECTION_DEV = "POSTGRES_CONNECTION_DEV"
 POSTGRES_CONNECTION_PROD = "POSTGRES_CONNECTION_PROD"
 
 
+DB_POOL_SIZE = "DB_POOL_SIZE"
+
+
+DB_MAX_OVERFLOW = "DB_MAX_OVERFLOW"
+
+
+DB_POOL_TIMEOUT = "DB_POOL_TIMEOUT"
+
+
+DB_POOL_RECYCLE = "DB_POOL_RECYCLE"
+
+
+DB_POOL_PRE_PING = "DB_POOL_PRE_PING"
+
+
+DB_ASYNC = "DB_ASYNC"
+
+
+CACHE_SIZE = "CACHE_SIZE"
+
+
+CACHE_TTL = "CACHE_TTL"
+
+
+CACHE_VERSION_INTERVAL = "CACHE_VERSION_INTERVAL"
+
+
+METRICS_ENABLED = "METRICS_ENABLED"
+
+
+GRAPH_SNAPSHOT = "GRAPH_SNAPSHOT"
+
+
 class Environment(Enum):
     DEV = auto()
     PROD = auto()
@@ -21,6 +54,39 @@ class Environment(Enum):
 class Config(NamedTuple):
     db_connection: str
     environment: str
+    # sync endpoints run on a pool of 40 worker threads, each holding at most one connection
+    db_pool_size: int = 10
+    db_max_overflow: int = 30
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_async: bool = False
+    # mathematicians held by the in-process read cache, 0 disables it
+    cache_size: int = 100000
+    cache_ttl: int = 3600
+    # seconds between checks for writes made by other processes, 0 disables them
+    cache_version_interval: int = 1
+    # record the counters and histograms of math_genealogy.metrics
+    metrics_enabled: bool = False
+    # graph snapshot file written after each crawl and memory mapped by the API
+    graph_snapshot: Optional[str] = None
+
+
+def _get_int(key: str, default: int) -> int:
+    value = os.environ.get(key)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"Invalid {key} value {value!r}, expected an integer")
+
+
+def _get_bool(key: str, default: bool) -> bool:
+    value = os.environ.get(key)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
 
 
 def get_config() -> Config:
@@ -42,6 +108,19 @@ def get_config() -> Config:
     return Config(
         db_connection,
         environment,
+        db_pool_size=_get_int(DB_POOL_SIZE, Config._field_defaults["db_pool_size"]),
+        db_max_overflow=_get_int(DB_MAX_OVERFLOW, Config._field_defaults["db_max_overflow"]),
+        db_pool_timeout=_get_int(DB_POOL_TIMEOUT, Config._field_defaults["db_pool_timeout"]),
+        db_pool_recycle=_get_int(DB_POOL_RECYCLE, Config._field_defaults["db_pool_recycle"]),
+        db_pool_pre_ping=_get_bool(DB_POOL_PRE_PING, Config._field_defaults["db_pool_pre_ping"]),
+        db_async=_get_bool(DB_ASYNC, Config._field_defaults["db_async"]),
+        cache_size=_get_int(CACHE_SIZE, Config._field_defaults["cache_size"]),
+        cache_ttl=_get_int(CACHE_TTL, Config._field_defaults["cache_ttl"]),
+        cache_version_interval=_get_int(
+            CACHE_VERSION_INTERVAL, Config._field_defaults["cache_version_interval"]
+        ),
+        metrics_enabled=_get_bool(METRICS_ENABLED, Config._field_defaults["metrics_enabled"]),
+        graph_snapshot=os.environ.get(GRAPH_SNAPSHOT) or None,
     )
 
 
@@ -0,0 +1,261 @@
+"""
+Counters and histograms for the hot paths of the crawler and the API.
+
+Metrics are declared next to the code they measure and registered with ``REGISTRY``,
+which renders them in the Prometheus text format for the API's ``/metrics`` endpoint
+and as flat values for the Scrapy stats. Recording is switched off unless
+METRICS_ENABLED is set, in which case ``inc``, ``observe`` and ``time`` return after a
+single attribute lookup.
+
+The API counts the database queries of each request with ``count_queries``, which
+listens to every SQLAlchemy engine once ``instrument_queries`` has been called.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import CONFIG
+
+
+# bounds of the Prometheus client's default buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+# label values, in the order of a metric's label names, mapped to a value
+Samples = Dict[Tuple[str, ...], float]
+
+
+class Registry:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self.metrics: List["Metric"] = []
+
+    def register(self, metric: "Metric") -> "Metric":
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Return the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def as_stats(self) -> Dict[str, float]:
+        """
+        Return the metrics as a flat mapping, leaving out histogram buckets.
+        """
+        stats = {}
+        for metric in self.metrics:
+            for name, labels, value in metric.samples():
+                if not name.endswith("_bucket"):
+                    stats[f"{name}{_format_labels(labels)}"] = value
+        return stats
+
+    def reset(self):
+        for metric in self.metrics:
+            metric.reset()
+
+
+REGISTRY = Registry(CONFIG.metrics_enabled)
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        self.lock = threading.Lock()
+        registry.register(self)
+
+    def samples(self) -> Iterator[Tuple[str, Dict[str, str], float]]:
+        raise NotImplementedError
+
+    def reset(self):
+        pass
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        try:
+            return tuple(str(labels[name]) for name in self.labelnames)
+        except KeyError as e:
+            raise ValueError(f"Missing label {e} of metric {self.name}")
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Samples = {}
+
+    def inc(self, amount: float = 1, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self.lock:
+            values = sorted(self.values.items())
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+
+class FunctionCounter(Metric):
+    """
+    Counter read from ``function`` when the metrics are collected, for counts kept
+    elsewhere such as the cache statistics.
+    """
+    type = "counter"
+
+    def __init__(self, name: str, help: str, function: Callable[[], Samples], *args, **kwargs):
+        super().__init__(name, help, *args, **kwargs)
+        self.function = function
+
+    def samples(self):
+        for key, value in sorted(self.function().items()):
+            yield self.name, self._labels(key), value
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, size: int):
+        # observations per bucket, the last one past the largest bound
+        self.buckets = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bounds = tuple(sorted(buckets))
+        self.values: Dict[Tuple[str, ...], _HistogramValue] = {}
+
+    def observe(self, value: float, **labels):
+        if not self.registry.enabled:
+            return
+        key = self._key(labels)
+        with self.lock:
+            observed = self.values.get(key)
+            if observed is None:
+                observed = self.values[key] = _HistogramValue(len(self.bounds) + 1)
+            observed.buckets[bisect_left(self.bounds, value)] += 1
+            observed.sum += value
+            observed.count += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the seconds spent in the ``with`` block.
+        """
+        if not self.registry.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        observed = self.values.get(self._key(labels))
+        return 0 if observed is None else observed.count
+
+    def samples(self):
+        with self.lock:
+            values = sorted(
+                (key, (list(observed.buckets), observed.sum, observed.count))
+                for key, observed in self.values.items()
+            )
+        for key, (buckets, sum_, count) in values:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, observations in zip(self.bounds + (float("inf"),), buckets):
+                cumulative += observations
+                yield f"{self.name}_bucket", dict(labels, le=_format_value(bound)), cumulative
+            yield f"{self.name}_sum", labels, sum_
+            yield f"{self.name}_count", labels, count
+
+    def reset(self):
+        with self.lock:
+            self.values = {}
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels.items()
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class QueryCount:
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+
+# the queries of the request being served. Worker threads run with a copy of the context,
+# which still refers to the same QueryCount.
+_query_count: "ContextVar[Optional[QueryCount]]" = ContextVar("query_count", default=None)
+
+
+def count_queries() -> QueryCount:
+    """
+    Start counting the queries run in the current context.
+    """
+    count = QueryCount()
+    _query_count.set(count)
+    return count
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    count = _query_count.get()
+    if count is not None:
+        count.count += 1
+
+
+def instrument_queries():
+    """
+    Count the queries of every SQLAlchemy engine towards ``count_queries``.
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
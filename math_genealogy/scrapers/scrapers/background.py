@@ -0,0 +1,111 @@
+"""
+Blocking work done off the Twisted reactor thread.
+
+``BackgroundWriter`` runs the database writes of the item pipelines one at a time in a
+worker thread, so the reactor keeps downloading and parsing while a batch commits. At
+most ``max_pending`` writes are queued. When the database falls behind, pipelines wait
+on ``wait_for_room`` before accepting more items, which makes Scrapy back off. Without
+a worker thread the writes run in line, which is what the tests and scripts that drive
+the pipelines by hand rely on.
+"""
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from twisted.internet.defer import Deferred, maybeDeferred, succeed
+from twisted.python.failure import Failure
+
+
+logger = logging.getLogger(__name__)
+
+
+def defer_future(future: Future) -> Deferred:
+    """
+    Return a Deferred that fires on the reactor thread with the result of ``future``.
+    """
+    from twisted.internet import reactor
+
+    deferred = Deferred()
+
+    def fire(future):
+        exception = future.exception()
+        if exception is not None:
+            deferred.errback(Failure(exception))
+        else:
+            deferred.callback(future.result())
+
+    # concurrent futures call back on the worker side, the deferred must fire on the reactor
+    future.add_done_callback(lambda future: reactor.callFromThread(fire, future))
+    return deferred
+
+
+class BackgroundWriter:
+    def __init__(self, max_pending: int = 4, background: bool = True):
+        self.max_pending = max_pending
+        self.executor = ThreadPoolExecutor(max_workers=1) if background else None
+        self.pending = 0
+        self._waiting_for_room: List[Deferred] = []
+        self._waiting_for_idle: List[Deferred] = []
+
+    @classmethod
+    def from_settings(cls, settings) -> "BackgroundWriter":
+        if settings is None:
+            return cls(background=False)
+        return cls(
+            max_pending=settings.getint("DB_WRITER_MAX_PENDING", 4),
+            background=settings.getbool("DB_WRITER_BACKGROUND", True),
+        )
+
+    @property
+    def full(self) -> bool:
+        return self.pending >= self.max_pending
+
+    def submit(self, write: Callable, *args, callback: Optional[Callable] = None) -> Deferred:
+        """
+        Queue ``write(*args)``. ``callback`` is called with its result on the reactor
+        thread before the write counts as done.
+        """
+        self.pending += 1
+        if self.executor is None:
+            deferred = maybeDeferred(write, *args)
+        else:
+            deferred = defer_future(self.executor.submit(write, *args))
+        if callback is not None:
+            deferred.addCallback(callback)
+        deferred.addErrback(lambda failure: logger.error("Background write failed: %s", failure.getTraceback()))
+        deferred.addBoth(self._done)
+        return deferred
+
+    def wait_for_room(self) -> Deferred:
+        """
+        Return a Deferred that fires once fewer than ``max_pending`` writes are queued.
+        """
+        if not self.full:
+            return succeed(None)
+        deferred = Deferred()
+        self._waiting_for_room.append(deferred)
+        return deferred
+
+    def close(self) -> Deferred:
+        """
+        Return a Deferred that fires once every queued write is done and the worker
+        thread has stopped.
+        """
+        deferred = Deferred()
+        if self.pending:
+            self._waiting_for_idle.append(deferred)
+        else:
+            deferred.callback(None)
+        if self.executor is not None:
+            deferred.addCallback(lambda _: self.executor.shutdown(wait=False))
+        return deferred
+
+    def _done(self, result):
+        self.pending -= 1
+        while self._waiting_for_room and not self.full:
+            self._waiting_for_room.pop(0).callback(None)
+        if not self.pending:
+            waiting, self._waiting_for_idle = self._waiting_for_idle, []
+            for deferred in waiting:
+                deferred.callback(None)
+        return result
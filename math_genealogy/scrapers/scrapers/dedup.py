@@ -0,0 +1,194 @@
+"""
+Compact record of which mathematician ids a crawl has requested and written.
+
+Mathematician ids are dense integers, so a bitmap indexed by id holds every id on
+mathgenealogy.org in about 33KB. The spider and the database pipeline share one
+``CrawlFrontier``: the spider skips links to ids it has already requested and the
+pipeline skips items it has already written. Both are checkpointed after every
+committed batch, so a restarted crawl picks up where the last one stopped.
+"""
+import logging
+import os
+from typing import Iterable, Iterator, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+# largest mathematician id on mathgenealogy.org when the crawler was written
+MAX_MATHEMATICIAN_ID = 265263
+
+
+class IdBitmap:
+    """
+    Set of non-negative integer ids stored one bit per id. Grows to fit larger ids.
+    """
+
+    def __init__(self, capacity: int = MAX_MATHEMATICIAN_ID):
+        self._bits = bytearray((capacity >> 3) + 1)
+        self._count = 0
+
+    def add(self, id_: int) -> bool:
+        """
+        Add an id, returning True if it was not in the set yet.
+        """
+        byte, bit = id_ >> 3, 1 << (id_ & 7)
+        if byte >= len(self._bits):
+            self._bits.extend(bytes(max(byte + 1, 2 * len(self._bits)) - len(self._bits)))
+        if self._bits[byte] & bit:
+            return False
+        self._bits[byte] |= bit
+        self._count += 1
+        return True
+
+    def update(self, ids: Iterable[int]):
+        for id_ in ids:
+            self.add(id_)
+
+    def __contains__(self, id_: int) -> bool:
+        byte = id_ >> 3
+        return byte < len(self._bits) and bool(self._bits[byte] & (1 << (id_ & 7)))
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        for byte, value in enumerate(self._bits):
+            if value:
+                for bit in range(8):
+                    if value & (1 << bit):
+                        yield (byte << 3) | bit
+
+    def union(self, other: "IdBitmap") -> "IdBitmap":
+        size = max(len(self._bits), len(other._bits))
+        bits = int.from_bytes(self._bits, "little") | int.from_bytes(other._bits, "little")
+        return IdBitmap._from_bytes(bits.to_bytes(size, "little"))
+
+    def copy(self) -> "IdBitmap":
+        bitmap = IdBitmap(0)
+        bitmap._bits = bytearray(self._bits)
+        bitmap._count = self._count
+        return bitmap
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
+
+    def save(self, path: str):
+        """
+        Write the bitmap to ``path``, replacing the previous file atomically.
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(self._bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "IdBitmap":
+        with open(path, "rb") as f:
+            return cls._from_bytes(f.read())
+
+    @classmethod
+    def _from_bytes(cls, data: bytes) -> "IdBitmap":
+        bitmap = cls(0)
+        bitmap._bits = bytearray(data)
+        bitmap._count = bin(int.from_bytes(data, "little")).count("1")
+        return bitmap
+
+
+class CrawlFrontier:
+    """
+    Ids requested by the spider and written by the pipeline during a crawl.
+
+    Both sets are checkpointed to ``directory`` while a crawl runs, so a crawl resuming
+    a killed one neither requests nor writes its ids again, and ``unfinished`` returns
+    the ids it requested but did not write. A crawl that finishes clears the checkpoint.
+    Ids passed to ``skip`` are not requested either, but are not checkpointed.
+    """
+
+    written_file = "written.bitmap"
+    requested_file = "requested.bitmap"
+
+    def __init__(
+        self,
+        written: Optional[IdBitmap] = None,
+        requested: Optional[IdBitmap] = None,
+        directory: Optional[str] = None,
+    ):
+        self.written = written if written is not None else IdBitmap()
+        self.requested = self.written.copy() if requested is None else requested.union(self.written)
+        self.directory = directory
+        self.skipped = IdBitmap()
+
+    @classmethod
+    def open(cls, directory: Optional[str]) -> "CrawlFrontier":
+        """
+        Resume from the checkpoint saved in ``directory``, if any. A ``directory`` of None
+        keeps the frontier in memory only.
+        """
+        if directory is None:
+            return cls()
+        bitmaps = []
+        for name in (cls.written_file, cls.requested_file):
+            path = os.path.join(directory, name)
+            bitmaps.append(IdBitmap.load(path) if os.path.exists(path) else None)
+        frontier = cls(*bitmaps, directory=directory)
+        if len(frontier.written):
+            logger.info(
+                "Resuming crawl with %d mathematicians written and %d unfinished",
+                len(frontier.written),
+                len(frontier.requested) - len(frontier.written),
+            )
+        return frontier
+
+    def request(self, id_: int) -> bool:
+        """
+        Mark an id as requested, returning True if it had not been requested or skipped
+        before.
+        """
+        return id_ not in self.skipped and self.requested.add(id_)
+
+    def skip(self, ids: Iterable[int]):
+        """
+        Never request ``ids`` in this crawl, without carrying them over to the next one.
+        """
+        self.skipped.update(ids)
+
+    def mark_written(self, ids: Iterable[int]):
+        for id_ in ids:
+            self.written.add(id_)
+            self.requested.add(id_)
+
+    def unfinished(self) -> Iterator[int]:
+        """
+        Ids that were requested but have not been written.
+        """
+        return (id_ for id_ in self.requested if id_ not in self.written)
+
+    def copy(self) -> "CrawlFrontier":
+        """
+        Snapshot of the frontier, which can be saved from another thread while this one
+        keeps changing.
+        """
+        return CrawlFrontier(self.written.copy(), self.requested, self.directory)
+
+    def save(self):
+        if self.directory:
+            self.written.save(os.path.join(self.directory, self.written_file))
+            self.requested.save(os.path.join(self.directory, self.requested_file))
+
+    def clear(self):
+        """
+        Forget every id and delete the checkpoint, so the next crawl starts afresh.
+        """
+        self.written, self.requested = IdBitmap(), IdBitmap()
+        if self.directory:
+            for name in (self.written_file, self.requested_file):
+                path = os.path.join(self.directory, name)
+                if os.path.exists(path):
+                    os.remove(path)
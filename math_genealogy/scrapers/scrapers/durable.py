@@ -0,0 +1,89 @@
+"""
+Batch writes that do not lose items.
+
+``DurableBatchWriter`` retries a batch that failed with a transient database error,
+such as a dropped connection, with exponential backoff. A batch that fails for any other
+reason is split in half and each half is written on its own, until the items that cannot
+be written are isolated. Those, and whole batches that still fail after the last retry,
+are appended to a dead letter file of line-delimited JSON, which can be loaded again
+with scripts/load_mathematicians.py once the problem is fixed.
+"""
+import logging
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from .item_files import ItemFileWriter
+
+
+logger = logging.getLogger(__name__)
+
+
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class WriteResult(NamedTuple):
+    written: int
+    dead_lettered: int
+
+
+class DurableBatchWriter:
+    def __init__(
+        self,
+        write: Callable[[List[Dict]], None],
+        dead_letters: Callable[[], ItemFileWriter],
+        retries: int = 3,
+        backoff: float = 1.0,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        """
+        ``write`` commits a list of items or raises. ``dead_letters`` opens the dead
+        letter file, which is only created once an item is dead lettered.
+        """
+        self.write = write
+        self.open_dead_letters = dead_letters
+        self.retries = retries
+        self.backoff = backoff
+        self.sleep = sleep
+        self.dead_letters: Optional[ItemFileWriter] = None
+
+    def __call__(self, items: List[Dict]) -> WriteResult:
+        try:
+            self._write_with_retries(items)
+            return WriteResult(len(items), 0)
+        except TRANSIENT_ERRORS as e:
+            logger.error("Giving up on a batch of %d items after %d retries: %r", len(items), self.retries, e)
+            self._dead_letter(items)
+            return WriteResult(0, len(items))
+        except Exception as e:
+            if len(items) == 1:
+                logger.error("Could not write item %r: %r", items[0], e)
+                self._dead_letter(items)
+                return WriteResult(0, 1)
+            logger.warning("Splitting a batch of %d items that failed to write: %r", len(items), e)
+            middle = len(items) // 2
+            first, second = self(items[:middle]), self(items[middle:])
+            return WriteResult(first.written + second.written, first.dead_lettered + second.dead_lettered)
+
+    def close(self):
+        if self.dead_letters is not None:
+            self.dead_letters.close()
+
+    def _write_with_retries(self, items: List[Dict]):
+        for attempt in range(self.retries + 1):
+            try:
+                return self.write(items)
+            except TRANSIENT_ERRORS as e:
+                if attempt == self.retries:
+                    raise
+                delay = self.backoff * 2 ** attempt
+                logger.warning("Retrying a batch of %d items in %.1fs: %r", len(items), delay, e)
+                self.sleep(delay)
+
+    def _dead_letter(self, items: List[Dict]):
+        if self.dead_letters is None:
+            self.dead_letters = self.open_dead_letters()
+        for item in items:
+            self.dead_letters.write(item)
+        self.dead_letters.checkpoint()
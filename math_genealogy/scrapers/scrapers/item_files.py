@@ -0,0 +1,173 @@
+"""
+Line-delimited JSON archives of scraped items.
+
+``ItemFileWriter`` writes one JSON object per line, optionally gzip or zstd compressed.
+Lines are buffered in memory and written in chunks of ``buffer_size`` bytes, a new file
+is started every ``max_items`` items or ``max_bytes`` uncompressed bytes, and
+``checkpoint`` flushes the compressor and fsyncs, so a crash loses at most the items
+written since the last checkpoint. ``read_items`` streams the items of any number of
+files back one at a time, skipping the partial last line of a file cut off by a crash.
+
+zstd compression needs the optional ``zstandard`` package.
+"""
+import datetime
+import gzip
+import io
+import json
+import logging
+import os
+from typing import IO, Dict, Iterable, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+
+EXTENSIONS = {
+    None: ".ndjson",
+    "gzip": ".ndjson.gz",
+    "zstd": ".ndjson.zst",
+}
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError("zstd compressed item files need the zstandard package") from e
+    return zstandard
+
+
+def compression_of(path: str) -> Optional[str]:
+    for compression, extension in EXTENSIONS.items():
+        if compression is not None and path.endswith(extension):
+            return compression
+    return None
+
+
+class ItemFileWriter:
+    """
+    Writes items to ``directory/{prefix}-{timestamp}-{index}.ndjson[.gz|.zst]`` files.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        prefix: str,
+        compression: Optional[str] = None,
+        buffer_size: int = 1 << 20,
+        max_items: int = 1000000,
+        max_bytes: Optional[int] = None,
+        checkpoint_items: int = 10000,
+    ):
+        if compression not in EXTENSIONS:
+            raise ValueError(f"Invalid compression {compression!r}, expected one of gzip, zstd")
+        if compression == "zstd":
+            _zstandard()
+        self.directory = directory
+        self.prefix = prefix
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.checkpoint_items = checkpoint_items
+        self.timestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+        self.paths: List[str] = []
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._raw: Optional[IO[bytes]] = None
+        self._stream: Optional[IO[bytes]] = None
+        self._items = 0
+        self._bytes = 0
+        self._unsynced_items = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, item: Dict):
+        line = (json.dumps(item, default=str) + "\n").encode()
+        if self._stream is None:
+            self._open()
+        self._buffer.append(line)
+        self._buffered_bytes += len(line)
+        self._items += 1
+        self._bytes += len(line)
+        self._unsynced_items += 1
+        if self._buffered_bytes >= self.buffer_size:
+            self._flush_buffer()
+        if self._items >= self.max_items or (self.max_bytes is not None and self._bytes >= self.max_bytes):
+            self._close_file()
+        elif self._unsynced_items >= self.checkpoint_items:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Make every item written so far durable.
+        """
+        if self._stream is None:
+            return
+        self._flush_buffer()
+        if self._stream is not self._raw:
+            # a sync flush ends the compressed data written so far on a block boundary
+            self._stream.flush()
+        self._raw.flush()
+        os.fsync(self._raw.fileno())
+        self._unsynced_items = 0
+
+    def close(self):
+        self._close_file()
+
+    def _open(self):
+        path = os.path.join(
+            self.directory,
+            f"{self.prefix}-{self.timestamp}-{len(self.paths):05d}{EXTENSIONS[self.compression]}",
+        )
+        self._raw = open(path, "wb")
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode="wb")
+        elif self.compression == "zstd":
+            self._stream = _zstandard().ZstdCompressor().stream_writer(self._raw)
+        else:
+            self._stream = self._raw
+        self.paths.append(path)
+        self._items = self._bytes = 0
+
+    def _flush_buffer(self):
+        if self._buffer:
+            self._stream.write(b"".join(self._buffer))
+            self._buffer = []
+            self._buffered_bytes = 0
+
+    def _close_file(self):
+        if self._stream is None:
+            return
+        self.checkpoint()
+        if self._stream is not self._raw:
+            self._stream.close()
+        if not self._raw.closed:
+            self._raw.close()
+        logger.info("Wrote %d items to %s", self._items, self.paths[-1])
+        self._stream = self._raw = None
+
+
+def _open_text(path: str) -> IO[str]:
+    compression = compression_of(path)
+    if compression == "gzip":
+        return gzip.open(path, "rt", encoding="utf-8")
+    if compression == "zstd":
+        raw = open(path, "rb")
+        return io.TextIOWrapper(_zstandard().ZstdDecompressor().stream_reader(raw), encoding="utf-8")
+    return open(path, encoding="utf-8")
+
+
+def read_items(paths: Iterable[str]) -> Iterator[Dict]:
+    """
+    Lazily read the items of item files, in order.
+    """
+    for path in paths:
+        with _open_text(path) as f:
+            try:
+                for line in f:
+                    if not line.endswith("\n"):
+                        logger.warning("Skipping partial last line of %s", path)
+                        break
+                    yield json.loads(line)
+            except EOFError:
+                logger.warning("Compressed stream of %s is cut off, skipping the rest of it", path)
@@ -3,24 +3,59 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import time
+from typing import Optional
+
 from scrapy import signals
 
+from math_genealogy.metrics import REGISTRY, Counter, Histogram
+from .offload import ParseOffloader
+
+
+PAGES_PARSED = Counter("crawler_pages_parsed_total", "Responses parsed by spider callbacks", ["callback"])
+
+
+PARSE_SECONDS = Histogram(
+    "crawler_parse_seconds", "Seconds spent in a spider callback for one response", ["callback"]
+)
+
+
+RESPONSES = Counter("crawler_responses_total", "Responses downloaded, by status", ["status"])
+
+
+DOWNLOAD_SECONDS = Histogram("crawler_download_seconds", "Seconds from sending a request to its response")
+
+
+def callback_name(response, spider) -> str:
+    return getattr(response.request.callback or spider.parse, "__name__", "parse")
+
 
 class ScrapersSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the spider middleware does not modify the
     # passed objects.
 
+    def __init__(self, offloader: Optional[ParseOffloader] = None, stats=None):
+        # parses offloadable callbacks in a worker pool when PARSE_OFFLOAD is set
+        self.offloader = offloader
+        # the crawler stats the metrics are copied to when the spider closes
+        self.stats = stats
+
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        if crawler.settings.get("METRICS_ENABLED") is not None:
+            REGISTRY.enabled = crawler.settings.getbool("METRICS_ENABLED")
+        s = cls(ParseOffloader.from_settings(crawler.settings), crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
         return s
 
     def process_spider_input(self, response, spider):
         # Called for each response that goes through the spider
         # middleware and into the spider.
+        if self.offloader is not None:
+            self.offloader.offload(response, spider)
 
         # Should return None or raise an exception.
         return None
@@ -30,8 +65,25 @@ class ScrapersSpiderMiddleware:
         # it has processed the response.
 
         # Must return an iterable of Request, or item objects.
-        for i in result:
+        if not REGISTRY.enabled:
+            yield from result
+            return
+        # only the time spent producing the results counts, not the time until the
+        # next one is asked for
+        elapsed = 0.0
+        result = iter(result)
+        while True:
+            start = time.perf_counter()
+            try:
+                i = next(result)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.perf_counter() - start
             yield i
+        callback = callback_name(response, spider)
+        PAGES_PARSED.inc(callback=callback)
+        PARSE_SECONDS.observe(elapsed, callback=callback)
 
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
@@ -52,6 +104,13 @@ class ScrapersSpiderMiddleware:
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
 
+    def spider_closed(self, spider):
+        if self.offloader is not None:
+            self.offloader.close()
+        if REGISTRY.enabled and self.stats is not None:
+            for key, value in REGISTRY.as_stats().items():
+                self.stats.set_value(f"metrics/{key}", value)
+
 
 class ScrapersDownloaderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -84,6 +143,10 @@ class ScrapersDownloaderMiddleware:
         # - return a Response object
         # - return a Request object
         # - or raise IgnoreRequest
+        if REGISTRY.enabled:
+            RESPONSES.inc(status=response.status)
+            if "download_latency" in request.meta:
+                DOWNLOAD_SECONDS.observe(request.meta["download_latency"])
         return response
 
     def process_exception(self, request, exception, spider):
@@ -0,0 +1,114 @@
+"""
+Run the CPU bound part of spider callbacks in a worker pool instead of on the reactor.
+
+A callback decorated with ``offloadable`` is split into a pure ``extract`` function,
+which only reads the page and returns picklable data, and the decorated method, which
+applies that data on the reactor thread: it updates the crawl frontier, builds follow-up
+requests and yields items. Called directly, the callback runs both halves in line. When
+PARSE_OFFLOAD is set, ScrapersSpiderMiddleware sends the response body to a process or
+thread pool to be extracted, and the callback returns a Deferred that fires with the
+items and requests once the worker is done.
+"""
+import logging
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import wraps
+from typing import Callable, Optional
+
+from scrapy.http import HtmlResponse
+from twisted.internet.defer import Deferred
+
+from math_genealogy.metrics import Histogram
+from .background import defer_future
+
+
+logger = logging.getLogger(__name__)
+
+
+OFFLOAD_MODES = ("process", "thread")
+
+
+OFFLOAD_SECONDS = Histogram(
+    "crawler_parse_offload_seconds",
+    "Seconds from handing a response to the parse pool until it was extracted",
+    ["callback"],
+)
+
+
+def offloadable(extract: Callable[[HtmlResponse], object]):
+    """
+    Decorate a ``method(self, response, extracted)`` into a Scrapy callback
+    ``callback(self, response)`` that runs ``extract(response)`` first. ``extract`` must
+    be a module level function so it can be sent to worker processes.
+    """
+
+    def decorator(method):
+        @wraps(method)
+        def callback(self, response, **kwargs):
+            return method(self, response, extract(response), **kwargs)
+
+        callback.extract = extract
+        callback.apply = method
+        return callback
+
+    return decorator
+
+
+def run_extract(extract: Callable[[HtmlResponse], object], url: str, body: bytes, encoding: str):
+    """
+    Rebuild a response from its url, body and encoding in a worker and extract it.
+    """
+    return extract(HtmlResponse(url, body=body, encoding=encoding))
+
+
+class ParseOffloader:
+    """
+    Replaces the callbacks of responses whose callback is ``offloadable`` with one that
+    extracts the response in ``executor``.
+    """
+
+    def __init__(self, executor: Executor):
+        self.executor = executor
+
+    @classmethod
+    def from_settings(cls, settings) -> Optional["ParseOffloader"]:
+        mode = settings.get("PARSE_OFFLOAD")
+        if not mode:
+            return None
+        if mode not in OFFLOAD_MODES:
+            raise ValueError(f"Invalid PARSE_OFFLOAD {mode!r}, expected one of {', '.join(OFFLOAD_MODES)}")
+        workers = settings.getint("PARSE_OFFLOAD_WORKERS") or os.cpu_count()
+        executor_class = ProcessPoolExecutor if mode == "process" else ThreadPoolExecutor
+        logger.info("Parsing responses in a %s pool of %d workers", mode, workers)
+        return cls(executor_class(max_workers=workers))
+
+    def offload(self, response, spider):
+        request = response.request
+        callback = request.callback or spider.parse
+        extract = getattr(callback, "extract", None)
+        if extract is None:
+            return
+        apply = callback.apply
+
+        def offloaded(response, **kwargs):
+            start = time.perf_counter()
+            deferred = self.submit(extract, response)
+
+            def extracted(extracted):
+                OFFLOAD_SECONDS.observe(time.perf_counter() - start, callback=offloaded.__name__)
+                return list(apply(spider, response, extracted, **kwargs))
+
+            return deferred.addCallback(extracted)
+
+        # labels the metrics of the callback
+        offloaded.__name__ = callback.__name__
+        request.callback = offloaded
+
+    def submit(self, extract, response) -> Deferred:
+        return defer_future(
+            self.executor.submit(run_extract, extract, response.url, response.body, response.encoding)
+        )
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -5,68 +5,153 @@
 
 
 # useful for handling different item types with a single interface
-import json
 import logging
-import datetime
+import os
+from typing import Callable, Dict, List
 
 from itemadapter import ItemAdapter
 from scrapy.exceptions import DropItem
+from scrapy.settings import Settings
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy import create_engine
 
 from math_genealogy.config import CONFIG
-from math_genealogy.backend.db import Mathematician, StudentAdvisor, ArxivPaper
+from math_genealogy.backend.bulk import MathematicianBatch, write_batch
+from math_genealogy.backend.copy_loader import copy_batch
+from math_genealogy.backend.db import ArxivPaper
+from math_genealogy.backend.graph import write_graph_snapshot
+from math_genealogy.metrics import Counter, Histogram
+from .background import BackgroundWriter
+from .dedup import CrawlFrontier, IdBitmap
+from .durable import DurableBatchWriter
+from .item_files import ItemFileWriter
 
 
 logger = logging.getLogger(__name__)
 
 
+ITEMS_DROPPED = Counter("crawler_items_dropped_total", "Items dropped by a pipeline", ["pipeline", "reason"])
+
+
+BATCH_SIZE = Histogram(
+    "crawler_batch_size",
+    "Items per batch handed to the database writer",
+    ["pipeline"],
+    buckets=(1, 10, 50, 100, 250, 500, 1000, 2500, 5000, 10000),
+)
+
+
+COMMIT_SECONDS = Histogram("crawler_db_commit_seconds", "Seconds to write and commit one batch", ["pipeline"])
+
+
+def durable_batch_writer(commit: Callable[[List[Dict]], None], spider) -> DurableBatchWriter:
+    """
+    Wrap a pipeline's ``commit`` in the retries of DB_WRITE_RETRIES and DB_WRITE_BACKOFF,
+    dead lettering items to DEAD_LETTER_DIR/<spider name>.
+    """
+    settings = getattr(spider, "settings", None) or Settings()
+    directory = os.path.join(settings.get("DEAD_LETTER_DIR", "data/dead-letter"), spider.name)
+    return DurableBatchWriter(
+        commit,
+        lambda: ItemFileWriter(directory, "items", checkpoint_items=1),
+        retries=settings.getint("DB_WRITE_RETRIES", 3),
+        backoff=settings.getfloat("DB_WRITE_BACKOFF", 1.0),
+    )
+
+
 class SampleJsonWriterPipeline:
+    """
+    Archives scraped items to line-delimited JSON files, see item_files.ItemFileWriter.
+    """
+
     def open_spider(self, spider):
-        date = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        self.processed_ids = set()
-        self.file = open(f"data/math_genealogy/mathematicians-{date}.json", "w")
-        self.file.write('{"mathematicians": [\n')
+        settings = getattr(spider, "settings", None) or Settings()
+        self.written_ids = IdBitmap()
+        self.writer = ItemFileWriter(
+            os.path.join(settings.get("ITEM_FILE_DIR", "data"), spider.name),
+            "items",
+            compression=settings.get("ITEM_FILE_COMPRESSION"),
+            buffer_size=settings.getint("ITEM_FILE_BUFFER_SIZE", 1 << 20),
+            max_items=settings.getint("ITEM_FILE_MAX_ITEMS", 1000000),
+            max_bytes=settings.getint("ITEM_FILE_MAX_BYTES") or None,
+            checkpoint_items=settings.getint("ITEM_FILE_CHECKPOINT_ITEMS", 10000),
+        )
 
     def close_spider(self, spider):
-        self.file.write("]}")
-        self.file.close()
+        self.writer.close()
 
     def process_item(self, item, spider):
-        if item.id_ in self.processed_ids:
-            raise DropItem(f'Already processed item with id "{item.id_}"')
-        self.processed_ids.add(item.id_)
-        self.file.write(json.dumps(ItemAdapter(item).asdict(), default=str) + ",\n")
+        id_ = getattr(item, "id_", None)
+        if id_ is not None and not self.written_ids.add(int(id_)):
+            ITEMS_DROPPED.inc(pipeline=type(self).__name__, reason="duplicate")
+            raise DropItem(f'Already processed item with id "{id_}"')
+        self.writer.write(ItemAdapter(item).asdict())
         return item
 
 
 class SqlalchemyWriterPipeline:
 
     batch_size = 250
-    cache_size = 2000
+
+    # batches written with BULK_LOADER = "copy", which pays off for larger batches
+    copy_batch_size = 5000
 
     def open_spider(self, spider):
         self.skip = spider.name != "math_genealogy"
-        self.processed_ids = set()
+        settings = getattr(spider, "settings", None)
+        self.copy = settings is not None and settings.get("BULK_LOADER") == "copy"
+        if self.copy:
+            self.batch_size = self.copy_batch_size
+        # ids written by this or an earlier crawl, shared with the spider
+        self.frontier = getattr(spider, "frontier", None) or CrawlFrontier()
+        # ids buffered or being written
+        self.pending_ids = set()
         self.items = []
+        self.writer = BackgroundWriter.from_settings(settings)
+        self.batches = durable_batch_writer(self._commit_items, spider)
 
         self.engine = create_engine(CONFIG.db_connection)
         self.Session = sessionmaker(bind=self.engine)
+        # written when the spider closes
+        self.graph_snapshot = settings.get("GRAPH_SNAPSHOT") if settings is not None else None
+        self.graph_snapshot = self.graph_snapshot or CONFIG.graph_snapshot
+
+    def close_spider(self, spider):
+        if self.items:
+            self._insert_items()
+        if self.graph_snapshot and not self.skip:
+            # queued after the last batch, so the snapshot holds every item of the crawl
+            self.writer.submit(self._write_graph_snapshot)
+        return self.writer.close().addCallback(lambda _: self.batches.close())
+
+    def _write_graph_snapshot(self):
+        # runs in the writer thread, picked up by the API workers on their next graph
+        # index refresh
+        session = self.Session()
+        try:
+            write_graph_snapshot(session, self.graph_snapshot)
+        except Exception:
+            logger.exception("Could not write the graph snapshot %s", self.graph_snapshot)
+        finally:
+            session.close()
 
     def process_item(self, item, spider):
         if self.skip:
             return item
-        self._update_cache()
         if not item.id_:
+            ITEMS_DROPPED.inc(pipeline=type(self).__name__, reason="invalid")
             raise DropItem("Item had invalid key")
-        if item.id_ in self.processed_ids:
-            raise DropItem(f'Already processed item with id "{item.id_}"')
-        self.processed_ids.add(item.id_)
         item = self._clean_item(item)
+        if item.id_ in self.frontier.written or item.id_ in self.pending_ids:
+            ITEMS_DROPPED.inc(pipeline=type(self).__name__, reason="duplicate")
+            raise DropItem(f'Already processed item with id "{item.id_}"')
+        self.pending_ids.add(item.id_)
         self.items.append(ItemAdapter(item).asdict())
         if len(self.items) >= self.batch_size:
             self._insert_items()
-            self.items = []
+            if self.writer.full:
+                # the database is falling behind, hold on to the item until it catches up
+                return self.writer.wait_for_room().addCallback(lambda _: item)
         return item
 
     def _clean_item(self, item):
@@ -76,96 +161,35 @@ class SqlalchemyWriterPipeline:
         return item
 
     def _insert_items(self):
+        items, self.items = self.items, []
+        BATCH_SIZE.observe(len(items), pipeline=type(self).__name__)
+        ids = {item["id_"] for item in items}
+        return self.writer.submit(self.batches, items, callback=lambda result: self._written(ids))
+
+    def _commit_items(self, items):
+        # runs in the writer thread
         session = self.Session()
         try:
-            for item in self.items:
-                mathematician = (
-                    session.query(Mathematician).filter(Mathematician.id == item["id_"]).first()
-                )
-                if not mathematician:
-                    mathematician = Mathematician(
-                        id=item["id_"],
-                    )
-                mathematician.id = item["id_"]
-                mathematician.name = item.get("name")
-                mathematician.school = item.get("school")
-                mathematician.graduated = item.get("graduated")
-                mathematician.thesis = item.get("thesis")
-                mathematician.country = item.get("nationality")
-                mathematician.subject = item.get("subject")
-                mathematician.math_genealogy_url = item.get("math_genealogy_url")
-                mathematician.math_sci_net_url = item.get("math_sci_net_url")
-                mathematician.publications = item.get("publications")
-                mathematician.citations = item.get("citations")
-
-                session.add(mathematician)
-
-                for student_id in item.get("student_ids", []):
-                    student = (
-                        session.query(Mathematician).filter(Mathematician.id == student_id).first()
-                    )
-                    if not student:
-                        student = Mathematician(
-                            id=student_id,
-                        )
-
-                    session.add(student)
-
-                    student_relation = (
-                        session.query(StudentAdvisor)
-                        .filter(
-                            (StudentAdvisor.student_id == student_id)
-                            & (StudentAdvisor.advisor_id == mathematician.id)
-                        )
-                        .first()
-                    )
-                    if not student_relation:
-                        student_relation = StudentAdvisor()
-                        student_relation.student_id = student.id
-                        student_relation.advisor_id = mathematician.id
-
-                    session.add(student_relation)
-
-                for advisor_id in item.get("advisor_ids", []):
-                    advisor = (
-                        session.query(Mathematician).filter(Mathematician.id == advisor_id).first()
-                    )
-                    if not advisor:
-                        advisor = Mathematician(
-                            id=advisor_id,
-                        )
-
-                    session.add(advisor)
-
-                    advisor_relation = (
-                        session.query(StudentAdvisor)
-                        .filter(
-                            (StudentAdvisor.student_id == mathematician.id)
-                            & (StudentAdvisor.advisor_id == advisor_id)
-                        )
-                        .first()
-                    )
-                    if not advisor_relation:
-                        advisor_relation = StudentAdvisor()
-                        advisor_relation.student_id = mathematician.id
-                        advisor_relation.advisor_id = advisor_id
-
-                    session.add(advisor_relation)
-
-            session.commit()
-        except Exception as e:
+            with COMMIT_SECONDS.time(pipeline=type(self).__name__):
+                batch = MathematicianBatch(items)
+                if self.copy:
+                    copy_batch(session, batch)
+                else:
+                    write_batch(session, batch)
+                session.commit()
+        except Exception:
             session.rollback()
-            logger.error("Exception while saving items to database: %r", e)
-            logger.error(
-                "Could not write items to database: %r",
-                ",".join(str(item["id_"]) for item in self.items),
-            )
+            raise
         finally:
             session.close()
 
-    def _update_cache(self):
-        if len(self.processed_ids) > self.cache_size:
-            self.processed_ids = set()
+    def _written(self, ids):
+        # dead lettered items count as written too, they are loaded from the dead letter
+        # file instead of being crawled again
+        self.frontier.mark_written(ids)
+        # saved from a snapshot, since the spider keeps requesting ids meanwhile
+        self.writer.submit(self.frontier.copy().save)
+        self.pending_ids -= ids
 
 
 class ArxivPaperWriterPipeline:
@@ -175,36 +199,47 @@ class ArxivPaperWriterPipeline:
     def open_spider(self, spider):
         self.skip = spider.name != "arxiv"
         self.items = []
+        self.writer = BackgroundWriter.from_settings(getattr(spider, "settings", None))
+        self.batches = durable_batch_writer(self._commit_items, spider)
         self.engine = create_engine(CONFIG.db_connection)
         self.Session = sessionmaker(bind=self.engine)
 
+    def close_spider(self, spider):
+        if self.items:
+            self._insert_items()
+        return self.writer.close().addCallback(lambda _: self.batches.close())
+
     def process_item(self, item, spider):
         if self.skip:
             return item
         self.items.append(ItemAdapter(item).asdict())
         if len(self.items) >= self.batch_size:
             self._insert_items()
-            self.items = []
+            if self.writer.full:
+                return self.writer.wait_for_room().addCallback(lambda _: item)
         return item
 
     def _insert_items(self):
+        items, self.items = self.items, []
+        BATCH_SIZE.observe(len(items), pipeline=type(self).__name__)
+        return self.writer.submit(self.batches, items)
+
+    def _commit_items(self, items):
+        # runs in the writer thread
         session = self.Session()
         try:
-            session.bulk_save_objects([
-                ArxivPaper(
-                    title=item['title'],
-                    subjects=item['subjects'],
-                    msc_classes=item['msc_classes'],
-                )
-                for item in self.items
-            ])
-            session.commit()
-        except Exception as e:
+            with COMMIT_SECONDS.time(pipeline=type(self).__name__):
+                session.bulk_save_objects([
+                    ArxivPaper(
+                        title=item['title'],
+                        subjects=item['subjects'],
+                        msc_classes=item['msc_classes'],
+                    )
+                    for item in items
+                ])
+                session.commit()
+        except Exception:
             session.rollback()
-            logger.error("Exception while saving items to database: %r", e)
-            logger.error(
-                "Could not write items to database: %r",
-                ",".join(str(item["id_"]) for item in self.items),
-            )
+            raise
         finally:
             session.close()
@@ -44,15 +44,25 @@ ROBOTSTXT_OBEY = False
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    'scrapers.middlewares.ScrapersSpiderMiddleware': 543,
-# }
+SPIDER_MIDDLEWARES = {
+   'scrapers.middlewares.ScrapersSpiderMiddleware': 543,
+}
+
+# Parse responses in a "process" or "thread" pool instead of on the reactor thread,
+# off by default. The pool has PARSE_OFFLOAD_WORKERS workers, one per CPU if unset.
+PARSE_OFFLOAD = None
+PARSE_OFFLOAD_WORKERS = None
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
-# DOWNLOADER_MIDDLEWARES = {
-#    'scrapers.middlewares.ScrapersDownloaderMiddleware': 543,
-# }
+DOWNLOADER_MIDDLEWARES = {
+   'scrapers.middlewares.ScrapersDownloaderMiddleware': 543,
+}
+
+# Record the counters and histograms of math_genealogy.metrics, copied to the crawl stats
+# under metrics/ when the spider closes. Follows the METRICS_ENABLED environment variable
+# when unset.
+METRICS_ENABLED = None
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
@@ -60,6 +70,45 @@ ROBOTSTXT_OBEY = False
 #    'scrapy.extensions.telnet.TelnetConsole': None,
 # }
 
+# Mathematician ids requested and written are checkpointed here so killed crawls can resume
+CRAWL_STATE_DIR = "crawl-state"
+
+# Mathematicians missing any of these columns are crawled again with -a mode=incremental
+INCREMENTAL_REQUIRED_FIELDS = ["name", "math_genealogy_url"]
+
+# How SqlalchemyWriterPipeline writes batches: "upsert" statements, or "copy" into
+# staging tables merged with one statement, which is faster for full backfills on
+# PostgreSQL. Other databases always use upserts.
+BULK_LOADER = "upsert"
+
+# SampleJsonWriterPipeline archives items to line-delimited JSON files in
+# ITEM_FILE_DIR/<spider name>, compressed with "gzip" or "zstd" if set. A new file is
+# started every ITEM_FILE_MAX_ITEMS items or ITEM_FILE_MAX_BYTES bytes, and the files are
+# fsynced every ITEM_FILE_CHECKPOINT_ITEMS items.
+ITEM_FILE_DIR = "data"
+ITEM_FILE_COMPRESSION = None
+ITEM_FILE_BUFFER_SIZE = 1 << 20
+ITEM_FILE_MAX_ITEMS = 1000000
+ITEM_FILE_MAX_BYTES = None
+ITEM_FILE_CHECKPOINT_ITEMS = 10000
+
+# The database pipelines commit their batches in a background thread, and stop
+# accepting items while DB_WRITER_MAX_PENDING batches are waiting to be written
+DB_WRITER_BACKGROUND = True
+DB_WRITER_MAX_PENDING = 4
+
+# Batches failing with a transient database error are retried DB_WRITE_RETRIES times,
+# waiting DB_WRITE_BACKOFF seconds and doubling it each time. Items that cannot be written
+# are appended to line-delimited JSON files in DEAD_LETTER_DIR/<spider name>.
+DB_WRITE_RETRIES = 3
+DB_WRITE_BACKOFF = 1.0
+DEAD_LETTER_DIR = "data/dead-letter"
+
+# Path of the graph snapshot SqlalchemyWriterPipeline writes when the math_genealogy spider
+# closes, memory mapped by the API. Follows the GRAPH_SNAPSHOT environment variable when
+# unset, no snapshot is written when neither is set.
+GRAPH_SNAPSHOT = None
+
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
@@ -1,9 +1,14 @@
 import random
 import re
-from typing import Optional, List, Tuple
+from typing import NamedTuple, Optional, List, Tuple
 from dataclasses import dataclass, field, asdict
 
 import scrapy
+from lxml import etree
+
+from math_genealogy.backend.db import partition_mathematician_ids
+from ..dedup import CrawlFrontier
+from ..offload import offloadable
 
 
 @dataclass
@@ -23,87 +28,212 @@ class Mathematician:
     citations: Optional[int] = None
 
 
-class MathGenealogySpider(scrapy.Spider):
-    name = "math_genealogy"
+MATHEMATICIAN_HREF = "id.php?id="
 
-    start_urls = [
-        f"https://www.mathgenealogy.org/id.php?id={i}"
-        for i in random.sample(range(1, 265263 + 1), k=16)
-    ]
 
-    def parse(self, response):
-        # instantiate data class
-        mathematician = Mathematician()
+MATH_SCI_NET_HREF = "http://www.ams.org/mathscinet/MRAuthorID"
 
-        mathematician.math_genealogy_url = str(response.url)
 
-        # get id
-        id_match = re.search(r"id=(\d+)", response.url)
-        if id_match is not None:
-            mathematician.id_ = id_match.group(1)
+ID_PATTERN = re.compile(r"id=(\d+)")
 
-        # get name
-        name = response.css("h2::text").get()
-        if name:
-            mathematician.name = name.strip()
 
-        # get school
-        mathematician.school = response.css('span[style*="006633"]::text').get()
+Link = Tuple[Optional[int], str]
 
-        # get year grauduated
-        graduated_span = response.css('span[style="margin-right: 0.5em"]').get()
-        if graduated_span:
-            graduated_match = re.search(r"\D(\d{4})\D", graduated_span)
-            if graduated_match:
-                mathematician.graduated = int(graduated_match.group(1))
 
-        # get thesis title
-        mathematician.thesis = response.css("#thesisTitle::text").get()
+# hrefs of the links outside of and inside of tables, read by libxml2 without building an
+# element object per link or serializing anything back to HTML
+OUTSIDE_TABLE_HREFS = etree.XPath("//a[not(ancestor::table)]/@href", smart_strings=False)
 
-        # get nationality
-        nationality_img = response.css('img[src*="img/flags/"]').get()
-        if nationality_img:
-            title_match = re.search('title="(.+)"', nationality_img)
-            if title_match:
-                mathematician.nationality = title_match.group(1)
 
-        # links to follow
-        urls = []
+INSIDE_TABLE_HREFS = etree.XPath("//table//a/@href", smart_strings=False)
+
+
+class PageLinks(NamedTuple):
+    advisors: List[Link]
+    students: List[Link]
+    math_sci_net_url: Optional[str]
+
+
+def extract_links(root) -> PageLinks:
+    """
+    Collect the links on a mathematician's page from the href attributes of its lxml tree.
+
+    Links to other mathematicians inside a table are students and the ones outside of
+    it are advisors, except for the link to the students in chronological order.
+    """
+    outside, inside = OUTSIDE_TABLE_HREFS(root), INSIDE_TABLE_HREFS(root)
+    advisors = [_link(href) for href in outside if href.startswith(MATHEMATICIAN_HREF) and "Chrono=" not in href]
+    students = [_link(href) for href in inside if href.startswith(MATHEMATICIAN_HREF)]
+    math_sci_net_url = next((href for href in outside + inside if href.startswith(MATH_SCI_NET_HREF)), None)
+    return PageLinks(advisors, students, math_sci_net_url)
+
+
+def _link(href: str) -> Link:
+    id_match = ID_PATTERN.search(href)
+    return int(id_match.group(1)) if id_match else None, href
+
+
+class MathematicianPage(NamedTuple):
+    mathematician: Mathematician
+    links: PageLinks
+
+
+def extract_mathematician_page(response) -> MathematicianPage:
+    """
+    Read a mathematician and the links to their advisors and students from their page.
+
+    Only reads the response, so it can run in a worker process, see ``offload``.
+    """
+    # instantiate data class
+    mathematician = Mathematician()
+
+    mathematician.math_genealogy_url = str(response.url)
+
+    # get id
+    id_match = re.search(r"id=(\d+)", response.url)
+    if id_match is not None:
+        mathematician.id_ = id_match.group(1)
+
+    # get name
+    name = response.css("h2::text").get()
+    if name:
+        mathematician.name = name.strip()
+
+    # get school
+    mathematician.school = response.css('span[style*="006633"]::text').get()
+
+    # get year grauduated
+    graduated_span = response.css('span[style="margin-right: 0.5em"]').get()
+    if graduated_span:
+        graduated_match = re.search(r"\D(\d{4})\D", graduated_span)
+        if graduated_match:
+            mathematician.graduated = int(graduated_match.group(1))
+
+    # get thesis title
+    mathematician.thesis = response.css("#thesisTitle::text").get()
+
+    # get nationality
+    nationality_img = response.css('img[src*="img/flags/"]').get()
+    if nationality_img:
+        title_match = re.search('title="(.+)"', nationality_img)
+        if title_match:
+            mathematician.nationality = title_match.group(1)
+
+    links = extract_links(response.selector.root)
+    mathematician.advisor_ids = [id_ for id_, _ in links.advisors]
+    mathematician.student_ids = [id_ for id_, _ in links.students]
+
+    # get subject
+    mathematician.subject = response.css(
+        'div[style="text-align: center; margin-top: 1ex"]::text'
+    ).get()
+
+    # get link to MathSciNet if it exists
+    mathematician.math_sci_net_url = links.math_sci_net_url
 
-        # get links and ids for other mathematicians on the page
-        mathematician_a_selectors = response.css('a[href^="id.php?id="]')
-        # remove link to students in chronological order
-        mathematician_a_selectors = [
-            s for s in mathematician_a_selectors if "Chrono=" not in s.get()
+    return MathematicianPage(mathematician, links)
+
+
+class MathSciNetCounts(NamedTuple):
+    publications: Optional[int]
+    citations: Optional[int]
+
+
+def extract_math_sci_net_counts(response) -> MathSciNetCounts:
+    """
+    Read the total publications and citations from a MathSciNet author profile.
+    """
+    trs = response.css("tr")
+    return MathSciNetCounts(
+        _math_sci_net_total(trs, "total publications"),
+        _math_sci_net_total(trs, "total citations"),
+    )
+
+
+def _math_sci_net_total(trs, label: str) -> Optional[int]:
+    labelled_trs = [tr for tr in trs if label in tr.get().lower()]
+    if labelled_trs:
+        total = labelled_trs[0].css("td:last-of-type::text").get()
+        return int(total) if total else None
+    return None
+
+
+class MathGenealogySpider(scrapy.Spider):
+    """
+    Crawls mathgenealogy.org by following advisor and student links.
+
+    In the default ``random`` mode the crawl starts from a few random mathematicians.
+    With ``scrapy crawl math_genealogy -a mode=incremental`` it starts from the rows of
+    the mathematician table that are missing one of INCREMENTAL_REQUIRED_FIELDS, such as
+    the id-only stubs written for unscraped students and advisors, and never requests
+    mathematicians whose rows are already complete. Either way, requests left unfinished
+    by a killed crawl are resumed from the checkpoint in CRAWL_STATE_DIR, which is
+    cleared once a crawl finishes.
+    """
+
+    name = "math_genealogy"
+
+    url = "https://www.mathgenealogy.org/id.php?id={}"
+
+    modes = ("random", "incremental")
+
+    start_ids = random.sample(range(1, 265263 + 1), k=16)
+
+    def __init__(self, *args, mode: str = "random", **kwargs):
+        super().__init__(*args, **kwargs)
+        if mode not in self.modes:
+            raise ValueError(f"Invalid mode {mode!r}, expected one of {', '.join(self.modes)}")
+        self.mode = mode
+        self.frontier = CrawlFrontier()
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # shared with the pipelines, which skip items that were already written
+        spider.frontier = CrawlFrontier.open(crawler.settings.get("CRAWL_STATE_DIR"))
+        return spider
+
+    def start_requests(self):
+        ids = list(self.frontier.unfinished())
+        self.logger.info("Resuming %d unfinished requests", len(ids))
+        if self.mode == "incremental":
+            seeds = self._incremental_seeds()
+        else:
+            seeds = self.start_ids
+        ids.extend(id_ for id_ in seeds if self.frontier.request(id_))
+        for id_ in ids:
+            yield scrapy.Request(self.url.format(id_), callback=self.parse)
+
+    def _incremental_seeds(self) -> List[int]:
+        required_fields = self.settings.getlist("INCREMENTAL_REQUIRED_FIELDS")
+        complete_ids, incomplete_ids = partition_mathematician_ids(required_fields)
+        self.logger.info(
+            "Skipping %d complete mathematicians, seeding %d incomplete ones",
+            len(complete_ids),
+            len(incomplete_ids),
+        )
+        # links to complete rows are not followed either, in this crawl only
+        self.frontier.skip(complete_ids)
+        return incomplete_ids
+
+    def closed(self, reason):
+        if reason == "finished":
+            self.frontier.clear()
+        else:
+            self.frontier.save()
+
+    @offloadable(extract_mathematician_page)
+    def parse(self, response, page: MathematicianPage):
+        mathematician, links = page
+        if mathematician.id_ is not None:
+            self.frontier.request(int(mathematician.id_))
+
+        # links to follow
+        urls = [
+            self._url(response, id_, href)
+            for id_, href in links.advisors + links.students
+            if self._should_follow(id_)
         ]
-        # student links are inside a table, but advisor links are outside the table
-        student_selectors = response.css('table a[href^="id.php?id="]')
-        student_text = set(map(lambda x: x.get(), student_selectors))
-
-        advisor_selectors = [s for s in mathematician_a_selectors if s.get() not in student_text]
-
-        for advisor_selector in advisor_selectors:
-            advisor_id, advisor_url = self.parse_a_selector(advisor_selector)
-            mathematician.advisor_ids.append(advisor_id)
-            urls.append(advisor_url)
-
-        for student_selector in student_selectors:
-            student_id, student_url = self.parse_a_selector(student_selector)
-            mathematician.student_ids.append(student_id)
-            urls.append(student_url)
-
-        # get subject
-        mathematician.subject = response.css(
-            'div[style="text-align: center; margin-top: 1ex"]::text'
-        ).get()
-
-        # get link to MathSciNet if it exists
-        math_sci_net_link = response.css('a[href^="http://www.ams.org/mathscinet/MRAuthorID"]')
-        math_sci_net_a_tag = math_sci_net_link.get()
-        if math_sci_net_a_tag:
-            math_sci_net_url_match = re.search('href="(.+)"', math_sci_net_a_tag)
-            if math_sci_net_url_match:
-                mathematician.math_sci_net_url = math_sci_net_url_match.group(1)
 
         # follow math sci net url and try to scrape publications and citations
         if mathematician.math_sci_net_url:
@@ -121,44 +251,25 @@ class MathGenealogySpider(scrapy.Spider):
 
         # follow urls for advisor and students
         self.logger.debug("following urls: %s", ", ".join(urls))
-        yield from response.follow_all(urls, callback=self.parse)
+        for url in urls:
+            yield scrapy.Request(url, callback=self.parse)
 
-    def parse_math_sci_net(self, response):
+    @offloadable(extract_math_sci_net_counts)
+    def parse_math_sci_net(self, response, counts: MathSciNetCounts):
         mathematician = response.meta["mathematician"]
-        trs = response.css("tr")
-        self.logger.debug("trs: %s", trs)
-        if trs:
-            publication_trs = [tr for tr in trs if "total publications" in tr.get().lower()]
-            self.logger.debug("publication_trs: %s", publication_trs)
-            if publication_trs:
-                publications = publication_trs[0].css("td:last-of-type::text").get()
-                self.logger.debug("publications: %s", publications)
-                mathematician.publications = int(publications) if publications else publications
-            citation_trs = [tr for tr in trs if "total citations" in tr.get().lower()]
-            self.logger.debug("citation_trs: %s", citation_trs)
-            if citation_trs:
-                citations = citation_trs[0].css("td:last-of-type::text").get()
-                self.logger.debug("citations: %s", citations)
-                mathematician.citations = int(citations) if citations else citations
+        if counts.publications is not None:
+            mathematician.publications = counts.publications
+        if counts.citations is not None:
+            mathematician.citations = counts.citations
 
         self.logger.debug("mathematician: %s", asdict(mathematician))
 
         yield mathematician
 
-    def parse_a_selector(self, selector) -> Tuple[Optional[int], Optional[str]]:
-        id_, url = None, None
-
-        if not selector:
-            return id_, url
-
-        tag = selector.get()
-
-        id_match = re.search(r"id=(\d+)", tag)
-        if id_match:
-            id_ = int(id_match.group(1))
-
-        href_match = re.search(r'href="(.+)"', tag)
-        if href_match:
-            url = href_match.group(1)
+    def _url(self, response, id_: Optional[int], href: str) -> str:
+        # formatting the url from the id is much cheaper than resolving the relative href
+        return self.url.format(id_) if id_ is not None else response.urljoin(href)
 
-        return id_, url
+    def _should_follow(self, id_: Optional[int]) -> bool:
+        # skip mathematicians that were already requested in this crawl or written by any crawl
+        return id_ is None or self.frontier.request(id_)
@@ -0,0 +1,84 @@
+"""
+Compares requests/sec of the sync and async implementations of the read endpoints,
+sending rounds of concurrent student and advisor lookups to each in process.
+
+Fills a fresh SQLite database with a synthetic genealogy, read through pysqlite by the
+sync endpoints and through aiosqlite by the async ones.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_async_api.py
+
+command line arguments:
+    :concurrency:
+        number of requests in flight at once, default 200
+"""
+
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["ENVIRONMENT"] = "dev"
+os.environ["POSTGRES_CONNECTION_DEV"] = f"sqlite:///{os.path.join(_tmp.name, 'bench.db')}"
+
+import httpx  # noqa E402
+from fastapi import FastAPI  # noqa E402
+
+import math_genealogy.backend.db as db  # noqa E402
+from math_genealogy.backend.app import async_reads, reads  # noqa E402
+
+
+NODES = 50000
+ROUNDS = 5
+
+
+def populate():
+    rng = random.Random(0)
+    db.BaseModel.metadata.create_all(db.engine)
+    with db.engine.begin() as connection:
+        connection.execute(
+            db.Mathematician.__table__.insert(),
+            [{"id": id_, "name": f"Mathematician {id_}"} for id_ in range(1, NODES + 1)],
+        )
+        connection.execute(
+            db.StudentAdvisor.__table__.insert(),
+            [
+                {"student_id": student_id, "advisor_id": rng.randint(1, student_id - 1)}
+                for student_id in range(2, NODES + 1)
+            ],
+        )
+
+
+async def benchmark(name, router, concurrency):
+    app = FastAPI()
+    app.include_router(router)
+    rng = random.Random(1)
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        best = 0
+        for _ in range(ROUNDS):
+            urls = [
+                f"/mathematicians/{rng.randint(1, NODES)}/{rng.choice(['students', 'advisors'])}"
+                for _ in range(concurrency)
+            ]
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[client.get(url) for url in urls])
+            elapsed = time.perf_counter() - start
+            assert all(response.status_code == 200 for response in responses)
+            best = max(best, concurrency / elapsed)
+    print(f"{name:>5}: {best:7.0f} req/s at {concurrency} concurrent requests")
+
+
+def main(concurrency):
+    populate()
+    asyncio.run(benchmark("sync", reads, concurrency))
+    asyncio.run(benchmark("async", async_reads, concurrency))
+    _tmp.cleanup()
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
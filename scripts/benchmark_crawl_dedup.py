@@ -0,0 +1,201 @@
+"""
+Counts duplicate page requests and duplicate database writes of an interrupted and
+restarted crawl, with the old processed_ids set that was reset every 2000 items and
+with the persistent crawl frontier, and the pages fetched to refresh a database with
+stub rows by a full crawl and by an incremental crawl.
+
+The crawl is recorded on a synthetic genealogy: every mathematician after the first
+gets one or two advisors picked from the mathematicians before them. Each run starts
+from random mathematicians, follows advisor and student links breadth first the way
+MathGenealogySpider does and is interrupted after a fixed number of pages. Before the
+frontier, every run only had Scrapy's in-memory duplicate filter, so the recorded runs
+are replayed through a pipeline with the old reset behavior. With the frontier, the
+runs are crawled again skipping requested ids and written through the current pipeline.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_crawl_dedup.py
+
+command line arguments:
+    :nodes:
+        number of mathematicians in the synthetic graph, default 50000
+    :runs:
+        number of restarted crawl runs, default 5
+"""
+
+
+import collections
+import os
+import random
+import sys
+import tempfile
+
+tmp = tempfile.TemporaryDirectory()
+os.environ.setdefault("ENVIRONMENT", "dev")
+os.environ.setdefault("POSTGRES_CONNECTION_DEV", f"sqlite:///{os.path.join(tmp.name, 'crawl.db')}")
+
+from itemadapter import ItemAdapter  # noqa E402
+from scrapy.exceptions import DropItem  # noqa E402
+from sqlalchemy import create_engine  # noqa E402
+
+import math_genealogy.scrapers.scrapers.pipelines as pipelines  # noqa E402
+from math_genealogy.backend.db import BaseModel  # noqa E402
+from math_genealogy.config import CONFIG  # noqa E402
+from math_genealogy.scrapers.scrapers.dedup import CrawlFrontier  # noqa E402
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import Mathematician  # noqa E402
+
+
+SEEDS = 16
+
+
+write_batch = pipelines.write_batch
+
+
+def make_graph(nodes, seed=0):
+    rng = random.Random(seed)
+    advisors = collections.defaultdict(list)
+    students = collections.defaultdict(list)
+    for student_id in range(2, nodes + 1):
+        for advisor_id in {rng.randint(1, student_id - 1) for _ in range(rng.choice([1, 1, 1, 2]))}:
+            advisors[student_id].append(advisor_id)
+            students[advisor_id].append(student_id)
+    return advisors, students
+
+
+def crawl(graph, seeds, pages, should_follow):
+    """
+    Breadth first crawl from ``seeds``, yielding the ids of the pages fetched. Like
+    MathGenealogySpider.start_requests, callers mark the seeds as requested themselves.
+    """
+    advisors, students = graph
+    queue = collections.deque(seeds)
+    for _ in range(pages):
+        if not queue:
+            return
+        id_ = queue.popleft()
+        yield id_
+        queue.extend(linked for linked in advisors[id_] + students[id_] if should_follow(linked))
+
+
+class LegacyPipeline(pipelines.SqlalchemyWriterPipeline):
+    """
+    The pipeline's duplicate check before the crawl frontier.
+    """
+
+    cache_size = 2000
+
+    def open_spider(self, spider):
+        super().open_spider(spider)
+        self.processed_ids = set()
+
+    def process_item(self, item, spider):
+        if len(self.processed_ids) > self.cache_size:
+            self.processed_ids = set()
+        if item.id_ in self.processed_ids:
+            raise DropItem(f'Already processed item with id "{item.id_}"')
+        self.processed_ids.add(item.id_)
+        self.items.append(ItemAdapter(self._clean_item(item)).asdict())
+        if len(self.items) >= self.batch_size:
+            self._insert_items()
+            self.items = []
+        return item
+
+
+class WriteCounter:
+    def __init__(self):
+        self.written = set()
+        self.writes = 0
+        self.duplicates = 0
+
+    def __call__(self, session, batch):
+        self.writes += len(batch.rows)
+        self.duplicates += len(batch.rows.keys() & self.written)
+        self.written.update(batch.rows)
+        write_batch(session, batch)
+
+
+class Spider:
+    name = "math_genealogy"
+
+    def __init__(self, frontier=None):
+        self.frontier = frontier
+
+
+def item(graph, id_):
+    advisors, students = graph
+    return Mathematician(
+        id_=str(id_), name=f"Mathematician {id_}", advisor_ids=advisors[id_], student_ids=students[id_]
+    )
+
+
+def replay(pipeline, spider, graph, ids):
+    instance = pipeline()
+    instance.open_spider(spider)
+    for id_ in ids:
+        try:
+            instance.process_item(item(graph, id_), spider)
+        except DropItem:
+            pass
+
+
+def reset_database():
+    engine = create_engine(CONFIG.db_connection)
+    BaseModel.metadata.drop_all(engine)
+    BaseModel.metadata.create_all(engine)
+    engine.dispose()
+
+
+def report(label, fetched, counter):
+    duplicate_fetches = sum(fetched.values()) - len(fetched)
+    print(
+        f"{label:<10} {sum(fetched.values()):>7} pages fetched, {duplicate_fetches:>7} duplicate fetches, "
+        f"{counter.writes:>7} items written, {counter.duplicates:>7} duplicate writes"
+    )
+
+
+def main(nodes=50000, runs=5):
+    graph = make_graph(nodes)
+    rng = random.Random(1)
+    seeds = [rng.sample(range(1, nodes + 1), k=SEEDS) for _ in range(runs)]
+    pages = nodes // 3
+
+    # before: each run only deduplicates requests within itself
+    reset_database()
+    pipelines.write_batch = counter = WriteCounter()
+    fetched = collections.Counter()
+    for run_seeds in seeds:
+        requested = set(run_seeds)
+        ids = list(crawl(graph, run_seeds, pages, lambda id_: id_ not in requested and not requested.add(id_)))
+        fetched.update(ids)
+        replay(LegacyPipeline, Spider(), graph, ids)
+    report("before", fetched, counter)
+
+    # after: the frontier is saved after every batch and reopened by each run
+    reset_database()
+    pipelines.write_batch = counter = WriteCounter()
+    fetched = collections.Counter()
+    directory = os.path.join(tmp.name, "crawl-state")
+    for run_seeds in seeds:
+        spider = Spider(CrawlFrontier.open(directory))
+        unfinished = list(spider.frontier.unfinished())
+        run_seeds = unfinished + [id_ for id_ in run_seeds if spider.frontier.request(id_)]
+        ids = list(crawl(graph, run_seeds, pages, spider.frontier.request))
+        fetched.update(ids)
+        replay(pipelines.SqlalchemyWriterPipeline, spider, graph, ids)
+    report("after", fetched, counter)
+    print(f"checkpoint: {sum(os.path.getsize(os.path.join(directory, f)) for f in os.listdir(directory))} bytes")
+
+    # refreshing a database where a tenth of the rows are stubs
+    incomplete = set(random.Random(2).sample(range(1, nodes + 1), k=nodes // 10))
+    requested = set(seeds[0])
+    full = sum(1 for _ in crawl(graph, seeds[0], nodes, lambda id_: id_ not in requested and not requested.add(id_)))
+    frontier = CrawlFrontier()
+    frontier.mark_written(id_ for id_ in range(1, nodes + 1) if id_ not in incomplete)
+    seeded = [id_ for id_ in sorted(incomplete) if frontier.request(id_)]
+    incremental = sum(1 for _ in crawl(graph, seeded, nodes, frontier.request))
+    print(f"refresh with {len(incomplete)} stub rows: full crawl {full} pages, incremental crawl {incremental} pages")
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:3]])
+    tmp.cleanup()
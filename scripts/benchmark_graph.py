@@ -0,0 +1,87 @@
+"""
+Times traversals and shortest path queries of the in-memory graph index on a synthetic,
+genealogy sized graph.
+
+Every mathematician after the first gets one or two advisors picked uniformly from the
+mathematicians before them, so the first few ids have deep lineages with hundreds of
+thousands of descendants, like Euler or Gauss.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_graph.py
+
+command line arguments:
+    :nodes:
+        number of mathematicians in the synthetic graph, default 265263
+    :pairs:
+        number of random pairs to find shortest paths between, default 1000
+"""
+
+
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("ENVIRONMENT", "dev")
+os.environ.setdefault("POSTGRES_CONNECTION_DEV", "sqlite://")
+
+from math_genealogy.backend.graph import GraphIndex  # noqa E402
+
+
+def make_edges(nodes, seed=0):
+    rng = random.Random(seed)
+    return {
+        (student_id, rng.randint(1, student_id - 1))
+        for student_id in range(2, nodes + 1)
+        for _ in range(rng.choice([1, 1, 1, 2]))
+    }
+
+
+def timed(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def benchmark_traversals(graph_index, nodes):
+    for root in [1, 2, 10, nodes // 2]:
+        descendants, elapsed = timed(lambda: list(graph_index.descendants(root)))
+        print(f"descendants of {root:>7}: {len(descendants):>7} rows in {elapsed * 1000:8.1f}ms")
+    leaf = nodes
+    ancestors, elapsed = timed(lambda: list(graph_index.ancestors(leaf)))
+    print(f"ancestors of   {leaf:>7}: {len(ancestors):>7} rows in {elapsed * 1000:8.1f}ms")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def benchmark_shortest_paths(graph_index, nodes, pairs, seed=1):
+    rng = random.Random(seed)
+    latencies, lengths = [], []
+    for _ in range(pairs):
+        source_id, target_id = rng.randint(1, nodes), rng.randint(1, nodes)
+        path, elapsed = timed(graph_index.shortest_path, source_id, target_id)
+        latencies.append(elapsed * 1000)
+        lengths.append(len(path) - 1 if path else 0)
+    print(
+        f"shortest paths between {pairs} random pairs: "
+        f"p50 {percentile(latencies, 50):.2f}ms, p99 {percentile(latencies, 99):.2f}ms, "
+        f"max {max(latencies):.2f}ms, mean length {sum(lengths) / len(lengths):.1f} hops"
+    )
+
+
+def main(nodes, pairs):
+    edges = make_edges(nodes)
+    graph_index, elapsed = timed(GraphIndex, edges)
+    print(f"built index of {len(edges)} edges in {elapsed:.2f}s, {graph_index.nbytes / 2 ** 20:.1f} MiB")
+    benchmark_traversals(graph_index, nodes)
+    benchmark_shortest_paths(graph_index, nodes, pairs)
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 265263
+    pairs = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    main(nodes, pairs)
@@ -0,0 +1,135 @@
+"""
+Compares API workers loading the graph index from the database with workers mapping it
+from a graph snapshot, on a synthetic, genealogy sized SQLite database.
+
+Each mode starts a number of worker processes side by side. Every worker builds its graph
+index, walks the descendants of the root mathematician so every page of the graph is
+touched, then reports how long the index took to be ready, and its private memory and
+proportional set size (PSS, its share of memory shared with other processes) from
+/proc/self/smaps_rollup, so Linux only.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_graph_snapshot.py
+
+command line arguments:
+    :nodes:
+        number of mathematicians in the synthetic graph, default 265263
+    :workers:
+        number of worker processes per mode, default 4
+"""
+
+
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("ENVIRONMENT", "dev")
+os.environ.setdefault("POSTGRES_CONNECTION_DEV", "sqlite://")
+
+from sqlalchemy import create_engine  # noqa E402
+from sqlalchemy.orm import sessionmaker  # noqa E402
+
+import math_genealogy.backend.db as db  # noqa E402
+from math_genealogy.backend.graph import GraphIndex, write_graph_snapshot  # noqa E402
+from math_genealogy.backend.graph_snapshot import GraphSnapshot  # noqa E402
+
+
+def populate(connection, nodes, seed=0):
+    # every mathematician after the first gets one or two advisors before them
+    rng = random.Random(seed)
+    engine = create_engine(connection)
+    db.BaseModel.metadata.create_all(engine)
+    with engine.begin() as c:
+        for start in range(1, nodes + 1, 10000):
+            ids = range(start, min(start + 10000, nodes + 1))
+            c.execute(
+                db.Mathematician.__table__.insert(),
+                [{"id": id_, "name": f"Mathematician {id_}", "school": f"University {id_ % 2000}"} for id_ in ids],
+            )
+            edges = {
+                (id_, rng.randint(1, id_ - 1)) for id_ in ids if id_ > 1 for _ in range(rng.choice([1, 1, 1, 2]))
+            }
+            if edges:
+                c.execute(
+                    db.StudentAdvisor.__table__.insert(),
+                    [{"student_id": student_id, "advisor_id": advisor_id} for (student_id, advisor_id) in edges],
+                )
+    engine.dispose()
+
+
+def memory():
+    # (private, pss) bytes of this process
+    fields = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return fields["Private_Clean"] + fields["Private_Dirty"], fields["Pss"]
+
+
+def worker(mode, connection, path, barrier, results):
+    start = time.perf_counter()
+    if mode == "database":
+        engine = create_engine(connection)
+        session = sessionmaker(bind=engine)()
+        graph_index = GraphIndex.load(session)
+        session.close()
+        engine.dispose()
+    else:
+        graph_index = GraphIndex.from_snapshot(GraphSnapshot(path))
+    ready = time.perf_counter() - start
+    descendants = sum(1 for _ in graph_index.descendants(1))
+    # measured once every worker holds its index
+    barrier.wait()
+    private, pss = memory()
+    results.put((ready, private, pss, descendants))
+    barrier.wait()
+
+
+def run(mode, connection, path, workers):
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers)
+    results = context.Queue()
+    processes = [
+        context.Process(target=worker, args=(mode, connection, path, barrier, results)) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    stats = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    ready = sum(ready for (ready, _, _, _) in stats) / workers
+    private = sum(private for (_, private, _, _) in stats) / workers
+    pss = sum(pss for (_, _, pss, _) in stats)
+    print(
+        f"{mode:<9} {workers} workers: ready in {ready * 1000:8.1f}ms, "
+        f"{private / 2 ** 20:6.1f} MiB private per worker, {pss / 2 ** 20:7.1f} MiB PSS in total, "
+        f"{stats[0][3]} descendants of 1"
+    )
+
+
+def main(nodes=265263, workers=4):
+    with tempfile.TemporaryDirectory() as directory:
+        connection = f"sqlite:///{os.path.join(directory, 'genealogy.db')}"
+        populate(connection, nodes)
+        path = os.path.join(directory, "graph.snapshot")
+        engine = create_engine(connection)
+        session = sessionmaker(bind=engine)()
+        start = time.perf_counter()
+        size = write_graph_snapshot(session, path)
+        print(f"wrote a {size / 2 ** 20:.1f} MiB snapshot in {time.perf_counter() - start:.2f}s")
+        session.close()
+        engine.dispose()
+        for mode in ["database", "snapshot"]:
+            run(mode, connection, path, workers)
+
+
+if __name__ == '__main__':
+    nodes = int(sys.argv[1]) if len(sys.argv) > 1 else 265263
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    main(nodes, workers)
@@ -0,0 +1,110 @@
+"""
+Compares archiving scraped items with the previous SampleJsonWriterPipeline, which made
+one write per item into a single JSON array, against the buffered line-delimited JSON
+writer, plain and gzip compressed, and reading them back: the old file has to be fixed
+up and parsed as a whole, the new ones are streamed one item at a time.
+
+Reports items per second written and read, file sizes and the peak memory allocated by
+Python objects while reading.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_item_files.py
+
+command line arguments:
+    :items:
+        number of synthetic items to write, default 200000
+"""
+
+
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from math_genealogy.scrapers.scrapers.item_files import ItemFileWriter, read_items
+
+
+def make_items(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        dict(
+            id_=str(id_),
+            name=f"Mathematician {id_}",
+            school="University of North Texas",
+            graduated=rng.randint(1700, 2020),
+            thesis="Aspects of Universality In Function Iteration",
+            nationality="UnitedStates",
+            subject=None,
+            advisor_ids=[rng.randint(1, n) for _ in range(rng.randint(0, 2))],
+            student_ids=[rng.randint(1, n) for _ in range(rng.choice([0, 0, 1, 2, 5]))],
+            math_genealogy_url=f"https://www.mathgenealogy.org/id.php?id={id_}",
+            math_sci_net_url=None,
+            publications=None,
+            citations=None,
+        )
+        for id_ in range(1, n + 1)
+    ]
+
+
+def write_legacy(path, items):
+    # what SampleJsonWriterPipeline used to do for each item
+    with open(path, "w") as f:
+        f.write('{"mathematicians": [\n')
+        for item in items:
+            f.write(json.dumps(item, default=str) + ",\n")
+        f.write("]}")
+    return [path]
+
+
+def read_legacy(paths):
+    [path] = paths
+    with open(path) as f:
+        text = f.read()
+    return iter(json.loads(text[:text.rindex(",")] + "]}")["mathematicians"])
+
+
+def write_lines(directory, items, compression):
+    writer = ItemFileWriter(directory, "items", compression=compression, max_items=len(items) // 4 + 1)
+    for item in items:
+        writer.write(item)
+    writer.close()
+    return writer.paths
+
+
+def measure_read(read, paths):
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = sum(1 for _ in read(paths))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main(n=200000):
+    items = make_items(n)
+    with tempfile.TemporaryDirectory() as directory:
+        formats = [
+            ("legacy json", lambda: write_legacy(os.path.join(directory, "legacy.json"), items), read_legacy),
+            ("ndjson", lambda: write_lines(os.path.join(directory, "plain"), items, None), read_items),
+            ("ndjson.gz", lambda: write_lines(os.path.join(directory, "gzip"), items, "gzip"), read_items),
+        ]
+        for label, write, read in formats:
+            start = time.perf_counter()
+            paths = write()
+            write_elapsed = time.perf_counter() - start
+            size = sum(os.path.getsize(path) for path in paths)
+            count, read_elapsed, peak = measure_read(read, paths)
+            assert count == n
+            print(
+                f"{label:<12} write {n / write_elapsed:9.0f} items/s, {len(paths)} files {size / 2 ** 20:7.1f}MB, "
+                f"read {n / read_elapsed:9.0f} items/s, peak {peak / 2 ** 20:7.1f}MB"
+            )
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
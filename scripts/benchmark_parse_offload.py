@@ -0,0 +1,135 @@
+"""
+Crawls a local stand-in for mathgenealogy.org with MathGenealogySpider, parsing pages on
+the reactor thread and with PARSE_OFFLOAD set to "thread" and "process", and reports
+pages per second for each.
+
+The server answers every id with the offline corpus page of a mathematician with 400
+students, with the student links rewritten so each id links to different mathematicians.
+Each crawl runs in its own process, since the Twisted reactor cannot be restarted, and
+stops after a fixed number of pages. Nothing is written to the database.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_parse_offload.py
+
+command line arguments:
+    :pages:
+        number of pages crawled per mode, default 2000
+    :workers:
+        size of the parsing pool, default one per CPU
+"""
+
+
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ.setdefault("ENVIRONMENT", "dev")
+os.environ.setdefault("POSTGRES_CONNECTION_DEV", "sqlite://")
+
+
+PAGE = os.path.join(
+    os.path.dirname(__file__), "..", "tests", "math_genealogy", "scrapers", "fixtures", "pages", "id-7298.html"
+)
+
+
+MODES = (None, "thread", "process")
+
+
+class GenealogyHandler(BaseHTTPRequestHandler):
+    template = None
+    # links point into a few times as many ids as are crawled, so most of them are
+    # already requested and the crawl is not dominated by scheduling new requests
+    ids = None
+
+    def do_GET(self):
+        match = re.search(r"id=(\d+)", self.path)
+        id_ = int(match.group(1)) if match else 1
+        body = re.sub(
+            rb"id\.php\?id=(\d+)",
+            lambda link: b"id.php?id=%d" % ((int(link.group(1)) * 7919 + id_ * 104729) % self.ids + 1),
+            self.template,
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(ids):
+    with open(PAGE, "rb") as f:
+        GenealogyHandler.template = f.read()
+    GenealogyHandler.ids = ids
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GenealogyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def crawl(port, pages, mode, workers):
+    """
+    Run one crawl against the server on ``port`` and print its stats as JSON.
+    """
+    from scrapy.crawler import CrawlerProcess
+
+    from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider
+
+    class LocalSpider(MathGenealogySpider):
+        url = f"http://127.0.0.1:{port}/id.php?id={{}}"
+        start_ids = list(range(1, 17))
+
+        async def start(self):
+            # Scrapy 2.13 and later only read the start requests from start()
+            for request in self.start_requests():
+                yield request
+
+    process = CrawlerProcess(
+        {
+            "LOG_LEVEL": "ERROR",
+            "ROBOTSTXT_OBEY": False,
+            "CONCURRENT_REQUESTS": 32,
+            "CLOSESPIDER_PAGECOUNT": pages,
+            "SPIDER_MIDDLEWARES": {"math_genealogy.scrapers.scrapers.middlewares.ScrapersSpiderMiddleware": 543},
+            "PARSE_OFFLOAD": mode,
+            "PARSE_OFFLOAD_WORKERS": workers,
+        }
+    )
+    crawler = process.create_crawler(LocalSpider)
+    start = time.perf_counter()
+    process.crawl(crawler)
+    process.start()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"pages": crawler.stats.get_value("response_received_count"), "seconds": elapsed}))
+
+
+def main(pages=2000, workers=0):
+    server = serve(4 * pages)
+    print(f"{os.cpu_count()} CPUs, {workers or os.cpu_count()} workers")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, "--crawl", str(server.server_port), str(pages), mode or "", str(workers)],
+            check=True,
+            stdout=subprocess.PIPE,
+        ).stdout
+        stats = json.loads(output.decode().strip().splitlines()[-1])
+        print(
+            f"{mode or 'reactor':<8} {stats['pages']:>6} pages in {stats['seconds']:6.2f}s, "
+            f"{stats['pages'] / stats['seconds']:7.1f} pages/s"
+        )
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--crawl"]:
+        port, pages, mode, workers = sys.argv[2:6]
+        crawl(int(port), int(pages), mode or None, int(workers))
+    else:
+        main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,159 @@
+"""
+Runs the spider callbacks over the offline page corpus in
+tests/math_genealogy/scrapers/fixtures and reports, for each callback, pages per second,
+the peak memory allocated by Python objects per page and the time spent in each CSS
+selector, in serializing selectors back to HTML and in regular expressions.
+
+The corpus has genealogy pages with hundreds of students, MathSciNet profiles and arXiv
+listing and abstract pages. Each page is wrapped in an HtmlResponse the way Scrapy would
+hand it to the callback, so no network access is needed.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_parsers.py
+
+command line arguments:
+    :repeat:
+        number of times each page is parsed, default 200
+"""
+
+
+import collections
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("ENVIRONMENT", "dev")
+os.environ.setdefault("POSTGRES_CONNECTION_DEV", "sqlite://")
+
+import parsel  # noqa E402
+from scrapy.http import HtmlResponse, Request  # noqa E402
+
+import math_genealogy.scrapers.scrapers.spiders.arxiv_papers as arxiv_papers  # noqa E402
+import math_genealogy.scrapers.scrapers.spiders.math_genealogy as math_genealogy  # noqa E402
+from math_genealogy.scrapers.scrapers.dedup import CrawlFrontier  # noqa E402
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "..", "tests", "math_genealogy", "scrapers", "fixtures")
+
+
+SPIDERS = {
+    "math_genealogy": math_genealogy.MathGenealogySpider,
+    "arxiv": arxiv_papers.ArxivPaperSpider,
+}
+
+
+def load_corpus():
+    with open(os.path.join(FIXTURES, "corpus.json")) as f:
+        pages = json.load(f)["pages"]
+    for page in pages:
+        with open(os.path.join(FIXTURES, "pages", page["file"]), "rb") as f:
+            page["body"] = f.read()
+    return pages
+
+
+def make_response(page):
+    meta = {}
+    if page["callback"] == "math_genealogy.parse_math_sci_net":
+        meta["mathematician"] = math_genealogy.Mathematician(**page["meta"])
+    elif page["callback"] == "arxiv.parse_abstract":
+        meta["arxiv_paper"] = arxiv_papers.ArxivPaper()
+    return HtmlResponse(page["url"], body=page["body"], encoding="utf-8", request=Request(page["url"], meta=meta))
+
+
+def run(spider, callback, page):
+    # a fresh response and crawl frontier per run, so the parsed document is not reused
+    # and every link on the page is followed
+    spider.frontier = CrawlFrontier()
+    return list(getattr(spider, callback)(make_response(page)))
+
+
+class SelectorTimer:
+    """
+    Accumulates the time spent in parsel selectors and the spiders' regular expressions
+    while installed.
+    """
+
+    def __init__(self):
+        self.seconds = collections.Counter()
+        self.calls = collections.Counter()
+        self._patched = []
+
+    def _wrap(self, owner, name, key):
+        original = getattr(owner, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                label = key(*args, **kwargs)
+                self.seconds[label] += time.perf_counter() - start
+                self.calls[label] += 1
+
+        self._patched.append((owner, name, original))
+        setattr(owner, name, timed)
+
+    def __enter__(self):
+        self._wrap(parsel.Selector, "css", lambda selector, query: f"css {query!r}")
+        self._wrap(parsel.Selector, "get", lambda selector: "Selector.get")
+        for module in (math_genealogy, arxiv_papers):
+            # the spiders call re.search through their module's reference to re
+            proxy = type("re", (), {"search": staticmethod(re.search)})
+            module.re = proxy
+            self._patched.append((module, "re", re))
+            self._wrap(proxy, "search", lambda pattern, string, *args: f"re.search {pattern!r}")
+        return self
+
+    def __exit__(self, *exc):
+        for owner, name, original in reversed(self._patched):
+            setattr(owner, name, original)
+
+
+def main(repeat=200):
+    pages = load_corpus()
+    by_callback = collections.defaultdict(list)
+    for page in pages:
+        by_callback[page["callback"]].append(page)
+
+    for callback_name, callback_pages in by_callback.items():
+        spider_name, callback = callback_name.split(".")
+        spider = SPIDERS[spider_name]()
+        spider.logger.logger.disabled = True
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for page in callback_pages:
+                run(spider, callback, page)
+        elapsed = time.perf_counter() - start
+        count = repeat * len(callback_pages)
+
+        peaks = []
+        for page in callback_pages:
+            tracemalloc.start()
+            run(spider, callback, page)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peaks.append(peak)
+
+        with SelectorTimer() as timer:
+            for page in callback_pages:
+                run(spider, callback, page)
+
+        print(
+            f"{callback_name}: {len(callback_pages)} pages, {count / elapsed:8.1f} pages/s, "
+            f"peak Python allocations {max(peaks) / 1024:8.1f}KB per page"
+        )
+        total = sum(timer.seconds.values())
+        for label, seconds in timer.seconds.most_common():
+            print(
+                f"    {label[:70]:<70} {timer.calls[label]:>6} calls {seconds * 1000:8.2f}ms "
+                f"{100 * seconds / total:5.1f}%"
+            )
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:2]])
@@ -0,0 +1,145 @@
+"""
+Crawls the local stand-in for mathgenealogy.org of benchmark_parse_offload.py with
+SqlalchemyWriterPipeline writing to a SQLite database, committing batches on the reactor
+thread and in the background writer thread, and reports pages per second, the slowest
+second of the crawl and the longest time the reactor was blocked.
+
+A heartbeat scheduled on the reactor every 10ms measures how late it runs. Each batch
+write is delayed to stand in for the round trip to a busy remote database.
+
+example usage:
+    from root directory
+    python ./scripts/benchmark_pipeline_writes.py
+
+command line arguments:
+    :pages:
+        number of pages crawled per mode, default 3000
+    :latency:
+        milliseconds added to every batch write, default 200
+"""
+
+
+import collections
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from benchmark_parse_offload import serve  # noqa E402
+
+
+def crawl(port, pages, background, latency, directory):
+    """
+    Run one crawl against the server on ``port`` and print its stats as JSON.
+    """
+    os.environ.setdefault("ENVIRONMENT", "dev")
+    os.environ["POSTGRES_CONNECTION_DEV"] = f"sqlite:///{os.path.join(directory, 'crawl.db')}"
+
+    from scrapy import signals
+    from scrapy.crawler import CrawlerProcess
+    from sqlalchemy import create_engine
+    from twisted.internet import task
+
+    import math_genealogy.scrapers.scrapers.pipelines as pipelines
+    from math_genealogy.backend.db import BaseModel
+    from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider
+
+    engine = create_engine(os.environ["POSTGRES_CONNECTION_DEV"])
+    BaseModel.metadata.create_all(engine)
+    engine.dispose()
+
+    write_batch = pipelines.write_batch
+
+    def slow_write_batch(session, batch):
+        time.sleep(latency / 1000)
+        write_batch(session, batch)
+
+    pipelines.write_batch = slow_write_batch
+
+    class LocalSpider(MathGenealogySpider):
+        url = f"http://127.0.0.1:{port}/id.php?id={{}}"
+        start_ids = list(range(1, 17))
+
+        async def start(self):
+            # Scrapy 2.13 and later only read the start requests from start()
+            for request in self.start_requests():
+                yield request
+
+    process = CrawlerProcess(
+        {
+            "LOG_LEVEL": "ERROR",
+            "ROBOTSTXT_OBEY": False,
+            "CONCURRENT_REQUESTS": 32,
+            "CLOSESPIDER_PAGECOUNT": pages,
+            "ITEM_PIPELINES": {"math_genealogy.scrapers.scrapers.pipelines.SqlalchemyWriterPipeline": 300},
+            "CRAWL_STATE_DIR": os.path.join(directory, "crawl-state"),
+            "DB_WRITER_BACKGROUND": background,
+        }
+    )
+    crawler = process.create_crawler(LocalSpider)
+    responses = collections.Counter()
+    stalls = []
+    last = [time.perf_counter()]
+
+    def response_received():
+        responses[int(time.perf_counter())] += 1
+
+    def heartbeat():
+        now = time.perf_counter()
+        stalls.append(now - last[0] - 0.01)
+        last[0] = now
+
+    def engine_started():
+        # started once Scrapy has installed its reactor
+        last[0] = time.perf_counter()
+        task.LoopingCall(heartbeat).start(0.01)
+
+    # signal handlers are weakly referenced, these live as long as the crawl
+    crawler.signals.connect(response_received, signal=signals.response_received)
+    crawler.signals.connect(engine_started, signal=signals.engine_started)
+    start = time.perf_counter()
+    process.crawl(crawler)
+    process.start()
+    elapsed = time.perf_counter() - start
+    seconds = sorted(responses)[1:-1]  # the first and last seconds are partial
+    print(json.dumps({
+        "pages": crawler.stats.get_value("response_received_count"),
+        "items": crawler.stats.get_value("item_scraped_count"),
+        "seconds": elapsed,
+        "slowest_second": min(responses[second] for second in seconds) if seconds else 0,
+        "max_stall": max(stalls),
+    }))
+
+
+def main(pages=3000, latency=200):
+    server = serve(4 * pages)
+    for background in (False, True):
+        with tempfile.TemporaryDirectory() as directory:
+            output = subprocess.run(
+                [
+                    sys.executable, __file__, "--crawl",
+                    str(server.server_port), str(pages), str(int(background)), str(latency), directory,
+                ],
+                check=True,
+                stdout=subprocess.PIPE,
+            ).stdout
+        stats = json.loads(output.decode().strip().splitlines()[-1])
+        print(
+            f"{'background' if background else 'reactor':<10} {stats['pages']:>6} pages, {stats['items']:>6} items "
+            f"in {stats['seconds']:6.2f}s, {stats['pages'] / stats['seconds']:6.1f} pages/s, "
+            f"slowest second {stats['slowest_second']:>4} pages, "
+            f"reactor blocked up to {stats['max_stall'] * 1000:6.0f}ms"
+        )
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ["--crawl"]:
+        port, pages, background, latency, directory = sys.argv[2:7]
+        crawl(int(port), int(pages), bool(int(background)), int(latency), directory)
+    else:
+        main(*[int(arg) for arg in sys.argv[1:3]])
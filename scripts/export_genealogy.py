@@ -0,0 +1,63 @@
+"""
+Exports the mathematician and student_advisor tables of the database of the current
+ENVIRONMENT to Parquet or Arrow files for analytics, see math_genealogy.backend.export.
+
+Rows are streamed from a server-side cursor and buffered as Arrow batches until a row
+group is full, so memory use stays flat however large the tables are. Every run adds files named after the table and the
+time of the snapshot to the directory, next to a manifest.json listing the snapshots.
+With --incremental only the mathematicians updated and the edges added since the
+previous snapshot in the directory are exported.
+
+example usage:
+    from root directory
+    python ./scripts/export_genealogy.py data/snapshots
+    python ./scripts/export_genealogy.py data/snapshots --incremental
+
+command line arguments:
+    :directory:
+        directory the files and manifest are written to
+    :--incremental:
+        only export rows changed since the previous snapshot
+    :--format:
+        parquet (default) or arrow
+    :--compression:
+        codec of the files, default zstd, "none" to disable
+    :--row-group-size:
+        rows per row group, default 100000
+"""
+
+
+import argparse
+import logging
+
+from sqlalchemy import create_engine
+
+from math_genealogy.backend.export import FORMATS, export_snapshot
+from math_genealogy.config import CONFIG
+
+
+def main(directory, incremental=False, file_format="parquet", compression="zstd", row_group_size=100000):
+    engine = create_engine(CONFIG.db_connection)
+    snapshot = export_snapshot(
+        engine,
+        directory,
+        incremental=incremental,
+        file_format=file_format,
+        compression=None if compression == "none" else compression,
+        row_group_size=row_group_size,
+    )
+    engine.dispose()
+    for table, path in snapshot["files"].items():
+        print(f"{snapshot['rows'][table]:>9} rows of {table} in {path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export the genealogy to Parquet or Arrow files")
+    parser.add_argument("directory")
+    parser.add_argument("--incremental", action="store_true")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--compression", default="zstd")
+    parser.add_argument("--row-group-size", type=int, default=100000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    main(args.directory, args.incremental, args.format, args.compression, args.row_group_size)
@@ -0,0 +1,68 @@
+"""
+Loads the mathematicians in files archived by SampleJsonWriterPipeline into the database
+of the current ENVIRONMENT and reports rows per second. Line-delimited JSON files, plain,
+gzip or zstd compressed, are streamed one item at a time, as are the .json files the
+pipeline wrote before.
+
+On PostgreSQL each batch is streamed into staging tables with COPY and merged into the
+mathematician and student_advisor tables with one statement, see
+math_genealogy.backend.copy_loader. Students and advisors that are not in the files get
+id-only rows, and edges that are already in the database are skipped, so files can be
+loaded in any order and more than once.
+
+example usage:
+    from root directory
+    python ./scripts/load_mathematicians.py data/math_genealogy/items-20210401120000-00000.ndjson.gz
+
+command line arguments:
+    :files:
+        paths of the JSON files to load
+    :--batch-size:
+        number of mathematicians merged per transaction, default 10000
+        ex:
+            python ./scripts/load_mathematicians.py --batch-size 50000 data/math_genealogy/*.ndjson.gz
+"""
+
+
+import argparse
+import logging
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from math_genealogy.backend.copy_loader import load_items, read_json_items
+from math_genealogy.config import CONFIG
+from math_genealogy.scrapers.scrapers.item_files import read_items
+
+
+def read_files(paths):
+    for path in paths:
+        if path.endswith(".json"):
+            with open(path) as f:
+                yield from mathematicians(path, read_json_items(f))
+        else:
+            yield from mathematicians(path, read_items([path]))
+
+
+def mathematicians(path, items):
+    # files of other spiders, such as data/dead-letter/arxiv, hold items without an id
+    for item in items:
+        if "id_" not in item:
+            raise SystemExit(f"{path} holds items that are not mathematicians, such as {item}")
+        yield item
+
+
+def main(paths, batch_size=10000):
+    engine = create_engine(CONFIG.db_connection)
+    stats = load_items(sessionmaker(bind=engine), read_files(paths), batch_size=batch_size)
+    engine.dispose()
+    print(f"loaded {stats}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load scraped mathematicians from JSON files")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    main(args.files, args.batch_size)
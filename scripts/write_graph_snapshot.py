@@ -0,0 +1,42 @@
+"""
+Writes a graph snapshot of the database of the current ENVIRONMENT, which the API maps
+into memory at startup instead of loading the student_advisor table, see
+math_genealogy.backend.graph_snapshot.
+
+The crawler writes one when it closes if GRAPH_SNAPSHOT is set. This script is for
+databases filled some other way, such as with load_mathematicians.py. Running API workers
+pick up the new snapshot on their next graph index refresh.
+
+example usage:
+    from root directory
+    python ./scripts/write_graph_snapshot.py data/graph.snapshot
+
+command line arguments:
+    :path:
+        file the snapshot is written to, defaults to GRAPH_SNAPSHOT
+"""
+
+
+import logging
+import sys
+
+from math_genealogy.backend.db import Session
+from math_genealogy.backend.graph import write_graph_snapshot
+from math_genealogy.config import CONFIG
+
+
+def main(path):
+    session = Session()
+    try:
+        size = write_graph_snapshot(session, path)
+    finally:
+        session.close()
+    print(f"Wrote {size / 1e6:.1f} MB to {path}")
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    path = sys.argv[1] if len(sys.argv) > 1 else CONFIG.graph_snapshot
+    if not path:
+        sys.exit("usage: write_graph_snapshot.py path, or set GRAPH_SNAPSHOT")
+    main(path)
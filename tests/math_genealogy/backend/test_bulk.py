@@ -0,0 +1,80 @@
+from math_genealogy.backend.bulk import MathematicianBatch, write_batch
+from math_genealogy.backend.db import Mathematician, StudentAdvisor
+
+
+def make_item(id_, student_ids=(), advisor_ids=(), **kwargs):
+    return dict(
+        id_=id_,
+        name=kwargs.get("name", f"Mathematician {id_}"),
+        school="University of North Texas",
+        graduated=1991,
+        thesis=None,
+        nationality="UnitedStates",
+        subject=None,
+        advisor_ids=list(advisor_ids),
+        student_ids=list(student_ids),
+        math_genealogy_url=f"https://www.mathgenealogy.org/id.php?id={id_}",
+        math_sci_net_url=None,
+        publications=None,
+        citations=None,
+    )
+
+
+def edges(session):
+    return sorted(
+        session.query(StudentAdvisor.student_id, StudentAdvisor.advisor_id).all()
+    )
+
+
+class TestMathematicianBatch:
+    def test_deduplicates_rows_and_edges(self):
+        batch = MathematicianBatch(
+            [
+                make_item(1, student_ids=[2, 3], name="first"),
+                make_item(2, advisor_ids=[1]),
+                make_item(1, student_ids=[2], name="second"),
+            ]
+        )
+        assert len(batch) == 2
+        assert batch.rows[1]["name"] == "second"
+        assert batch.rows[1]["country"] == "UnitedStates"
+        assert batch.rows[1]["graduated_year"] == 1991
+        assert batch.edges == {(2, 1), (3, 1)}
+        assert batch.stub_ids == {3}
+
+    def test_reads_the_year_of_archived_text_values(self):
+        batch = MathematicianBatch([
+            dict(make_item(1), graduated="1925-1926"),
+            dict(make_item(2), graduated="unknown"),
+            dict(make_item(3), graduated=None),
+        ])
+        assert [row["graduated_year"] for row in batch.rows.values()] == [1925, None, None]
+
+
+class TestWriteBatch:
+    def test_writes_rows_stubs_and_edges(self, session):
+        write_batch(session, MathematicianBatch([make_item(1, student_ids=[2], advisor_ids=[3])]))
+        session.commit()
+        assert session.query(Mathematician).get(1).name == "Mathematician 1"
+        assert session.query(Mathematician).get(2).name is None
+        assert session.query(Mathematician).get(3).name is None
+        assert edges(session) == [(1, 3), (2, 1)]
+
+    def test_upserts_existing_rows_and_skips_existing_edges(self, session):
+        write_batch(session, MathematicianBatch([make_item(1, student_ids=[2])]))
+        session.commit()
+        write_batch(
+            session,
+            MathematicianBatch([make_item(2, advisor_ids=[1], name="Student"), make_item(1, student_ids=[2])]),
+        )
+        session.commit()
+        assert session.query(Mathematician).get(2).name == "Student"
+        assert session.query(Mathematician).count() == 2
+        assert edges(session) == [(2, 1)]
+
+    def test_stubs_do_not_overwrite_scraped_rows(self, session):
+        write_batch(session, MathematicianBatch([make_item(2)]))
+        session.commit()
+        write_batch(session, MathematicianBatch([make_item(1, student_ids=[2])]))
+        session.commit()
+        assert session.query(Mathematician).get(2).name == "Mathematician 2"
@@ -0,0 +1,176 @@
+import fnmatch
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import math_genealogy.backend.cache as cache_module
+import math_genealogy.backend.db as db
+from math_genealogy.backend.bulk import MathematicianBatch, write_batch
+from math_genealogy.backend.cache import LRUCache, SharedCache, get_mathematician_cache
+from math_genealogy.backend.models import PydanticMathematician
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def mathematician(id_, name=None):
+    return PydanticMathematician(id=id_, name=name or f"M{id_}")
+
+
+def test_lru_eviction():
+    cache = LRUCache(maxsize=2, ttl=60)
+    cache.set(mathematician(1))
+    cache.set(mathematician(2))
+    assert cache.get(1).name == "M1"
+    cache.set(mathematician(3))
+    assert cache.get(2) is None
+    assert cache.get(1).name == "M1"
+    assert cache.get(3).name == "M3"
+    assert cache.stats.as_dict() == {"hits": 3, "misses": 1, "evictions": 1, "expirations": 0}
+
+
+def test_lru_expiry():
+    clock = Clock()
+    cache = LRUCache(maxsize=10, ttl=60, clock=clock)
+    cache.set(mathematician(1))
+    clock.now = 59
+    assert cache.get(1) is not None
+    clock.now = 60
+    assert cache.get(1) is None
+    assert len(cache) == 0
+    assert cache.stats.expirations == 1
+
+
+def test_disabled_cache():
+    cache = LRUCache(maxsize=0, ttl=60)
+    cache.set(mathematician(1))
+    assert cache.get(1) is None
+
+
+class FakeRedis:
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+
+    def scan_iter(self, match):
+        return iter([key for key in self.values if fnmatch.fnmatchcase(key, match)])
+
+
+def test_shared_cache():
+    cache = SharedCache(FakeRedis(), ttl=60)
+    cache.set(mathematician(1))
+    assert cache.get(1) == mathematician(1)
+    cache.invalidate([1])
+    assert cache.get(1) is None
+    assert cache.stats.as_dict()["hits"] == 1
+
+
+def test_shared_cache_clear():
+    client = FakeRedis()
+    client.set("other:1", "kept")
+    cache = SharedCache(client, ttl=60)
+    cache.set(mathematician(1))
+    cache.set(mathematician(2))
+    cache.clear()
+    assert cache.get(1) is None and cache.get(2) is None
+    assert client.values == {"other:1": "kept"}
+
+
+@pytest.fixture
+def populated(db_session):
+    db_session.add_all([db.Mathematician(id=id_, name=f"M{id_}") for id_ in range(1, 4)])
+    db_session.commit()
+    return db_session
+
+
+def test_read_through(populated):
+    stats = get_mathematician_cache().stats
+    hits = stats.hits
+    assert db.get_mathematician_by_id(1).name == "M1"
+    assert db.get_mathematician_by_id(1).name == "M1"
+    assert stats.hits == hits + 1
+    assert [m.id for m in db.get_mathematicians_by_ids([3, 1, 2])] == [3, 1, 2]
+    assert stats.hits == hits + 2
+
+
+def test_writes_invalidate(populated):
+    assert db.get_mathematician_by_id(1).name == "M1"
+    db.update_mathematician(1, mathematician(1, "Updated"))
+    assert db.get_mathematician_by_id(1).name == "Updated"
+    db.delete_mathematician(1)
+    assert db.get_mathematician_by_id(1) is None
+    assert db.insert_mathematician(mathematician(1, "Inserted")).name == "Inserted"
+    assert db.get_mathematician_by_id(1).name == "Inserted"
+
+
+def test_batch_writes_invalidate_once_committed(populated):
+    cache = get_mathematician_cache()
+    assert db.get_mathematician_by_id(1).name == "M1"
+    session = db.Session()
+    write_batch(session, MathematicianBatch([{"id_": 1, "name": "Gauss"}]))
+    # readers see the old row until the commit, and may cache it again meanwhile
+    assert cache.get(1).name == "M1"
+    session.rollback()
+    assert cache.get(1).name == "M1"
+
+    write_batch(session, MathematicianBatch([{"id_": 1, "name": "Gauss"}]))
+    session.commit()
+    session.close()
+    assert cache.get(1) is None
+    assert db.get_mathematician_by_id(1).name == "Gauss"
+
+
+# an API worker or crawler process writing to the same database
+RENAME_GAUSS = """
+from math_genealogy.backend import db
+from math_genealogy.backend.models import PydanticMathematician
+db.update_mathematician(1, PydanticMathematician(id=1, name="Carl Friedrich Gauss"))
+"""
+
+
+def test_writes_of_other_processes_invalidate_the_cache(tmp_path, monkeypatch):
+    connection = f"sqlite:///{tmp_path / 'genealogy.db'}"
+    engine = create_engine(connection)
+    db.BaseModel.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    session.add(db.Mathematician(id=1, name="Gauss"))
+    session.commit()
+    session.close()
+    monkeypatch.setattr(db, "Session", Session)
+    cache = LRUCache(maxsize=10, ttl=3600)
+    monkeypatch.setattr(cache_module, "_mathematician_cache", cache)
+    cache.watch_version(db.read_data_version, 0.05)
+    try:
+        assert db.get_mathematician_by_id(1).name == "Gauss"
+        subprocess.run(
+            [sys.executable, "-c", RENAME_GAUSS],
+            env=dict(os.environ, POSTGRES_CONNECTION_DEV=connection),
+            check=True,
+        )
+        deadline = time.monotonic() + 10
+        while db.get_mathematician_by_id(1).name == "Gauss" and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert db.get_mathematician_by_id(1).name == "Carl Friedrich Gauss"
+    finally:
+        cache.stop_watching()
+        engine.dispose()
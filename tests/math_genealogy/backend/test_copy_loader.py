@@ -0,0 +1,132 @@
+import json
+
+from sqlalchemy.orm import sessionmaker
+
+from math_genealogy.backend.bulk import MathematicianBatch
+from math_genealogy.backend.copy_loader import (
+    MERGE_STAGING,
+    copy_batch,
+    copy_rows,
+    load_items,
+    read_json_items,
+)
+from math_genealogy.backend.db import Mathematician, StudentAdvisor
+
+
+def make_item(id_, student_ids=(), advisor_ids=()):
+    return dict(
+        id_=id_,
+        name=f"Mathematician {id_}",
+        graduated=1991,
+        advisor_ids=list(advisor_ids),
+        student_ids=list(student_ids),
+        math_genealogy_url=f"https://www.mathgenealogy.org/id.php?id={id_}",
+    )
+
+
+def edges(session):
+    return sorted(session.query(StudentAdvisor.student_id, StudentAdvisor.advisor_id).all())
+
+
+def test_copy_rows_escapes_text_format():
+    buffer = copy_rows([(1, None, "tab\there", "line\nbreak", "back\\slash"), (2, "", 3, None, "x")])
+    assert buffer.read().split("\n") == [
+        "1\t\\N\ttab\\there\tline\\nbreak\tback\\\\slash",
+        "2\t\t3\t\\N\tx",
+        "",
+    ]
+
+
+def test_read_json_items_accepts_sample_json_writer_files():
+    # SampleJsonWriterPipeline leaves a comma after the last item, and no closing
+    # brackets when the crawl is killed
+    items = [make_item(1, student_ids=[2]), make_item(2, advisor_ids=[1])]
+    lines = ['{"mathematicians": [\n'] + [json.dumps(item) + ",\n" for item in items]
+    assert list(read_json_items(lines + ["]}"])) == items
+    assert list(read_json_items(lines)) == items
+
+
+def test_load_items_writes_stubs_and_skips_existing_edges(engine, session):
+    items = [make_item(1, student_ids=[2, 3]), make_item(2, advisor_ids=[1, 4]), make_item(1, student_ids=[2])]
+    stats = load_items(sessionmaker(bind=engine), items, batch_size=2)
+    load_items(sessionmaker(bind=engine), items[:1], batch_size=2)
+
+    assert (stats.rows, stats.batches) == (3, 2)
+    assert edges(session) == [(2, 1), (2, 4), (3, 1)]
+    names = dict(session.query(Mathematician.id, Mathematician.name))
+    assert names == {1: "Mathematician 1", 2: "Mathematician 2", 3: None, 4: None}
+
+
+class RecordingCursor:
+    def __init__(self, copied):
+        self.copied = copied
+
+    def copy_expert(self, sql, buffer):
+        self.copied.append((sql, buffer.read()))
+
+    def close(self):
+        pass
+
+
+class RecordingSession:
+    """
+    Stands in for a session on PostgreSQL with psycopg2, recording the statements.
+    """
+
+    def __init__(self):
+        self.executed = []
+        self.copied = []
+        self.info = {}
+        self.dialect = type("Dialect", (), {"name": "postgresql", "driver": "psycopg2"})
+
+    def get_bind(self):
+        return self
+
+    def connection(self):
+        cursor = RecordingCursor(self.copied)
+        return type("Connection", (), {"connection": type("DBAPIConnection", (), {"cursor": lambda self: cursor})()})
+
+    def execute(self, statement):
+        self.executed.append(str(statement))
+        return type("Result", (), {"rowcount": 1})
+
+
+def test_copy_batch_stages_and_merges_in_one_statement():
+    session = RecordingSession()
+    copy_batch(session, MathematicianBatch([make_item(1, student_ids=[2, 3]), make_item(2, advisor_ids=[1])]))
+
+    (mathematicians_sql, mathematicians), (edges_sql, edge_rows) = session.copied
+    assert mathematicians_sql.startswith("COPY mathematician_staging (id, name, school")
+    assert [line.split("\t")[0] for line in mathematicians.splitlines()] == ["1", "2"]
+    assert edges_sql == "COPY student_advisor_staging (student_id, advisor_id) FROM STDIN"
+    assert edge_rows == "2\t1\n3\t1\n"
+    assert session.executed[-3].startswith("TRUNCATE")
+    assert session.executed[-2] == MERGE_STAGING
+    # in the same transaction, so API processes drop their cached rows
+    assert session.executed[-1].startswith("UPDATE data_version")
+    # and drop them from this process's cache once committed
+    assert session.info == {"invalidate_mathematician_ids": {1, 2}}
+
+
+def test_copy_batch_merges_on_postgresql(postgres_engine):
+    Session = sessionmaker(bind=postgres_engine)
+    session = Session()
+    session.add_all([Mathematician(id=1, name="Old name"), Mathematician(id=5, name="Kept")])
+    session.add(StudentAdvisor(student_id=5, advisor_id=1))
+    session.commit()
+
+    # 1 is updated, 2 inserted, 3 and 4 are linked but not in the batch, and the
+    # edges 2-1 and 5-1 are staged twice or already stored
+    batch = MathematicianBatch([
+        make_item(1, student_ids=[2, 3, 5]),
+        make_item(2, advisor_ids=[1, 4]),
+    ])
+    copy_batch(session, batch)
+    copy_batch(session, MathematicianBatch([make_item(2, advisor_ids=[1])]))
+    session.commit()
+
+    names = dict(session.query(Mathematician.id, Mathematician.name))
+    assert names == {1: "Mathematician 1", 2: "Mathematician 2", 3: None, 4: None, 5: "Kept"}
+    # the foreign keys of the new edges accept the rows inserted by the same statement
+    assert edges(session) == [(2, 1), (2, 4), (3, 1), (5, 1)]
+    session.close()
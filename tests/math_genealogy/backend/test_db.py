@@ -1,4 +1,18 @@
-from math_genealogy.backend.db import Mathematician
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy.orm import Session as OrmSession, sessionmaker
+
+from math_genealogy.backend import db
+from math_genealogy.backend.db import (
+    Mathematician,
+    StudentAdvisor,
+    get_advisors,
+    get_related_mathematicians,
+    get_students,
+    insert_mathematician,
+)
 from math_genealogy.backend.models import PydanticMathematician
 
 
@@ -8,7 +22,7 @@ class TestMathematicianModel:
         id=10847,
         name="John Allen Taylor",
         school="University of North Texas",
-        graduated="1991",
+        graduated=1991,
         thesis="Aspects of Universality In Function Iteration",
         country="UnitedStates",
         subject=None,
@@ -37,7 +51,7 @@ class TestMathematicianModel:
             id=10847,
             name="John Allen Taylor",
             school="University of North Texas",
-            graduated="1991",
+            graduated=1991,
             thesis="Aspects of Universality In Function Iteration",
             country="UnitedStates",
             subject=None,
@@ -66,3 +80,62 @@ class TestMathematicianModel:
             "citations",
         ]:
             assert getattr(mathematician, field) == getattr(self.mathematician, field)
+
+
+class TestRelationships:
+
+    @pytest.fixture(autouse=True)
+    def populate(self, session):
+        session.add_all([Mathematician(id=id_, name=f"M{id_}") for id_ in range(1, 5)])
+        session.add_all([StudentAdvisor(student_id=2, advisor_id=1), StudentAdvisor(student_id=3, advisor_id=1)])
+        session.commit()
+
+    def test_get_students(self, session):
+        assert [student.id for student in get_students(1, session)] == [2, 3]
+        assert get_students(4, session) == []
+        assert get_students(10, session) is None
+
+    def test_get_advisors(self, session):
+        assert [advisor.id for advisor in get_advisors(3, session)] == [1]
+        assert get_advisors(1, session) == []
+        assert get_advisors(10, session) is None
+
+    def test_get_related_mathematicians(self, session):
+        assert [m.id for m in get_related_mathematicians(1, [3, 2], session)] == [3, 2]
+        assert get_related_mathematicians(4, [], session) == []
+        assert get_related_mathematicians(10, [1], session) is None
+
+    def test_insert_existing_mathematician(self, session):
+        assert insert_mathematician(PydanticMathematician(id=1, name="Duplicate"), session) is None
+        assert insert_mathematician(PydanticMathematician(id=5, name="M5"), session).id == 5
+        assert session.get(Mathematician, 1).name == "M1"
+
+
+def test_get_session_waits_for_a_slot_and_closes_off_the_event_loop(engine, monkeypatch):
+    closed_in = []
+
+    class RecordingSession(OrmSession):
+        def close(self):
+            closed_in.append(threading.get_ident())
+            super().close()
+
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine, class_=RecordingSession))
+    monkeypatch.setattr(db, "pool_capacity", lambda: 1)
+
+    async def two_requests():
+        first = db.get_session()
+        await first.__anext__()
+        second = db.get_session()
+        waiting = asyncio.ensure_future(second.__anext__())
+        await asyncio.sleep(0.01)
+        # the only slot is held by the first request
+        assert not waiting.done()
+        with pytest.raises(StopAsyncIteration):
+            await first.__anext__()
+        assert isinstance(await asyncio.wait_for(waiting, 1), RecordingSession)
+        await second.aclose()
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(two_requests())
+    assert len(closed_in) == 2
+    assert loop_thread not in closed_in
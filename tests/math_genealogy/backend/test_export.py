@@ -0,0 +1,133 @@
+import datetime
+
+import pytest
+from sqlalchemy.dialects.postgresql import psycopg2
+
+import math_genealogy.backend.export as export
+from math_genealogy.backend.db import Mathematician, StudentAdvisor
+from math_genealogy.backend.export import TABLES, export_snapshot, export_table, read_manifest
+
+
+pa = pytest.importorskip("pyarrow")
+pytest.importorskip("pyarrow.parquet")
+
+
+def read(directory, snapshot, table):
+    path = str(directory / snapshot["files"][table])
+    if snapshot["format"] == "arrow":
+        return pa.ipc.open_file(path).read_all()
+    return pa.parquet.read_table(path)
+
+
+@pytest.fixture
+def genealogy(session):
+    session.add_all([Mathematician(id=1, name="Gauss", graduated=1799), Mathematician(id=2, name="Gerling")])
+    session.add(StudentAdvisor(student_id=2, advisor_id=1))
+    session.commit()
+    return session
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_full_snapshot_keeps_types(engine, genealogy, tmp_path, file_format):
+    snapshot = export_snapshot(engine, str(tmp_path), file_format=file_format, row_group_size=1)
+    mathematicians = read(tmp_path, snapshot, "mathematician")
+    assert mathematicians.schema.field("graduated").type == pa.int32()
+    assert mathematicians.column("name").to_pylist() == ["Gauss", "Gerling"]
+    assert mathematicians.column("graduated").to_pylist() == [1799, None]
+    edges = read(tmp_path, snapshot, "student_advisor").select(["id", "student_id", "advisor_id"])
+    assert edges.to_pylist() == [{"id": 1, "student_id": 2, "advisor_id": 1}]
+    if file_format == "parquet":
+        assert pa.parquet.ParquetFile(str(tmp_path / snapshot["files"]["mathematician"])).num_row_groups == 2
+
+
+def test_incremental_snapshot_holds_changed_rows(engine, genealogy, tmp_path):
+    first = export_snapshot(engine, str(tmp_path), incremental=True)
+    assert not first["incremental"]
+
+    later = datetime.datetime.utcnow() + datetime.timedelta(seconds=1)
+    genealogy.get(Mathematician, 2).updated_at = later
+    genealogy.add(Mathematician(id=3, name="Dedekind", updated_at=later))
+    genealogy.add(StudentAdvisor(student_id=3, advisor_id=1, created_at=later))
+    genealogy.commit()
+    second = export_snapshot(engine, str(tmp_path), incremental=True)
+
+    assert second["incremental"]
+    assert read(tmp_path, second, "mathematician").column("id").to_pylist() == [2, 3]
+    assert read(tmp_path, second, "student_advisor").column("student_id").to_pylist() == [3]
+    assert [snapshot["rows"] for snapshot in read_manifest(str(tmp_path))["snapshots"]] == [
+        {"mathematician": 2, "student_advisor": 1},
+        {"mathematician": 2, "student_advisor": 1},
+    ]
+
+
+def test_incremental_snapshot_holds_rows_committed_after_the_previous_one(engine, genealogy, tmp_path, monkeypatch):
+    # a crawl transaction started an hour ago is still running during the first export
+    started = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(hours=1)
+    monkeypatch.setattr(export, "_write_horizon", lambda engine: started)
+    first = export_snapshot(engine, str(tmp_path), incremental=True)
+    assert first["watermarks"] == {"mathematician": started.isoformat(), "student_advisor": started.isoformat()}
+
+    # then commits rows older than those the export read
+    genealogy.add(Mathematician(id=3, name="Dedekind", updated_at=started))
+    genealogy.add(StudentAdvisor(student_id=3, advisor_id=1, created_at=started))
+    genealogy.commit()
+    monkeypatch.setattr(export, "_write_horizon", lambda engine: None)
+    second = export_snapshot(engine, str(tmp_path), incremental=True)
+
+    # rows of the first snapshot are exported again, readers keep the latest of an id
+    assert read(tmp_path, second, "mathematician").column("id").to_pylist() == [1, 2, 3]
+    assert read(tmp_path, second, "student_advisor").column("student_id").to_pylist() == [2, 3]
+    third = export_snapshot(engine, str(tmp_path), incremental=True)
+    assert third["rows"] == {"mathematician": 0, "student_advisor": 0}
+
+
+class CopyCursor:
+    """
+    psycopg2 cursor copying out ``rows`` of CSV.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.copied = None
+
+    def copy_expert(self, sql, file):
+        self.copied = sql
+        file.write(self.rows)
+
+    def close(self):
+        pass
+
+
+class CopyConnection:
+    dialect = psycopg2.dialect()
+
+    def __init__(self, cursor):
+        self.connection = self
+        self._cursor = cursor
+
+    def cursor(self):
+        return self._cursor
+
+
+def test_postgresql_rows_are_copied_as_csv(tmp_path):
+    cursor = CopyCursor(
+        b'1,Gauss,,1799,"Disquisitiones ""nova""\nsecunda",,,,,12,,2026-10-18 12:00:00.5\n'
+        b'2,NULL,"",,,,,,,,,2026-10-18 12:00:01\n'
+    )
+    path = str(tmp_path / "mathematician.parquet")
+    since = datetime.datetime(2026, 10, 18, tzinfo=datetime.timezone.utc)
+    exported = export_table(CopyConnection(cursor), TABLES[0], path, since)
+
+    assert cursor.copied.startswith("COPY (SELECT mathematician.id AS id")
+    assert "timezone('UTC', mathematician.updated_at) AS updated_at" in cursor.copied
+    assert "updated_at >= CAST('2026-10-18T00:00:00+00:00' AS TIMESTAMP WITH TIME ZONE)" in cursor.copied
+    assert cursor.copied.endswith(") TO STDOUT WITH (FORMAT csv)")
+    assert exported.rows == 2
+    assert exported.watermark == datetime.datetime(2026, 10, 18, 12, 0, 1, tzinfo=datetime.timezone.utc)
+    mathematicians = pa.parquet.read_table(path)
+    assert mathematicians.schema.field("updated_at").type == pa.timestamp("us", tz="UTC")
+    assert mathematicians.select(["name", "school", "graduated", "thesis", "publications"]).to_pylist() == [
+        {"name": "Gauss", "school": None, "graduated": 1799, "thesis": 'Disquisitiones "nova"\nsecunda',
+         "publications": 12},
+        {"name": "NULL", "school": "", "graduated": None, "thesis": None, "publications": None},
+    ]
@@ -0,0 +1,59 @@
+import pytest
+
+from math_genealogy.backend import db
+from math_genealogy.backend.db import Mathematician, MathematicianFilters
+
+
+# (id, school, country, graduated, citations)
+ROWS = [
+    (1, "Göttingen", "Germany", 1799, 10),
+    (2, "Göttingen", "Germany", 1851, 250),
+    (3, "Paris", "France", 1902, 40),
+    (4, "Göttingen", "Germany", 1925, None),
+    (5, "Cambridge", "UK", 1950, 5),
+    (6, "Göttingen", "Germany", None, 0),
+]
+
+
+@pytest.fixture
+def mathematicians(db_session):
+    db_session.add_all([
+        Mathematician(id=id_, school=school, country=country, graduated=graduated, citations=citations)
+        for (id_, school, country, graduated, citations) in ROWS
+    ])
+    db_session.commit()
+
+
+def ids(values=None, ranges=None, perpage=100, cursor=None):
+    filters = MathematicianFilters(values or {}, ranges or {})
+    page = db.get_mathematicians(1, perpage, ["id"], ["id"], False, cursor, filters=filters)
+    return [row["id"] for row in page.rows], page.next_cursor
+
+
+@pytest.mark.usefixtures("mathematicians")
+def test_value_and_range_filters():
+    assert ids({"school": ["Göttingen"]}, {"graduated": (1800, 1950)})[0] == [2, 4]
+    assert ids({"country": ["France", "UK"]})[0] == [3, 5]
+    assert ids(ranges={"citations": (None, 10)})[0] == [1, 5, 6]
+    assert ids(ranges={"graduated": (1900, None)})[0] == [3, 4, 5]
+
+
+@pytest.mark.usefixtures("mathematicians")
+def test_cursor_pages_keep_the_filters():
+    first, cursor = ids({"school": ["Göttingen"]}, perpage=2)
+    second, _ = ids({"school": ["Göttingen"]}, perpage=2, cursor=cursor)
+    assert first + second == [1, 2, 4, 6]
+
+
+@pytest.mark.parametrize(
+    "values, ranges",
+    [
+        ({"name": ["Gauss"]}, {}),
+        ({"not_a_field": ["x"]}, {}),
+        ({}, {"school": (1, 2)}),
+        ({}, {"citations": (10, 1)}),
+    ],
+)
+def test_invalid_filters(values, ranges):
+    with pytest.raises(ValueError):
+        MathematicianFilters(values, ranges).predicates()
@@ -0,0 +1,154 @@
+import random
+
+import pytest
+
+import math_genealogy.backend.graph as graph
+
+from math_genealogy.backend.db import Mathematician, StudentAdvisor
+from math_genealogy.backend.graph import CSRAdjacency, GraphIndex
+
+
+# (student_id, advisor_id)
+EDGES = [(2, 1), (3, 1), (4, 2), (4, 3), (5, 4)]
+
+
+@pytest.fixture
+def graph_index():
+    return GraphIndex(EDGES)
+
+
+@pytest.fixture
+def genealogy_session(session):
+    session.add_all([Mathematician(id=id_) for id_ in range(1, 7)])
+    session.add_all([StudentAdvisor(student_id=s, advisor_id=a) for (s, a) in EDGES])
+    session.commit()
+    return session
+
+
+def test_csr_adjacency():
+    csr = CSRAdjacency.from_pairs([(1, 3), (1, 2), (3, 1)], max_id=3)
+    assert list(csr.offsets) == [0, 0, 2, 2, 3]
+    assert list(csr.neighbors(1)) == [3, 2]
+    assert list(csr.neighbors(2)) == []
+    assert list(csr.neighbors(100)) == []
+    assert csr.degree(1) == 2
+
+
+def test_lookups(graph_index):
+    assert graph_index.get_students(1) == [2, 3]
+    assert graph_index.get_advisors(4) == [2, 3]
+    assert graph_index.get_students(5) == []
+    assert graph_index.get_advisors(1) == []
+    assert graph_index.edge_count == 5
+
+
+def test_incremental_updates(graph_index):
+    graph_index.add_edge(6, 5)
+    graph_index.remove_edge(4, 2)
+    assert graph_index.get_students(5) == [6]
+    assert graph_index.get_advisors(4) == [3]
+    assert graph_index.edge_count == 5
+    graph_index.remove_mathematician(1)
+    assert graph_index.get_advisors(2) == []
+    assert graph_index.get_advisors(3) == []
+    expected = {(4, 3), (5, 4), (6, 5)}
+    assert set(graph_index.edges()) == expected
+    graph_index.compact()
+    assert set(graph_index.edges()) == expected
+    assert graph_index.get_students(5) == [6]
+
+
+def test_compaction_keeps_concurrent_changes(graph_index, monkeypatch):
+    graph_index.add_edge(6, 5)
+    adjacency = graph._adjacency
+
+    def build_while_an_edge_is_added(edges):
+        # the arrays are built without the lock, while requests keep changing the index
+        graph_index.add_edge(7, 6)
+        return adjacency(edges)
+
+    monkeypatch.setattr(graph, "_adjacency", build_while_an_edge_is_added)
+    graph_index.compact()
+    # the arrays missing the new edge are dropped, and the overlays kept
+    assert graph_index.get_advisors(7) == [6]
+    assert graph_index.get_students(5) == [6]
+    monkeypatch.undo()
+    graph_index.compact()
+    assert set(graph_index.edges()) == set(EDGES) | {(6, 5), (7, 6)}
+    assert graph_index.get_advisors(7) == [6]
+
+
+def test_load_and_refresh(genealogy_session):
+    graph_index = GraphIndex.load(genealogy_session)
+    assert set(graph_index.edges()) == set(EDGES)
+
+    genealogy_session.add(StudentAdvisor(student_id=6, advisor_id=5))
+    genealogy_session.commit()
+    graph_index.refresh(genealogy_session)
+    assert graph_index.get_students(5) == [6]
+
+    genealogy_session.query(StudentAdvisor).filter(StudentAdvisor.student_id == 2).delete()
+    genealogy_session.commit()
+    graph_index.refresh(genealogy_session)
+    assert graph_index.get_students(1) == [3]
+    assert graph_index.edge_count == 5
+
+
+def test_genealogy_sized_graph_is_compact():
+    rng = random.Random(0)
+    nodes = 265_000
+    edges = [(student_id, rng.randint(1, student_id - 1)) for student_id in range(2, nodes + 1)]
+    graph_index = GraphIndex(edges)
+    assert graph_index.nbytes < 8 * 1024 * 1024
+    student_id, advisor_id = edges[-1]
+    assert student_id in graph_index.get_students(advisor_id)
+
+
+def test_descendants(graph_index):
+    assert list(graph_index.descendants(1)) == [(2, 1), (3, 1), (4, 2), (5, 3)]
+    assert list(graph_index.descendants(1, max_depth=2)) == [(2, 1), (3, 1), (4, 2)]
+    assert list(graph_index.descendants(1, limit=1)) == [(2, 1)]
+    assert list(graph_index.descendants(5)) == []
+
+
+def test_ancestors(graph_index):
+    assert list(graph_index.ancestors(5)) == [(4, 1), (2, 2), (3, 2), (1, 3)]
+    assert list(graph_index.ancestors(5, max_depth=1)) == [(4, 1)]
+
+
+def test_shortest_path(graph_index):
+    assert graph_index.shortest_path(1, 1) == [1]
+    assert graph_index.shortest_path(1, 5) in ([1, 2, 4, 5], [1, 3, 4, 5])
+    assert graph_index.shortest_path(5, 1) in ([5, 4, 2, 1], [5, 4, 3, 1])
+    # connected through their shared advisor or their shared student
+    assert graph_index.shortest_path(2, 3) in ([2, 1, 3], [2, 4, 3])
+    graph_index.add_edge(7, 6)
+    assert graph_index.shortest_path(1, 7) is None
+
+
+def test_shortest_path_matches_breadth_first_search():
+    rng = random.Random(0)
+    edges = {(s, rng.randint(1, s - 1)) for s in range(2, 2000) for _ in range(rng.choice([1, 2]))}
+    graph_index = GraphIndex(edges)
+    for _ in range(50):
+        source_id, target_id = rng.randint(1, 1999), rng.randint(1, 1999)
+        path = graph_index.shortest_path(source_id, target_id)
+        assert path[0] == source_id and path[-1] == target_id
+        for a, b in zip(path, path[1:]):
+            assert (a, b) in edges or (b, a) in edges
+        assert len(path) - 1 == distance(graph_index, source_id, target_id)
+
+
+def distance(graph_index, source_id, target_id):
+    # plain single ended breadth first search
+    depths = {source_id: 0}
+    frontier = [source_id]
+    while target_id not in depths:
+        next_frontier = []
+        for node in frontier:
+            for neighbor in graph_index.get_students(node) + graph_index.get_advisors(node):
+                if neighbor not in depths:
+                    depths[neighbor] = depths[node] + 1
+                    next_frontier.append(neighbor)
+        frontier = next_frontier
+    return depths[target_id]
@@ -0,0 +1,117 @@
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import math_genealogy.backend.graph as graph
+from math_genealogy.backend.db import BaseModel, Mathematician, StudentAdvisor
+from math_genealogy.backend.graph import GraphIndex, write_graph_snapshot
+from math_genealogy.backend.graph_snapshot import GraphSnapshot
+
+
+# (student_id, advisor_id)
+EDGES = [(2, 1), (3, 1), (4, 2), (4, 3), (5, 4)]
+
+
+def populate(session):
+    session.add_all([
+        Mathematician(id=1, name="Gauss", school="Universität Helmstedt"),
+        Mathematician(id=2, name="Gerling", school="Universität Göttingen"),
+        Mathematician(id=3, name="Bessel"),
+        Mathematician(id=4, name="Plücker", school="Universität Göttingen"),
+        Mathematician(id=5, name="Klein"),
+        Mathematician(id=9, name="Riemann", school="Universität Göttingen"),
+    ])
+    session.add_all([StudentAdvisor(student_id=s, advisor_id=a) for (s, a) in EDGES])
+    session.commit()
+    return session
+
+
+@pytest.fixture
+def genealogy_session(session):
+    return populate(session)
+
+
+@pytest.fixture
+def snapshot_path(genealogy_session, tmp_path):
+    path = str(tmp_path / "graph.snapshot")
+    write_graph_snapshot(genealogy_session, path)
+    return path
+
+
+def test_snapshot_round_trip(snapshot_path):
+    snapshot = GraphSnapshot(snapshot_path)
+    assert len(snapshot) == 6
+    assert snapshot.edge_count == 5
+    assert snapshot.last_edge_id == 5
+    assert snapshot.name(4) == "Plücker"
+    assert snapshot.school(9) == "Universität Göttingen"
+    assert snapshot.school(3) is None
+    assert 9 in snapshot and 6 not in snapshot and 100 not in snapshot
+    # the school is stored once however many mathematicians share it
+    assert bytes(snapshot.pool).count("Göttingen".encode()) == 1
+    snapshot.close()
+
+
+def test_index_from_snapshot(genealogy_session, snapshot_path):
+    graph_index = GraphIndex.from_snapshot(GraphSnapshot(snapshot_path))
+    assert graph_index.get_students(1) == [2, 3]
+    assert graph_index.get_advisors(4) == [2, 3]
+    assert list(graph_index.descendants(1)) == [(2, 1), (3, 1), (4, 2), (5, 3)]
+    assert graph_index.shortest_path(5, 1) == [5, 4, 2, 1]
+
+    genealogy_session.add(StudentAdvisor(student_id=9, advisor_id=5))
+    genealogy_session.commit()
+    graph_index.refresh(genealogy_session)
+    assert graph_index.get_students(5) == [9]
+    graph_index.compact()
+    assert set(graph_index.edges()) == set(EDGES) | {(9, 5)}
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "graph.snapshot"
+    path.write_bytes(b"not a snapshot" * 10)
+    with pytest.raises(ValueError):
+        GraphSnapshot(str(path))
+
+
+def test_process_index_maps_new_snapshots_in_the_background(tmp_path, monkeypatch):
+    # an in-memory database cannot be shared with the refresh thread
+    engine = create_engine(f"sqlite:///{tmp_path / 'genealogy.db'}", connect_args={"check_same_thread": False})
+    BaseModel.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine)
+    session = populate(Session())
+    path = str(tmp_path / "graph.snapshot")
+    write_graph_snapshot(session, path)
+    monkeypatch.setattr(graph, "CONFIG", graph.CONFIG._replace(graph_snapshot=path))
+    monkeypatch.setattr(graph, "Session", Session)
+    monkeypatch.setattr(graph, "_index", None)
+    first = graph.get_graph_index()
+    assert first.snapshot is not None and first.get_students(4) == [5]
+
+    session.add(StudentAdvisor(student_id=9, advisor_id=5))
+    session.commit()
+    write_graph_snapshot(session, path)
+    refreshing = threading.Event()
+    refresh = GraphIndex.refresh
+    monkeypatch.setattr(GraphIndex, "refresh", lambda index, session: refreshing.wait(5) and refresh(index, session))
+    monkeypatch.setattr(graph, "_refreshed_at", 0.0)
+    monkeypatch.setattr(graph, "REFRESH_INTERVAL", -1)
+    # requests keep using the current index while the new snapshot is mapped
+    assert graph.get_graph_index() is first
+    assert first.get_students(5) == []
+    graph.remove_mathematician(3)
+    refreshing.set()
+    deadline = time.monotonic() + 5
+    while graph.loaded_graph_index() is first and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    second = graph.loaded_graph_index()
+    assert second is not first
+    assert second.snapshot.edge_count == 6
+    assert second.get_students(5) == [9]
+    # removed during the refresh, and replayed on the new index
+    assert second.get_advisors(4) == [2]
+    session.close()
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from math_genealogy.backend import db
+from math_genealogy.backend.db import Mathematician
+
+
+NAMES = ["Gauss", None, "Euler", "Noether", None, "Euler", "Hilbert", "Gauss", "Cantor", None, "Euler"]
+
+
+@pytest.fixture
+def mathematicians(db_session):
+    db_session.add_all(
+        [Mathematician(id=id_, name=name, citations=id_ % 3) for (id_, name) in enumerate(NAMES, start=1)]
+    )
+    db_session.commit()
+
+
+def walk(fields, order_by, descending, perpage):
+    rows, cursor = [], None
+    while True:
+        page = db.get_mathematicians(1, perpage, fields, order_by, descending, cursor)
+        rows.extend(page.rows)
+        if page.next_cursor is None:
+            return rows
+        cursor = page.next_cursor
+
+
+def offset_walk(fields, order_by, descending, perpage):
+    rows, page = [], 1
+    while True:
+        result = db.get_mathematicians(page, perpage, fields, order_by, descending)
+        rows.extend(result.rows)
+        if len(result.rows) < perpage:
+            return rows
+        page += 1
+
+
+@pytest.mark.usefixtures("mathematicians")
+@pytest.mark.parametrize("order_by", [["id"], ["name"], ["citations", "name"], ["name", "citations"]])
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("perpage", [1, 3, 4])
+def test_cursor_pages_match_offset_pages(order_by, descending, perpage):
+    rows = walk(["id", "name"], order_by, descending, perpage)
+    assert rows == offset_walk(["id", "name"], order_by, descending, perpage)
+    assert sorted(row["id"] for row in rows) == list(range(1, len(NAMES) + 1))
+
+
+@pytest.mark.usefixtures("mathematicians")
+def test_nulls_sort_last():
+    rows = walk(["id", "name"], ["name"], False, 4)
+    assert [row["name"] for row in rows][-3:] == [None, None, None]
+    assert [row["id"] for row in rows][:3] == [9, 3, 6]
+    # and first in descending order, the order of an index read backwards
+    rows = walk(["id", "name"], ["name"], True, 4)
+    assert [row["id"] for row in rows][:4] == [10, 5, 2, 4]
+
+
+@pytest.mark.usefixtures("mathematicians")
+def test_empty_page_has_no_cursor():
+    assert db.get_mathematicians(1, 0, ["id"], ["id"], False) == db.MathematicianPage([], None)
+
+
+def test_cursor_seeks_with_row_values():
+    cursor = db._encode_cursor(["citations", "id"], True, [2, 7])
+    query = db.build_mathematicians_query(1, 10, ["id"], ["citations"], True, cursor)
+    sql = str(query.statement.compile(dialect=postgresql.dialect()))
+    assert "(mathematician.citations, mathematician.id) < (" in sql
+    assert "ORDER BY mathematician.citations DESC NULLS FIRST, mathematician.id DESC" in sql
+
+
+@pytest.mark.usefixtures("mathematicians")
+def test_ordering_columns_are_not_returned_unless_requested():
+    page = db.get_mathematicians(1, 2, ["name"], ["citations"], False)
+    assert page.rows == [{"name": "Euler"}, {"name": "Euler"}]
+    assert page.next_cursor is not None
+
+
+@pytest.mark.usefixtures("mathematicians")
+def test_cursor_must_match_ordering():
+    cursor = db.get_mathematicians(1, 2, "*", ["name"], False).next_cursor
+    with pytest.raises(ValueError):
+        db.get_mathematicians(1, 2, "*", ["name"], True, cursor)
+    with pytest.raises(ValueError):
+        db.get_mathematicians(1, 2, "*", ["name"], False, "not a cursor")
@@ -0,0 +1,115 @@
+import contextlib
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+import math_genealogy.backend.search as search
+from math_genealogy.backend.db import Mathematician
+from math_genealogy.backend.models import PydanticMathematician
+from math_genealogy.backend.search import SEARCH_DOCUMENT, SearchIndex
+
+
+MIGRATION = os.path.join(
+    os.path.dirname(search.__file__), "alembic", "versions", "5e0c3b9a1f27_add_mathematician_search_index.py"
+)
+
+
+MATHEMATICIANS = [
+    (1, "Carl Friedrich Gauss", "Demonstratio nova theorematis", "Universität Helmstedt"),
+    (2, "Johann Friedrich Pfaff", "Gauss sums and series", "Universität Göttingen"),
+    (3, "Bernhard Riemann", "Grundlagen für eine allgemeine Theorie", "Universität Göttingen"),
+    (4, "Carla Gaussian", None, None),
+]
+
+
+@pytest.fixture
+def search_index():
+    index = SearchIndex()
+    for mathematician in MATHEMATICIANS:
+        index.add(*mathematician)
+    return index
+
+
+def test_ranks_name_matches_first(search_index):
+    assert search_index.search("gauss") == [1, 4, 2]
+    assert search_index.search("GAUS carl") == [1, 4]
+    assert search_index.search("göttingen") == [2, 3]
+    assert search_index.search("gauss euler") == []
+    assert search_index.search("  ") == []
+
+
+def test_short_words_only_match_whole_words(search_index):
+    assert search_index.search("car") == [1, 4]
+    assert search_index.search("ca") == []
+    assert search_index.search("gauss ca") == []
+    assert search_index.search("friedrich carl") == [1]
+    assert "to_tsquery('simple'::regconfig, 'ca & gauss:*')" in str(
+        search.search_statement(["ca", "gauss"], 1, 20).compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_paginates(search_index):
+    assert search_index.search("universität", page=1, perpage=2) == [1, 2]
+    assert search_index.search("universität", page=2, perpage=2) == [3]
+
+
+def test_updates_and_removals(search_index):
+    search_index.add(3, "Bernhard Riemann", None, "Universität Berlin")
+    assert search_index.search("göttingen") == [2]
+    search_index.remove(1)
+    assert search_index.search("gauss") == [4, 2]
+    assert search_index.search("helmstedt") == []
+    assert len(search_index) == 3
+
+
+def test_search_mathematicians_falls_back_to_the_index(db_session, monkeypatch):
+    monkeypatch.setattr(search, "_index", None)
+    db_session.add_all([
+        Mathematician(id=id_, name=name, thesis=thesis, school=school)
+        for (id_, name, thesis, school) in MATHEMATICIANS
+    ])
+    db_session.commit()
+    results = search.search_mathematicians("friedrich", session=db_session)
+    assert [(m.id, m.name) for m in results] == [(1, "Carl Friedrich Gauss"), (2, "Johann Friedrich Pfaff")]
+    assert search.loaded_search_index() is not None
+
+
+def test_search_document_matches_the_migration():
+    spec = importlib.util.spec_from_file_location("search_migration", MIGRATION)
+    migration = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(migration)
+    compiled = str(SEARCH_DOCUMENT.compile(dialect=postgresql.dialect()))
+    assert compiled.replace("mathematician.", "").replace("(", "").replace(")", "") == (
+        migration.SEARCH_DOCUMENT.replace("(", "").replace(")", "")
+    )
+
+
+def test_reloads_in_the_background(search_index, monkeypatch):
+    monkeypatch.setattr(search, "_index", search_index)
+    monkeypatch.setattr(search, "_loaded_at", 0.0)
+    monkeypatch.setattr(search, "session_scope", contextlib.nullcontext)
+    loading = threading.Event()
+
+    def slow_load(session):
+        loading.wait(5)
+        return SearchIndex()
+
+    monkeypatch.setattr(SearchIndex, "load", staticmethod(slow_load))
+    # searches keep using the loaded index while the new one loads
+    assert search.get_search_index() is search_index
+    search.index_mathematician(PydanticMathematician(id=5, name="Emmy Noether"))
+    assert search_index.search("noether") == [5]
+    loading.set()
+    deadline = time.monotonic() + 5
+    while search.loaded_search_index() is search_index and time.monotonic() < deadline:
+        time.sleep(0.01)
+    reloaded = search.loaded_search_index()
+    assert reloaded is not search_index
+    # changes made during the reload are replayed on the new index
+    assert reloaded.search("noether") == [5]
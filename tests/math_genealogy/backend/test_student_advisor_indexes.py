@@ -0,0 +1,92 @@
+import random
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import IntegrityError
+
+from math_genealogy.backend.db import BaseModel, Mathematician, StudentAdvisor
+
+
+NODES = 250_000
+
+
+@pytest.fixture(scope="module")
+def genealogy_engine():
+    # built once per module since it holds a synthetic genealogy sized graph
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    rng = random.Random(0)
+    with engine.begin() as connection:
+        connection.execute(
+            Mathematician.__table__.insert(), [{"id": id_} for id_ in range(1, NODES + 1)]
+        )
+        connection.execute(
+            StudentAdvisor.__table__.insert(),
+            [
+                {"student_id": student_id, "advisor_id": advisor_id}
+                for student_id in range(2, NODES + 1)
+                for advisor_id in {rng.randint(1, student_id - 1) for _ in range(rng.choice([1, 1, 2]))}
+            ],
+        )
+        connection.execute(text("ANALYZE"))
+    yield engine
+    engine.dispose()
+
+
+def query_plan(engine, sql):
+    with engine.connect() as connection:
+        rows = connection.execute(text(f"EXPLAIN QUERY PLAN {sql}"), {"id": 1}).fetchall()
+    return " ".join(row[-1] for row in rows)
+
+
+@pytest.mark.parametrize(
+    "sql, index",
+    [
+        (
+            "SELECT student_id FROM student_advisor WHERE advisor_id = :id",
+            "ix_student_advisor_advisor_id_student_id",
+        ),
+        (
+            "SELECT advisor_id FROM student_advisor WHERE student_id = :id",
+            "ix_student_advisor_student_id_advisor_id",
+        ),
+    ],
+)
+def test_relationship_lookups_use_covering_index(genealogy_engine, sql, index):
+    plan = query_plan(genealogy_engine, sql)
+    assert f"COVERING INDEX {index}" in plan
+    assert "SCAN" not in plan
+
+
+@pytest.mark.parametrize(
+    "sql, index",
+    [
+        (
+            "SELECT mathematician.* FROM student_advisor "
+            "JOIN mathematician ON mathematician.id = student_advisor.student_id "
+            "WHERE student_advisor.advisor_id = :id",
+            "ix_student_advisor_advisor_id_student_id",
+        ),
+        (
+            "SELECT mathematician.* FROM student_advisor "
+            "JOIN mathematician ON mathematician.id = student_advisor.advisor_id "
+            "WHERE student_advisor.student_id = :id",
+            "ix_student_advisor_student_id_advisor_id",
+        ),
+    ],
+)
+def test_relationship_joins_use_indexes(genealogy_engine, sql, index):
+    # a sequential scan of the edge table would take seconds per thousand lookups
+    plan = query_plan(genealogy_engine, sql)
+    assert f"COVERING INDEX {index}" in plan
+    assert "mathematician USING INTEGER PRIMARY KEY" in plan
+    assert "SCAN" not in plan
+
+
+def test_duplicate_edges_are_rejected(session):
+    session.add_all([Mathematician(id=1), Mathematician(id=2)])
+    session.add(StudentAdvisor(student_id=2, advisor_id=1))
+    session.commit()
+    session.add(StudentAdvisor(student_id=2, advisor_id=1))
+    with pytest.raises(IntegrityError):
+        session.commit()
@@ -0,0 +1,104 @@
+import os
+import uuid
+
+import pytest
+
+os.environ.setdefault("ENVIRONMENT", "dev")
+os.environ.setdefault("POSTGRES_CONNECTION_DEV", "sqlite://")
+# tests that need it watch the data version of their own database
+os.environ.setdefault("CACHE_VERSION_INTERVAL", "0")
+
+from sqlalchemy import create_engine, event  # noqa E402
+from sqlalchemy.exc import OperationalError  # noqa E402
+from sqlalchemy.orm import sessionmaker  # noqa E402
+
+import math_genealogy.backend.db as db  # noqa E402
+from math_genealogy.backend.cache import get_mathematician_cache  # noqa E402
+from math_genealogy.backend.db import BaseModel  # noqa E402
+from math_genealogy.metrics import REGISTRY  # noqa E402
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine("sqlite://")
+    BaseModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_engine():
+    """
+    An engine on the PostgreSQL database of POSTGRES_CONNECTION_TEST, with the tables in a schema of their own.
+
+    Skips the test when POSTGRES_CONNECTION_TEST is not set, or its driver is not installed or
+    the database is not reachable.
+    """
+    connection = os.environ.get("POSTGRES_CONNECTION_TEST")
+    if not connection:
+        pytest.skip("POSTGRES_CONNECTION_TEST is not set")
+    try:
+        engine = create_engine(connection)
+    except ImportError as error:
+        pytest.skip(f"no driver for POSTGRES_CONNECTION_TEST: {error}")
+    schema = f"test_{uuid.uuid4().hex}"
+    try:
+        with engine.begin() as conn:
+            conn.exec_driver_sql(f"CREATE SCHEMA {schema}")
+    except OperationalError as error:
+        engine.dispose()
+        pytest.skip(f"PostgreSQL is not available: {error}")
+
+    @event.listens_for(engine, "connect")
+    def set_search_path(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f"SET search_path TO {schema}")
+        cursor.close()
+        # committed, so resetting the connection on return to the pool keeps it
+        dbapi_connection.commit()
+
+    engine.dispose()
+    BaseModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"DROP SCHEMA {schema} CASCADE")
+    engine.dispose()
+
+
+@pytest.fixture
+def session(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def db_session(engine, monkeypatch):
+    """
+    Point the data access functions in math_genealogy.backend.db at the test database.
+    """
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(db, "Session", Session)
+    session = Session()
+    yield session
+    session.close()
+
+
+@pytest.fixture(autouse=True)
+def clear_mathematician_cache():
+    # the tests reuse ids across databases, so cached rows must not outlive a test
+    get_mathematician_cache().clear()
+    yield
+    get_mathematician_cache().clear()
+
+
+@pytest.fixture
+def enable_metrics(monkeypatch):
+    """
+    Record the metrics of math_genealogy.metrics from zero for one test.
+    """
+    monkeypatch.setattr(REGISTRY, "enabled", True)
+    REGISTRY.reset()
+    yield REGISTRY
+    REGISTRY.reset()
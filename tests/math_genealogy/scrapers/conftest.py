@@ -0,0 +1,75 @@
+import json
+import os
+from dataclasses import asdict
+
+import pytest
+from scrapy.http import HtmlResponse, Request
+
+from math_genealogy.scrapers.scrapers.spiders.arxiv_papers import ArxivPaper, ArxivPaperSpider
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import Mathematician, MathGenealogySpider
+
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+SPIDERS = {
+    "math_genealogy": MathGenealogySpider,
+    "arxiv": ArxivPaperSpider,
+}
+
+
+def load_corpus():
+    with open(os.path.join(FIXTURES, "corpus.json")) as f:
+        return json.load(f)["pages"]
+
+
+def make_response(page) -> HtmlResponse:
+    """
+    Build the response a callback in the corpus receives, including the partially
+    scraped item the previous callback passes along in its meta.
+    """
+    meta = {}
+    if page["callback"] == "math_genealogy.parse_math_sci_net":
+        meta["mathematician"] = Mathematician(**page["meta"])
+    elif page["callback"] == "arxiv.parse_abstract":
+        meta["arxiv_paper"] = ArxivPaper()
+    with open(os.path.join(FIXTURES, "pages", page["file"]), "rb") as f:
+        body = f.read()
+    return HtmlResponse(page["url"], body=body, encoding="utf-8", request=Request(page["url"], meta=meta))
+
+
+def run_callback(page, spider=None):
+    """
+    Run the callback of a corpus page, returning the scraped items as dicts and the
+    urls of the requests it makes.
+    """
+    spider_name, callback = page["callback"].split(".")
+    spider = spider or SPIDERS[spider_name]()
+    items, urls = [], []
+    for result in getattr(spider, callback)(make_response(page)):
+        if isinstance(result, Request):
+            urls.append(result.url)
+        else:
+            items.append(asdict(result))
+    return items, urls
+
+
+@pytest.fixture(scope="session")
+def corpus():
+    return load_corpus()
+
+
+@pytest.fixture(scope="session")
+def respond():
+    return make_response
+
+
+@pytest.fixture(scope="session")
+def scrape():
+    return run_callback
+
+
+@pytest.fixture(scope="session")
+def expected():
+    with open(os.path.join(FIXTURES, "expected.json")) as f:
+        return json.load(f)
@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+from scrapy.settings import Settings
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from twisted.internet import reactor
+from twisted.internet.defer import Deferred
+
+from math_genealogy.backend.db import BaseModel, Mathematician as DbMathematician
+from math_genealogy.backend.graph_snapshot import GraphSnapshot
+from math_genealogy.scrapers.scrapers import pipelines
+from math_genealogy.scrapers.scrapers.background import BackgroundWriter
+from math_genealogy.scrapers.scrapers.dedup import CrawlFrontier
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider, Mathematician
+
+
+@pytest.fixture
+def call_from_thread(monkeypatch):
+    # no reactor runs in the tests, fire the deferreds from the worker side instead
+    monkeypatch.setattr(reactor, "callFromThread", lambda f, *args: f(*args), raising=False)
+
+
+@pytest.fixture
+def crawl_engine(monkeypatch, tmp_path):
+    # an in-memory database cannot be shared with the writer thread
+    engine = create_engine(f"sqlite:///{tmp_path / 'crawl.db'}", connect_args={"check_same_thread": False})
+    BaseModel.metadata.create_all(engine)
+    monkeypatch.setattr(pipelines, "create_engine", lambda connection: engine)
+    return engine
+
+
+def test_writer_applies_backpressure(call_from_thread):
+    writer = BackgroundWriter(max_pending=2)
+    release = threading.Event()
+    written = []
+    for batch in range(3):
+        writer.submit(lambda batch=batch: release.wait() and batch, callback=written.append)
+    assert writer.full
+    room, idle = writer.wait_for_room(), writer.close()
+    assert not room.called and not idle.called
+
+    release.set()
+    writer.executor.shutdown(wait=True)
+    assert room.called and idle.called
+    assert written == [0, 1, 2]
+
+
+def test_pipeline_writes_in_the_background(monkeypatch, call_from_thread, crawl_engine, tmp_path):
+    release = threading.Event()
+    write_batch = pipelines.write_batch
+    monkeypatch.setattr(pipelines, "write_batch", lambda *args: release.wait() and write_batch(*args))
+    spider = MathGenealogySpider()
+    spider.settings = Settings({"DB_WRITER_BACKGROUND": True, "DB_WRITER_MAX_PENDING": 1})
+    spider.frontier = CrawlFrontier.open(str(tmp_path))
+    pipeline = pipelines.SqlalchemyWriterPipeline()
+    pipeline.batch_size = 2
+    pipeline.open_spider(spider)
+
+    assert pipeline.process_item(Mathematician(id_="1", name="M1"), spider).id_ == 1
+    # the full batch is handed to the writer thread, which waits for the database
+    waiting = pipeline.process_item(Mathematician(id_="2", name="M2"), spider)
+    assert isinstance(waiting, Deferred) and not waiting.called
+    assert pipeline.pending_ids == {1, 2} and len(spider.frontier.written) == 0
+    pipeline.process_item(Mathematician(id_="3", name="M3"), spider)
+    closed = threading.Event()
+    pipeline.close_spider(spider).addCallback(lambda _: closed.set())
+
+    release.set()
+    assert closed.wait(timeout=10)
+    assert waiting.called
+    assert set(spider.frontier.written) == {1, 2, 3} and pipeline.pending_ids == set()
+    assert set(CrawlFrontier.open(str(tmp_path)).written) == {1, 2, 3}
+    rows = sessionmaker(bind=crawl_engine)().query(DbMathematician.id, DbMathematician.name).all()
+    assert rows == [(1, "M1"), (2, "M2"), (3, "M3")]
+
+
+def test_pipeline_writes_graph_snapshot_on_close(monkeypatch, call_from_thread, crawl_engine, tmp_path):
+    # (thread, writes queued) of each snapshot written
+    calls = []
+    write_graph_snapshot = pipelines.write_graph_snapshot
+
+    def record(*args):
+        calls.append((threading.current_thread(), pipeline.writer.pending))
+        return write_graph_snapshot(*args)
+
+    monkeypatch.setattr(pipelines, "write_graph_snapshot", record)
+    path = str(tmp_path / "graph.snapshot")
+    spider = MathGenealogySpider()
+    spider.settings = Settings({"DB_WRITER_BACKGROUND": True, "GRAPH_SNAPSHOT": path})
+    pipeline = pipelines.SqlalchemyWriterPipeline()
+    pipeline.open_spider(spider)
+    pipeline.process_item(Mathematician(id_="1", name="Gauss"), spider)
+    pipeline.process_item(Mathematician(id_="2", name="Gerling", advisor_ids=["1"]), spider)
+    closed = threading.Event()
+    pipeline.close_spider(spider).addCallback(lambda _: closed.set())
+
+    assert closed.wait(timeout=10)
+    # written as a write of the writer thread, not once the writer closed
+    [(thread, pending)] = calls
+    assert thread is not threading.main_thread() and pending >= 1
+    snapshot = GraphSnapshot(path)
+    assert snapshot.name(2) == "Gerling"
+    assert list(snapshot.student_targets) == [2]
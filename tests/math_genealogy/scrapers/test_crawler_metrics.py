@@ -0,0 +1,50 @@
+from scrapy.http import Request
+from scrapy.settings import Settings
+from scrapy.statscollectors import MemoryStatsCollector
+
+from math_genealogy.scrapers.scrapers import pipelines
+from math_genealogy.scrapers.scrapers.middlewares import PAGES_PARSED, PARSE_SECONDS, ScrapersSpiderMiddleware
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider, Mathematician
+
+
+def test_middleware_times_callbacks_and_exports_stats(corpus, respond, enable_metrics):
+    spider = MathGenealogySpider()
+    stats = MemoryStatsCollector(type("Crawler", (), {"settings": Settings()})())
+    middleware = ScrapersSpiderMiddleware(stats=stats)
+    pages = [page for page in corpus if page["callback"] == "math_genealogy.parse"]
+    for page in pages:
+        response = respond(page)
+        response.request.callback = spider.parse
+        assert list(middleware.process_spider_output(response, spider.parse(response), spider))
+
+    assert PAGES_PARSED.value(callback="parse") == len(pages)
+    assert PARSE_SECONDS.count(callback="parse") == len(pages)
+    middleware.spider_closed(spider)
+    assert stats.get_value('metrics/crawler_pages_parsed_total{callback="parse"}') == len(pages)
+
+
+def test_middleware_passes_output_through_when_disabled(respond, corpus):
+    spider = MathGenealogySpider()
+    response = respond(corpus[0])
+    output = ScrapersSpiderMiddleware().process_spider_output(response, iter([Request("http://example.com")]), spider)
+    assert [request.url for request in output] == ["http://example.com"]
+    assert PAGES_PARSED.value(callback="parse") == 0
+
+
+def test_pipeline_records_drops_batches_and_commits(engine, monkeypatch, enable_metrics):
+    monkeypatch.setattr(pipelines, "create_engine", lambda connection: engine)
+    spider = MathGenealogySpider()
+    spider.settings = Settings({"DB_WRITER_BACKGROUND": False})
+    pipeline = pipelines.SqlalchemyWriterPipeline()
+    pipeline.batch_size = 2
+    pipeline.open_spider(spider)
+    for id_ in ["1", "2", "2", "3"]:
+        try:
+            pipeline.process_item(Mathematician(id_=id_, name=f"M{id_}"), spider)
+        except pipelines.DropItem:
+            pass
+    pipeline.close_spider(spider)
+
+    assert pipelines.ITEMS_DROPPED.value(pipeline="SqlalchemyWriterPipeline", reason="duplicate") == 1
+    assert pipelines.BATCH_SIZE.count(pipeline="SqlalchemyWriterPipeline") == 2
+    assert pipelines.COMMIT_SECONDS.count(pipeline="SqlalchemyWriterPipeline") == 2
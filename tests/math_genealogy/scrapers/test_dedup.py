@@ -0,0 +1,142 @@
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse, Request
+from scrapy.settings import Settings
+
+from math_genealogy.backend.db import Mathematician as DbMathematician, StudentAdvisor
+from math_genealogy.scrapers.scrapers import pipelines
+from math_genealogy.scrapers.scrapers.dedup import CrawlFrontier, IdBitmap
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider, Mathematician
+
+
+def test_bitmap():
+    bitmap = IdBitmap(capacity=16)
+    assert bitmap.add(3)
+    assert not bitmap.add(3)
+    assert bitmap.add(1000)
+    assert 3 in bitmap and 1000 in bitmap
+    assert 4 not in bitmap and 10 ** 6 not in bitmap
+    assert len(bitmap) == 2
+    assert list(bitmap) == [3, 1000]
+
+
+def test_bitmap_size():
+    assert IdBitmap().nbytes < 34 * 1024
+
+
+def test_frontier_checkpoint(tmp_path):
+    directory = str(tmp_path / "state")
+    frontier = CrawlFrontier.open(directory)
+    assert frontier.request(1) and frontier.request(2)
+    frontier.mark_written([1])
+    frontier.save()
+
+    resumed = CrawlFrontier.open(directory)
+    assert 1 in resumed.written and 2 not in resumed.written
+    assert not resumed.request(1) and not resumed.request(2)
+    assert list(resumed.unfinished()) == [2]
+
+
+PAGE = """
+<html><body>
+<h2>Leonhard Euler</h2>
+<p>Advisor: <a href="id.php?id=1">Johann Bernoulli</a></p>
+<table>
+<tr><td><a href="id.php?id=3">Joseph Lagrange</a></td></tr>
+<tr><td><a href="id.php?id=4">Nicolas Fuss</a></td></tr>
+</table>
+</body></html>
+"""
+
+
+def test_spider_skips_requested_ids():
+    spider = MathGenealogySpider()
+    spider.frontier.mark_written([1])
+    url = "https://www.mathgenealogy.org/id.php?id=2"
+    response = HtmlResponse(url, body=PAGE.encode(), request=Request(url))
+    results = list(spider.parse(response))
+    item = results[0]
+    assert item.advisor_ids == [1] and item.student_ids == [3, 4]
+    followed = sorted(result.url for result in results[1:])
+    assert followed == [
+        "https://www.mathgenealogy.org/id.php?id=3",
+        "https://www.mathgenealogy.org/id.php?id=4",
+    ]
+    assert list(MathGenealogySpider.parse(spider, response))[1:] == []
+
+
+@pytest.fixture
+def pipeline(engine, monkeypatch):
+    monkeypatch.setattr(pipelines, "create_engine", lambda connection: engine)
+    monkeypatch.setattr(pipelines.SqlalchemyWriterPipeline, "batch_size", 2)
+    return pipelines.SqlalchemyWriterPipeline
+
+
+def crawl(pipeline, spider, ids):
+    instance = pipeline()
+    instance.open_spider(spider)
+    dropped = 0
+    for id_ in ids:
+        try:
+            instance.process_item(Mathematician(id_=str(id_), name=f"M{id_}", advisor_ids=[1]), spider)
+        except DropItem:
+            dropped += 1
+    return dropped
+
+
+def test_pipeline_skips_written_items_across_restarts(pipeline, session, tmp_path):
+    path = str(tmp_path / "state")
+    spider = MathGenealogySpider()
+    spider.frontier = CrawlFrontier.open(path)
+    assert crawl(pipeline, spider, [2, 3, 2, 4, 5]) == 1
+    assert session.query(DbMathematician).filter(DbMathematician.name.isnot(None)).count() == 4
+
+    spider = MathGenealogySpider()
+    spider.frontier = CrawlFrontier.open(path)
+    assert crawl(pipeline, spider, [2, 3, 4, 5, 6, 7]) == 4
+    assert session.query(StudentAdvisor).count() == 6
+
+
+def test_incremental_start_requests(db_session, tmp_path):
+    db_session.add_all([
+        DbMathematician(id=1, name="M1", math_genealogy_url="https://www.mathgenealogy.org/id.php?id=1"),
+        DbMathematician(id=2, name="M2"),
+        DbMathematician(id=3),
+    ])
+    db_session.commit()
+    spider = MathGenealogySpider(mode="incremental")
+    spider.settings = Settings({"INCREMENTAL_REQUIRED_FIELDS": ["name", "math_genealogy_url"]})
+    spider.frontier = CrawlFrontier.open(str(tmp_path))
+    spider.frontier.request(5)  # left unfinished by a killed crawl
+    urls = [request.url for request in spider.start_requests()]
+    assert urls == [
+        "https://www.mathgenealogy.org/id.php?id=5",
+        "https://www.mathgenealogy.org/id.php?id=2",
+        "https://www.mathgenealogy.org/id.php?id=3",
+    ]
+    assert not spider.frontier.request(1)
+    # complete rows are not carried over to later crawls
+    spider.closed("shutdown")
+    assert 1 not in CrawlFrontier.open(str(tmp_path)).requested
+
+
+@pytest.mark.parametrize("reason, requested", [("shutdown", [3]), ("finished", [1, 2])])
+def test_crawl_after_a_closed_one(tmp_path, reason, requested):
+    spider = MathGenealogySpider()
+    spider.start_ids = [1, 2, 3]
+    spider.frontier = CrawlFrontier.open(str(tmp_path))
+    list(spider.start_requests())
+    spider.frontier.mark_written([1, 2])
+    spider.closed(reason)
+
+    # a killed crawl is resumed, a finished one leaves nothing to skip
+    spider = MathGenealogySpider()
+    spider.start_ids = [1, 2]
+    spider.frontier = CrawlFrontier.open(str(tmp_path))
+    urls = [request.url for request in spider.start_requests()]
+    assert urls == [f"https://www.mathgenealogy.org/id.php?id={id_}" for id_ in requested]
+
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        MathGenealogySpider(mode="everything")
@@ -0,0 +1,114 @@
+import pytest
+from scrapy.settings import Settings
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from math_genealogy.backend.db import ArxivPaper as DbArxivPaper, Mathematician as DbMathematician
+from math_genealogy.scrapers.scrapers import pipelines
+from math_genealogy.scrapers.scrapers.durable import DurableBatchWriter, WriteResult
+from math_genealogy.scrapers.scrapers.item_files import ItemFileWriter, read_items
+from math_genealogy.scrapers.scrapers.spiders.arxiv_papers import ArxivPaper, ArxivPaperSpider
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider, Mathematician
+
+
+class FlakyDatabase:
+    def __init__(self, poison=(), outages=0):
+        self.poison = set(poison)
+        self.outages = outages
+        self.rows = []
+        self.attempts = 0
+
+    def write(self, items):
+        self.attempts += 1
+        if self.outages:
+            self.outages -= 1
+            raise OperationalError("INSERT", {}, Exception("server closed the connection unexpectedly"))
+        if self.poison & {item["id_"] for item in items}:
+            raise IntegrityError("INSERT", {}, Exception("violates check constraint"))
+        self.rows.extend(items)
+
+
+@pytest.fixture
+def dead_letters(tmp_path):
+    writers = []
+
+    def open_dead_letters():
+        writers.append(ItemFileWriter(str(tmp_path), "items", checkpoint_items=1))
+        return writers[-1]
+
+    open_dead_letters.items = lambda: list(read_items(path for writer in writers for path in writer.paths))
+    return open_dead_letters
+
+
+def items(ids):
+    return [{"id_": id_} for id_ in ids]
+
+
+def test_bisects_to_dead_letter_poison_items(dead_letters):
+    database = FlakyDatabase(poison=[3, 6])
+    writer = DurableBatchWriter(database.write, dead_letters)
+    assert writer(items(range(8))) == WriteResult(6, 2)
+    writer.close()
+    assert sorted(item["id_"] for item in database.rows) == [0, 1, 2, 4, 5, 7]
+    assert dead_letters.items() == items([3, 6])
+
+
+def test_retries_transient_errors_with_backoff(dead_letters):
+    sleeps = []
+    database = FlakyDatabase(outages=2)
+    writer = DurableBatchWriter(database.write, dead_letters, retries=3, backoff=0.5, sleep=sleeps.append)
+    assert writer(items(range(4))) == WriteResult(4, 0)
+    assert sleeps == [0.5, 1.0]
+    assert writer.dead_letters is None
+
+
+def test_dead_letters_batches_after_the_last_retry(dead_letters):
+    database = FlakyDatabase(outages=10)
+    writer = DurableBatchWriter(database.write, dead_letters, retries=2, sleep=lambda delay: None)
+    assert writer(items(range(4))) == WriteResult(0, 4)
+    writer.close()
+    assert database.attempts == 3
+    assert dead_letters.items() == items(range(4))
+
+
+@pytest.fixture
+def settings(tmp_path):
+    return Settings({"DB_WRITE_BACKOFF": 0, "DEAD_LETTER_DIR": str(tmp_path), "DB_WRITER_BACKGROUND": False})
+
+
+def test_pipeline_dead_letters_bad_items_and_flushes_on_close(engine, session, monkeypatch, settings, tmp_path):
+    monkeypatch.setattr(pipelines, "create_engine", lambda connection: engine)
+    write_batch = pipelines.write_batch
+
+    def reject_2(session, batch):
+        # the database rejects the row of mathematician 2
+        if 2 in batch.rows:
+            raise IntegrityError("INSERT", {}, Exception("violates check constraint"))
+        write_batch(session, batch)
+
+    monkeypatch.setattr(pipelines, "write_batch", reject_2)
+    spider = MathGenealogySpider()
+    spider.settings = settings
+    pipeline = pipelines.SqlalchemyWriterPipeline()
+    pipeline.batch_size = 4
+    pipeline.open_spider(spider)
+    for id_ in range(1, 6):
+        pipeline.process_item(Mathematician(id_=str(id_), name=f"M{id_}"), spider)
+    pipeline.close_spider(spider)
+
+    assert [id_ for (id_,) in session.query(DbMathematician.id)] == [1, 3, 4, 5]
+    [path] = (tmp_path / "math_genealogy").iterdir()
+    assert [item["id_"] for item in read_items([str(path)])] == [2]
+    assert set(spider.frontier.written) == {1, 2, 3, 4, 5}
+
+
+def test_arxiv_pipeline_flushes_on_close(engine, session, monkeypatch, settings):
+    monkeypatch.setattr(pipelines, "create_engine", lambda connection: engine)
+    spider = ArxivPaperSpider()
+    spider.settings = settings
+    pipeline = pipelines.ArxivPaperWriterPipeline()
+    pipeline.open_spider(spider)
+    for title in ["first", "second"]:
+        pipeline.process_item(ArxivPaper(title=title), spider)
+    assert session.query(DbArxivPaper).count() == 0
+    pipeline.close_spider(spider)
+    assert [title for (title,) in session.query(DbArxivPaper.title)] == ["first", "second"]
@@ -0,0 +1,67 @@
+import os
+
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.settings import Settings
+
+from math_genealogy.scrapers.scrapers.item_files import ItemFileWriter, read_items
+from math_genealogy.scrapers.scrapers.pipelines import SampleJsonWriterPipeline
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider, Mathematician
+
+
+def items(n):
+    return [{"id_": id_, "name": f"Mathematician {id_}", "student_ids": [id_ + 1]} for id_ in range(n)]
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_rotated_files_read_back_in_order(tmp_path, compression):
+    writer = ItemFileWriter(str(tmp_path), "items", compression=compression, buffer_size=100, max_items=40)
+    for item in items(100):
+        writer.write(item)
+    writer.close()
+
+    assert len(writer.paths) == 3
+    assert list(read_items(writer.paths)) == items(100)
+
+
+def test_rotates_by_size(tmp_path):
+    writer = ItemFileWriter(str(tmp_path), "items", max_bytes=1000)
+    for item in items(100):
+        writer.write(item)
+    writer.close()
+    assert len(writer.paths) > 3
+    assert all(os.path.getsize(path) < 1100 for path in writer.paths)
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_checkpointed_items_survive_a_crash(tmp_path, compression):
+    writer = ItemFileWriter(str(tmp_path), "items", compression=compression, checkpoint_items=10)
+    for item in items(25):
+        writer.write(item)
+    # the process dies without closing the writer, the last 5 items are still buffered
+    [path] = writer.paths
+    with open(path, "rb") as f:
+        data = f.read()
+    with open(path, "wb") as f:
+        f.write(data + (b'{"id_": 2' if compression is None else b""))
+
+    assert list(read_items([path])) == items(20)
+
+
+def test_pipeline_archives_unique_items(tmp_path):
+    spider = MathGenealogySpider()
+    spider.settings = Settings({"ITEM_FILE_DIR": str(tmp_path), "ITEM_FILE_COMPRESSION": "gzip"})
+    pipeline = SampleJsonWriterPipeline()
+    pipeline.open_spider(spider)
+    pipeline.process_item(Mathematician(id_="1", student_ids=[2]), spider)
+    with pytest.raises(DropItem):
+        pipeline.process_item(Mathematician(id_="1"), spider)
+    pipeline.process_item(Mathematician(id_="2", advisor_ids=[1]), spider)
+    pipeline.close_spider(spider)
+
+    [path] = pipeline.writer.paths
+    assert path.startswith(str(tmp_path / "math_genealogy" / "items-")) and path.endswith(".ndjson.gz")
+    assert [(item["id_"], item["student_ids"], item["advisor_ids"]) for item in read_items([path])] == [
+        ("1", [2], []),
+        ("2", [], [1]),
+    ]
@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict
+
+import pytest
+from scrapy.http import Request
+from scrapy.settings import Settings
+from twisted.internet import reactor
+
+from math_genealogy.scrapers.scrapers.offload import ParseOffloader
+from math_genealogy.scrapers.scrapers.spiders.math_genealogy import MathGenealogySpider
+
+
+@pytest.fixture
+def call_from_thread(monkeypatch):
+    # no reactor runs in the tests, fire the deferreds from the worker side instead
+    monkeypatch.setattr(reactor, "callFromThread", lambda f, *args: f(*args), raising=False)
+
+
+@pytest.mark.parametrize("executor_class", [ThreadPoolExecutor, ProcessPoolExecutor])
+def test_offloaded_callbacks_match_expected(corpus, expected, respond, call_from_thread, executor_class):
+    offloader = ParseOffloader(executor_class(max_workers=2))
+    results = {}
+    for page in corpus:
+        if not page["callback"].startswith("math_genealogy."):
+            continue
+        # a spider per page, like the expected output, so every link is followed
+        spider = MathGenealogySpider()
+        response = respond(page)
+        response.request.callback = getattr(spider, page["callback"].split(".")[1])
+        offloader.offload(response, spider)
+        deferred = response.request.callback(response)
+        deferred.addCallback(lambda output, file=page["file"]: results.setdefault(file, output))
+    offloader.executor.shutdown(wait=True)
+
+    assert len(results) == 8
+    for file, output in results.items():
+        items = [asdict(result) for result in output if not isinstance(result, Request)]
+        urls = [result.url for result in output if isinstance(result, Request)]
+        assert {"items": items, "urls": urls} == expected[file], file
+
+
+def test_offload_is_off_by_default():
+    assert ParseOffloader.from_settings(Settings({"PARSE_OFFLOAD": None})) is None
+    with pytest.raises(ValueError):
+        ParseOffloader.from_settings(Settings({"PARSE_OFFLOAD": "gpu"}))
+    offloader = ParseOffloader.from_settings(Settings({"PARSE_OFFLOAD": "thread", "PARSE_OFFLOAD_WORKERS": 3}))
+    assert isinstance(offloader.executor, ThreadPoolExecutor)
+    offloader.close()
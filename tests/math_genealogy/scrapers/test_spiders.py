@@ -0,0 +1,50 @@
+def test_corpus_matches_expected(corpus, expected, scrape):
+    for page in corpus:
+        items, urls = scrape(page)
+        assert {"items": items, "urls": urls} == expected[page["file"]], page["file"]
+
+
+def pages(corpus, callback):
+    return {page["file"]: page for page in corpus if page["callback"] == callback}
+
+
+def test_parse(corpus, scrape):
+    gauss = pages(corpus, "math_genealogy.parse")["id-18231.html"]
+    [item], urls = scrape(gauss)
+    assert item["id_"] == "18231"
+    assert item["name"] == "Carl Friedrich Gauß"
+    assert item["school"] == "Universität Helmstedt"
+    assert item["graduated"] == 1799
+    assert item["nationality"] == "Germany"
+    assert item["advisor_ids"] == [18230]
+    assert len(item["student_ids"]) == 21
+    assert len(urls) == 22
+
+
+def test_parse_follows_math_sci_net(corpus, scrape):
+    page = pages(corpus, "math_genealogy.parse")["id-10847.html"]
+    items, urls = scrape(page)
+    # the item is passed on to parse_math_sci_net instead of being yielded
+    assert items == []
+    assert urls[0] == "http://www.ams.org/mathscinet/MRAuthorID/316489"
+
+
+def test_parse_math_sci_net(corpus, scrape):
+    by_file = pages(corpus, "math_genealogy.parse_math_sci_net")
+    [item], _ = scrape(by_file["mr-316489.html"])
+    assert (item["publications"], item["citations"]) == (1, 7)
+    [item], _ = scrape(by_file["mr-1140233.html"])
+    assert (item["publications"], item["citations"]) == (12, None)
+
+
+def test_arxiv_parse(corpus, scrape):
+    page = pages(corpus, "arxiv.parse")["arxiv-list-11-0.html"]
+    items, urls = scrape(page)
+    # entries without an abstract link are yielded directly
+    assert len(items) + len(urls) == 100
+    assert urls[0] == "https://export.arxiv.org/abs/1101.0001"
+    assert items[0]["subjects"] == (
+        "Algebraic Geometry (math.AG), Commutative Algebra (math.AC), Number Theory (math.NT)"
+    )
+    [paper], _ = scrape(pages(corpus, "arxiv.parse_abstract")["arxiv-abs-1101.0001.html"])
+    assert paper["msc_classes"] == "11B68, 05A15"
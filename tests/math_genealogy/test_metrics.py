@@ -0,0 +1,109 @@
+import asyncio
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+import math_genealogy.backend.db as db
+from math_genealogy import metrics
+from math_genealogy.backend.app import app
+from math_genealogy.backend.db import BaseModel, Mathematician
+
+
+def test_render_prometheus_text_format():
+    registry = metrics.Registry(enabled=True)
+    requests = metrics.Counter("requests_total", "Requests", ["path"], registry=registry)
+    latency = metrics.Histogram("latency_seconds", "Latency", buckets=(0.1, 1.0), registry=registry)
+    requests.inc(path='/a"b')
+    requests.inc(2, path="/c")
+    latency.observe(0.1)
+    latency.observe(0.5)
+    latency.observe(3)
+
+    assert registry.render() == (
+        "# HELP requests_total Requests\n"
+        "# TYPE requests_total counter\n"
+        'requests_total{path="/a\\"b"} 1.0\n'
+        'requests_total{path="/c"} 2.0\n'
+        "# HELP latency_seconds Latency\n"
+        "# TYPE latency_seconds histogram\n"
+        'latency_seconds_bucket{le="0.1"} 1.0\n'
+        'latency_seconds_bucket{le="1.0"} 2.0\n'
+        'latency_seconds_bucket{le="+Inf"} 3.0\n'
+        "latency_seconds_sum 3.6\n"
+        "latency_seconds_count 3.0\n"
+    )
+    assert registry.as_stats() == {
+        'requests_total{path="/a\\"b"}': 1,
+        'requests_total{path="/c"}': 2,
+        "latency_seconds_sum": 3.6,
+        "latency_seconds_count": 3,
+    }
+
+
+def test_disabled_metrics_record_nothing():
+    registry = metrics.Registry(enabled=False)
+    requests = metrics.Counter("requests_total", "Requests", registry=registry)
+    latency = metrics.Histogram("latency_seconds", "Latency", registry=registry)
+    requests.inc()
+    with latency.time():
+        pass
+    assert requests.value() == 0 and latency.count() == 0
+
+
+def get(path):
+    """
+    Serve a GET request with the API app, returning the status and body.
+    """
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "server": ("testserver", 80),
+        "client": ("testclient", 50000),
+    }
+    asyncio.run(app(scope, receive, send))
+    return messages[0]["status"], b"".join(message.get("body", b"") for message in messages[1:]).decode()
+
+
+def test_metrics_endpoint_is_disabled_by_default():
+    assert get("/metrics")[0] == 404
+
+
+def test_api_records_latency_and_queries_per_endpoint(enable_metrics, monkeypatch, tmp_path):
+    # sync endpoints run in worker threads, which cannot share an in-memory database
+    engine = create_engine(f"sqlite:///{tmp_path / 'api.db'}", connect_args={"check_same_thread": False})
+    BaseModel.metadata.create_all(engine)
+    monkeypatch.setattr(db, "Session", sessionmaker(bind=engine))
+    session = db.Session()
+    session.add(Mathematician(id=1, name="M1"))
+    session.commit()
+    session.close()
+    metrics.instrument_queries()
+
+    assert get("/mathematicians/1")[0] == 200
+    # served from the cache the second time
+    assert get("/mathematicians/1")[0] == 200
+    assert get("/mathematicians/2")[0] == 404
+    status, body = get("/metrics")
+
+    assert status == 200
+    assert 'api_requests_total{endpoint="read_mathematician",status="200"} 2.0' in body
+    assert 'api_requests_total{endpoint="read_mathematician",status="404"} 1.0' in body
+    assert 'api_request_seconds_count{endpoint="read_mathematician"} 3.0' in body
+    assert 'api_request_queries_sum{endpoint="read_mathematician"} 2.0' in body
+    assert 'api_cache_events_total{event="hits"}' in body